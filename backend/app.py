@@ -1,3 +1,5 @@
-from src import app
+from src import app, data
 if __name__ == '__main__':
+    # load the dataset (snapshot or CSVs) before serving the first request
+    data.get_dataset()
     app.run(debug=True)
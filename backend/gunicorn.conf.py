@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+
+
+# Production serving config, e.g.  gunicorn -c gunicorn.conf.py  or  python serve.py
+#
+# The master process publishes the dataset snapshot once before forking, every
+# worker then memory-maps the same files, so the numeric columns, the voting cube
+# and the lyric token index are shared through the page cache instead of being
+# copied into each worker.
+
+wsgi_app = 'src:app'
+bind = os.environ.get('EUROTRASH_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('EUROTRASH_WORKERS', multiprocessing.cpu_count()))
+timeout = int(os.environ.get('EUROTRASH_TIMEOUT', 60))
+
+# workers load the dataset themselves, after fork, from the published snapshot
+preload_app = False
+
+
+def on_starting(server):
+    from src import data, snapshot
+
+    if not snapshot.is_fresh(data.SNAPSHOT_DIR, data.DATASET_DIR):
+        server.log.info("Publishing dataset snapshot to %s", data.SNAPSHOT_DIR)
+        snapshot.build_snapshot(data.DATASET_DIR, data.SNAPSHOT_DIR)
+
+
+def post_worker_init(worker):
+    # attach to the snapshot before accepting requests
+    from src import data
+
+    data.get_dataset()
@@ -0,0 +1,50 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+
+# Production launcher: gunicorn with the settings from gunicorn.conf.py
+#   python serve.py --workers 8 --bind 0.0.0.0:5000 --shm
+#   python serve.py --asgi          # async mode (src/asgi.py) under uvicorn
+# For development keep using app.py.
+
+SHM_SNAPSHOT_DIR = '/dev/shm/eurotrash-snapshot'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the Eurotrash API with multiple workers")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('EUROTRASH_WORKERS', multiprocessing.cpu_count())))
+    parser.add_argument('--bind', default=os.environ.get('EUROTRASH_BIND', '127.0.0.1:5000'))
+    parser.add_argument('--shm', action='store_true',
+                        help=f"publish the snapshot to shared memory ({SHM_SNAPSHOT_DIR}) instead of the dataset folder")
+    parser.add_argument('--asgi', action='store_true',
+                        help="serve src/asgi.py with uvicorn: lookups on the event loop, the rest in a bounded pool")
+    args = parser.parse_args()
+
+    # must be set before src is imported, the workers inherit it
+    if args.shm:
+        os.environ['EUROTRASH_SNAPSHOT_DIR'] = SHM_SNAPSHOT_DIR
+
+    if args.asgi:
+        try:
+            import uvicorn
+        except ImportError:
+            sys.exit("uvicorn is required for serve.py --asgi: pip install uvicorn")
+
+        from src import data, snapshot
+
+        # what gunicorn's on_starting hook does for the WSGI workers
+        if not snapshot.is_fresh(data.SNAPSHOT_DIR, data.DATASET_DIR):
+            snapshot.build_snapshot(data.DATASET_DIR, data.SNAPSHOT_DIR)
+        host, _, port = args.bind.rpartition(':')
+        uvicorn.run('src.asgi:app', host=host, port=int(port), workers=args.workers, lifespan='on')
+        sys.exit(0)
+
+    try:
+        from gunicorn.app.wsgiapp import WSGIApplication
+    except ImportError:
+        sys.exit("gunicorn is required for serve.py: pip install gunicorn")
+
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    sys.argv = ['gunicorn', '--config', config, '--workers', str(args.workers), '--bind', args.bind]
+    WSGIApplication("%(prog)s [OPTIONS] [APP_MODULE]").run()
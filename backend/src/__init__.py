@@ -1,50 +1,37 @@
-from flask import Flask, jsonify, request
+import hmac
+import json
+import logging
+import os
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-from collections import Counter
-import re
 
-import requests
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
+from . import instrumentation, payloads, queries, similarity, simulation
+from .cache import cached_response, negotiated_mimetype, precomputed, response_cache
+from .encoding import MATRIX_MIMETYPE
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of the voting_similarity permutation test
+MAX_PERMUTATIONS = 100000
+# Upper bound of the simulate Monte Carlo runs, per contest year
+MAX_SIMULATIONS = 20000
 
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+# stage timings, Server-Timing headers and /metrics
+instrumentation.init_app(app)
 
-# Load datasets
-contestants_df = pd.read_csv('../dataset/contestants_cleaned.csv')
-votes_df = pd.read_csv('../dataset/votes_cleaned.csv')
-countries_regions_df = pd.read_csv('../dataset/countries.csv')
-country_df = pd.read_csv('../dataset/country_mapping_iso.csv')
-country_df['Code'] = country_df['Code'].str.lower()
-
-voting_matrix = votes_df.pivot_table(
-    index='from_country_id',
-    columns='to_country_id',
-    values='perc_of_max',  # Replace with your relevant value column
-    aggfunc='sum',
-    fill_value=0
-)
-all_columns = voting_matrix.columns.tolist()
-
-# Standardize the voting matrix
-scaler = StandardScaler()
-standardized_matrix = scaler.fit_transform(voting_matrix)
-
-# global PCA for stable plotting
-pca = PCA(n_components=2)
-pca.fit(standardized_matrix)
-
-initial_centroids = np.random.RandomState(42).rand(6, 2)  # Adjust dimensions to match your data
+# Every endpoint is a thin JSON wrapper over src/payloads.py / src/queries.py, which hold
+# the dataset-backed logic (loaded once in src/data.py) and memoize per year range.
 
 # Endpoint: Most Dominating Countries
 #  --> adjust s.t:
 # - for each year it adds the points
 @app.route('/api/most_dominating_countries', methods=['GET'])
+@cached_response
 def most_dominating_countries():
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
@@ -52,33 +39,21 @@ def most_dominating_countries():
     if not yearRangeStart:
         return jsonify({"error": "Year parameter is required"}), 400
 
-    filtered = contestants_df[(contestants_df['year'] >= yearRangeStart) & (contestants_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
-
-    dominating_countries = (
-        filtered.groupby('to_country')['per_of_pot_max']
-        .sum()
-        .reset_index()
-        .rename(columns={'per_of_pot_max': 'total_points'})
-        .sort_values('total_points', ascending=False)
-    )
-    return jsonify(dominating_countries.to_dict(orient='records'))
+    return jsonify(payloads.most_dominating_countries(yearRangeStart, yearRangeEnd))
 
-# Endpoint: returns all countries
+# Endpoint: returns all countries
 @app.route('/api/available_countries', methods=['GET'])
 def get_available_countries():
-    years = countries_regions_df['country_name'].unique().tolist()
-    years.sort(reverse=True)  # Optional: Sort years in descending order
-    return jsonify(years)
+    return jsonify(queries.available_countries())
 
 # Endpoint: Get all available years from dataset
 @app.route('/api/available_years', methods=['GET'])
 def get_available_years():
-    years = contestants_df['year'].unique().tolist()
-    years.sort(reverse=True)  # Optional: Sort years in descending order
-    return jsonify(years)
+    return jsonify(queries.available_years())
 
 # Endpoint: Yearly Rankings (ranking 0 = not participated)
 @app.route('/api/yearly_rankings', methods=['GET'])
+@cached_response
 def yearly_rankings():
     # Filter by year if provided
     yearRangeStart = request.args.get('yearRangeStart', type=int)
@@ -87,22 +62,35 @@ def yearly_rankings():
     if not yearRangeStart:
         return jsonify({"error": "Year parameter is required"}), 400
 
+    return jsonify(payloads.yearly_rankings(yearRangeStart, yearRangeEnd))
 
-    filtered = contestants_df[(contestants_df['year'] >= yearRangeStart) & (contestants_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
+# Endpoint: placement trajectories of a few countries, e.g. for RankingComparison
+# e.g. /api/country_trajectories?yearRangeStart=1990&yearRangeEnd=2022&countries=Sweden,Italy&window=5
+# places are null where a country did not take part; window=N sets the rolling statistics' window in contests
+@app.route('/api/country_trajectories', methods=['GET'])
+@cached_response
+def country_trajectories():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    window = request.args.get('window', default=5, type=int)
+    precision = request.args.get('precision', type=int)
+    selectedCountries = [c for arg in request.args.getlist('countries') for c in arg.split(',') if c]
 
-    yearly_rankings = (
-        filtered.groupby(['year', 'to_country'])['place_contest']
-        .min()  # If there are multiple entries per country per year, take the best rank (smallest value)
-        .reset_index()
-        .pivot(index='year', columns='to_country', values='place_contest')
-        .fillna(0)  # Fill NaN values with 0 to indicate no participation
-        .astype(int)  # Convert rankings to integers
-    )
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
+    if not selectedCountries:
+        return jsonify({"error": "countries parameter is required"}), 400
+    if window < 1:
+        return jsonify({"error": "window must be a positive integer"}), 400
 
-    return jsonify(yearly_rankings.to_dict())
+    # sorted: the response cache treats countries as an unordered list, so the matrices must not depend on it
+    return jsonify(payloads.country_trajectories(
+        yearRangeStart, yearRangeEnd, sorted(set(selectedCountries)), window, precision
+    ))
 
 # Endpoint: Word Cloud Data
 @app.route('/api/word_cloud', methods=['GET'])
+@cached_response
 def word_cloud():
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
@@ -110,158 +98,177 @@ def word_cloud():
     if not yearRangeStart:
         return jsonify({"error": "Year parameter is required"}), 400
 
-    filtered = contestants_df[(contestants_df['year'] >= yearRangeStart) & (contestants_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
+    return jsonify(payloads.word_cloud(yearRangeStart, yearRangeEnd))
 
-    # Combine all lyrics into a single string
-    all_lyrics = " ".join(filtered['lyrics_token'].dropna())
-
-    # Preprocess lyrics: remove non-alphanumeric characters and convert to lowercase
-    processed_lyrics = re.sub(r'[^a-zA-Z\s]', '', all_lyrics).lower()
-
-    # Split into words and count occurrences
-    word_counts = Counter(processed_lyrics.split())
-
-    # Get the 15 most common words
-    common_words = word_counts.most_common(30)
-
-    # Convert to JSON format
-    word_cloud_data = [{"word": word, "count": count} for word, count in common_words]
-
-    return jsonify(word_cloud_data)
-
-# Endpoint with filtered countries
+# Endpoint with filtered countries
 # To Do:
 # - finish logic here as specified below
 # - add dropdown in frontend
 # - add watcher in dropdown that saves the selected filter (default = All)
 # - pass it as a param and get the correct data returned, rest stays the same
 @app.route('/api/word_cloud_filter', methods=['GET'])
+@cached_response
 def word_cloud_filter():
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
     selectedFilter = request.args.get('filter', type=str)
-    print(selectedFilter)
+    # Optional explicit country list, e.g. countries=Sweden,Italy, takes precedence over the filter
+    selectedCountries = [c for arg in request.args.getlist('countries') for c in arg.split(',') if c]
+    logger.debug("word cloud filter %s", selectedFilter)
     if not yearRangeStart:
         return jsonify({"error": "Year parameter is required"}), 400
-    
-    if selectedFilter == "All":
-        filtered = contestants_df[(contestants_df['year'] >= yearRangeStart) & (contestants_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
-
-    if selectedFilter == "Top 5":
-        # find the top 5 countries by calling mostdomcountries here and save in topFiveCountries
-        response = requests.get(
-                "http://127.0.0.1:5000/api/most_dominating_countries",
-                params={"yearRangeStart": yearRangeStart, "yearRangeEnd": yearRangeEnd},
-        )
-        
-        dominating_countries = response.json()
-        print(dominating_countries)
-        topFiveCountries = [item['to_country'] for item in dominating_countries[:5]]
-
-        filtered = contestants_df[
-        (contestants_df['year'] >= yearRangeStart) &
-        (contestants_df['year'] <= yearRangeEnd) &
-        (contestants_df['to_country'].isin(topFiveCountries))     
-        ]
-
-    if selectedFilter == "Worst 5":
-         # find the worst 5 countries by calling mostdomcountries here and save in worstFiveCountries
-
-        response = requests.get(
-            "http://127.0.0.1:5000/api/most_dominating_countries",
-            params={"yearRangeStart": yearRangeStart, "yearRangeEnd": yearRangeEnd},
-        )
-
-        print(response)
-        
-        dominating_countries = response.json()
-        worstFiveCountries = [item['to_country'] for item in dominating_countries[-5:]]
-
-        filtered = contestants_df[
-        (contestants_df['year'] >= yearRangeStart) &
-        (contestants_df['year'] <= yearRangeEnd) &
-        (contestants_df['to_country'].isin(worstFiveCountries))     
-        ]
-
 
-    # Combine all lyrics into a single string
-    all_lyrics = " ".join(filtered['lyrics_token'].dropna())
+    countries = queries.filter_countries(yearRangeStart, yearRangeEnd, selectedFilter, selectedCountries)
+    logger.debug("word cloud countries %s", countries)
 
-    # Preprocess lyrics: remove non-alphanumeric characters and convert to lowercase
-    processed_lyrics = re.sub(r'[^a-zA-Z\s]', '', all_lyrics).lower()
+    # 30 most common words of the selected countries
+    return jsonify(payloads.word_cloud(yearRangeStart, yearRangeEnd, countries))
 
-    # Split into words and count occurrences
-    word_counts = Counter(processed_lyrics.split())
-
-    # Get the 15 most common words
-    common_words = word_counts.most_common(30)
+# Endpoint: full-text search over the English lyrics
+# e.g. /api/lyrics_search?q="love you" tonight&yearRangeStart=2000&yearRangeEnd=2010&countries=Sweden,Italy
+@app.route('/api/lyrics_search', methods=['GET'])
+@cached_response
+def lyrics_search():
+    query = request.args.get('q', default='', type=str)
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    limit = request.args.get('limit', default=20, type=int)
+    selectedCountries = [c for arg in request.args.getlist('countries') for c in arg.split(',') if c]
 
-    # Convert to JSON format
-    word_cloud_data = [{"word": word, "count": count} for word, count in common_words]
+    if not query.strip():
+        return jsonify({"error": "Search query parameter q is required"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
 
-    return jsonify(word_cloud_data)
+    return jsonify(queries.lyrics_search(query, yearRangeStart, yearRangeEnd, tuple(selectedCountries) or None, limit))
 
 # Endpoint: Countries in Favor (Heatmap Data)
+# Accept: application/octet-stream (or format=binary) answers with a float32 matrix, see src/encoding.py;
+# precision=N rounds the JSON matrix to N decimals
 @app.route('/api/countries_in_favor', methods=['GET'])
+@cached_response
 def countries_in_favor():
     # Retrieve year from query parameters
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    precision = request.args.get('precision', type=int)
 
     if not yearRangeEnd:
         return jsonify({"error": "Year parameter is required"}), 400
 
-    # Load country names and codes
-    code_to_name = dict(zip(country_df["Code"], country_df["Name"]))
-
-    # Filter votes by the selected year
-    filtered_votes = votes_df[(votes_df['year'] >= yearRangeStart) & (votes_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
-    # Aggregate votes into a matrix: points given by one country to another
-    heatmap_data = (
-        filtered_votes.groupby(['from_country_id', 'to_country_id'])['perc_of_max']
-        .sum()
-        .reset_index(name='vote_count')  # Summing the points exchanged
-    )
-
-    # Ensure all combinations are represented (even if some have zero points)
-    all_countries = sorted(
-        set(filtered_votes['from_country_id']) | set(filtered_votes['to_country_id'])
-    )
-    heatmap_matrix = pd.DataFrame(index=all_countries, columns=all_countries).fillna(0)
-    heatmap_matrix = heatmap_matrix.astype(float)
-
-    for _, row in heatmap_data.iterrows():
-        heatmap_matrix.at[row['from_country_id'], row['to_country_id']] = float(row['vote_count'])
-
-    # Replace codes with names for rows and columns
-    heatmap_matrix.index = heatmap_matrix.index.map(code_to_name)
-    heatmap_matrix.columns = heatmap_matrix.columns.map(code_to_name)
-    all_countries_names = [code_to_name.get(code, f"Unknown ({code})") for code in all_countries]
-
-    # Convert to JSON-friendly format
-    heatmap_response = {
-        "countries": all_countries_names,
-        "matrix": heatmap_matrix.values.tolist(),
-    }
+    if request.args.get('format') == 'binary' or negotiated_mimetype() == MATRIX_MIMETYPE:
+        return Response(payloads.countries_in_favor_binary(yearRangeStart, yearRangeEnd), mimetype=MATRIX_MIMETYPE)
+    return jsonify(payloads.countries_in_favor(yearRangeStart, yearRangeEnd, precision))
+
+
+# Endpoint: pairwise voting similarity (cosine, Pearson, reciprocity) and hierarchical voting blocs
+# e.g. /api/voting_similarity?yearRangeStart=2000&yearRangeEnd=2010&metric=pearson&numberOfBlocs=6&permutations=5000
+# permutations=N adds a p-value per bloc (seeded by seed=), order= reorders the heatmap rows bloc by bloc
+@app.route('/api/voting_similarity', methods=['GET'])
+@cached_response
+def voting_similarity():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    metric = request.args.get('metric', default='pearson', type=str)
+    numberOfBlocs = request.args.get('numberOfBlocs', default=5, type=int)
+    permutations = request.args.get('permutations', default=0, type=int)
+    seed = request.args.get('seed', default=0, type=int)
+    precision = request.args.get('precision', type=int)
 
-    return jsonify(heatmap_response)
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
+    if yearRangeStart > yearRangeEnd:
+        return jsonify({"error": "yearRangeStart must not be after yearRangeEnd"}), 400
+    if metric not in similarity.METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(similarity.METRICS)}"}), 400
+    if numberOfBlocs < 1:
+        return jsonify({"error": "numberOfBlocs must be a positive integer"}), 400
+    if not 0 <= permutations <= MAX_PERMUTATIONS:
+        return jsonify({"error": f"permutations must be between 0 and {MAX_PERMUTATIONS}"}), 400
+
+    return jsonify(payloads.voting_similarity(
+        yearRangeStart, yearRangeEnd, metric, numberOfBlocs, permutations, seed, precision
+    ))
+
+
+# Endpoint: televote vs jury decomposition of the split-voting years (2016 on) in the range
+# e.g. /api/tele_jury_split?yearRangeStart=2016&yearRangeEnd=2022&precision=2
+@app.route('/api/tele_jury_split', methods=['GET'])
+@cached_response
+def tele_jury_split():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    precision = request.args.get('precision', type=int)
+
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
+
+    return jsonify(payloads.tele_jury_split(yearRangeStart, yearRangeEnd, precision))
+
+
+# Endpoint: placements of every final in the range under another scoring rule
+# e.g. /api/simulate?yearRangeStart=1975&yearRangeEnd=2022&rule=linear&exclude=Greece,Cyprus&monteCarlo=5000
+# exclude= leaves those countries' votes out; monteCarlo=N adds win probabilities over N simulations per year,
+# resampling the voters (mode=resample) or adding log-normal noise to the points (mode=perturb, noise=0.2)
+@app.route('/api/simulate', methods=['GET'])
+@cached_response
+def simulate():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    rule = request.args.get('rule', default='actual', type=str)
+    excluded = [c for arg in request.args.getlist('exclude') for c in arg.split(',') if c]
+    monteCarlo = request.args.get('monteCarlo', default=0, type=int)
+    mode = request.args.get('mode', default='resample', type=str)
+    noise = request.args.get('noise', default=0.2, type=float)
+    seed = request.args.get('seed', default=0, type=int)
+    precision = request.args.get('precision', type=int)
+
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
+    if rule not in simulation.RULES:
+        return jsonify({"error": f"rule must be one of {', '.join(simulation.RULES)}"}), 400
+    if not 0 <= monteCarlo <= MAX_SIMULATIONS:
+        return jsonify({"error": f"monteCarlo must be between 0 and {MAX_SIMULATIONS}"}), 400
+    if mode not in simulation.MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(simulation.MODES)}"}), 400
+    if not 0 < noise <= 5:
+        return jsonify({"error": "noise must be between 0 and 5"}), 400
+
+    # sorted: the response cache treats exclude as an unordered list
+    exclude = tuple(sorted(set(queries.country_codes(excluded))))
+    return jsonify(payloads.simulate(
+        yearRangeStart, yearRangeEnd, rule, exclude, monteCarlo, mode, noise, seed, precision
+    ))
 
 
 # Endpoint: Songs List
+# limit=N pages the list as {"songs", "next_cursor"}, pass next_cursor back as cursor= for the next page;
+# format=ndjson streams one song per line instead (next cursor in the X-Next-Cursor header)
 @app.route('/api/songs_list', methods=['GET'])
 def songs_list():
     # Filter songs based on year or country
     year = request.args.get('year', default=None, type=int)
     country = request.args.get('country', default=None, type=str)
+    cursor = request.args.get('cursor', default=None, type=int)
+    limit = request.args.get('limit', default=None, type=int)
+    output_format = request.args.get('format', default='json', type=str)
 
-    filtered = contestants_df
-    if year:
-        filtered = filtered[filtered['year'] == year]
-    if country:
-        filtered = filtered[filtered['to_country'] == country]
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
 
-    songs = filtered[['year', 'song', 'to_country', 'place_contest']].sort_values('year', ascending=False)
-    return jsonify(songs.to_dict(orient='records'))
+    songs, next_cursor = queries.songs(year, country, cursor, limit)
+
+    if output_format == 'ndjson':
+        response = Response(
+            stream_with_context(json.dumps(song) + "\n" for song in songs), mimetype='application/x-ndjson'
+        )
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+        return response
+
+    if limit is None:
+        return jsonify(list(songs))
+    return jsonify({"songs": list(songs), "next_cursor": next_cursor})
 
 # Endpoint: Song Details
 @app.route('/api/song_details', methods=['GET'])
@@ -271,11 +278,30 @@ def song_details():
     if not song_name:
         return jsonify({'error': 'Song name is required'}), 400
 
-    song_details = contestants_df[contestants_df['song'] == song_name].to_dict(orient='records')
-    return jsonify(song_details[0] if song_details else {'error': 'Song not found'})
+    song_details = queries.song_details(song_name)
+    return jsonify(song_details if song_details else {'error': 'Song not found'})
+
+
+def cluster_layout():
+    # format=columnar sends the clusters as {column: values} instead of one dict per country,
+    # precision=N rounds the coordinates
+    layout = 'columnar' if request.args.get('format') == 'columnar' else 'records'
+    return layout, request.args.get('precision', type=int)
+
+
+def cluster_count_error(start, end, number_of_clusters):
+    # error message for a numberOfClusters the range cannot be split into, None when it can;
+    # a range without votes has no clusters at all and answers with an empty list
+    if number_of_clusters is None or number_of_clusters < 1:
+        return "numberOfClusters must be a positive integer"
+    countries = queries.cluster_countries(start, end)
+    if number_of_clusters > countries > 0:
+        return f"numberOfClusters must be at most {countries}, the number of voting countries in the range"
+    return None
 
 
 @app.route('/api/voting_clusters', methods=['GET'])
+@cached_response
 def voting_clusters():
     # Get year range from the request
     yearRangeStart = request.args.get('yearRangeStart', type=int)
@@ -284,55 +310,16 @@ def voting_clusters():
 
     if not yearRangeStart or not yearRangeEnd:
         return jsonify({"error": "Year range parameters are required"}), 400
+    error = cluster_count_error(yearRangeStart, yearRangeEnd, numberOfClusters)
+    if error:
+        return jsonify({"error": error}), 400
 
-    # Filter the voting data based on the selected year range
-    filtered_votes = votes_df[(votes_df['year'] >= yearRangeStart) & (votes_df['year'] <= yearRangeEnd) & (votes_df['round'] == 'final')]
-
-    # Pivot table to create the voting matrix
-    voting_matrix = filtered_votes.pivot_table(
-        index='from_country_id',
-        columns='to_country_id',
-        values='perc_of_max',  # Replace with your relevant value column
-        aggfunc='sum',
-        fill_value=0
-    )
-    voting_matrix = voting_matrix.reindex(columns=all_columns, fill_value=0)
-
-    # Standardize the voting matrix
-    standardized_matrix = scaler.transform(voting_matrix)
-
-    # Reduce dimensions using PCA
-    voting_matrix_2d = pca.transform(standardized_matrix)
-    explained_variance = pca.explained_variance_ratio_ * 100  # Convert to percentage
-
-    # Apply K-Means clustering (you can adjust the number of clusters)
-    kmeans = KMeans(n_clusters=numberOfClusters, init=initial_centroids[:numberOfClusters], n_init=1, random_state=42)
-    clusters = kmeans.fit_predict(voting_matrix_2d)
-    country_dict = dict(zip(country_df['Code'], country_df['Name']))
-    region_dict = dict(zip(contestants_df['to_country_id'].str.lower(), contestants_df['region']))
-
-    # Prepare data for visualization
-    cluster_data = [
-        {
-            "country": country,
-            "x": float(voting_matrix_2d[i, 0]),  # PCA Component 1
-            "y": float(voting_matrix_2d[i, 1]),  # PCA Component 2
-            "cluster": int(clusters[i]),  # Cluster ID
-            "region": region_dict.get(country.lower(), "Non-European"), #Region for coloring
-            "country_name": country_dict.get(country.lower(), country)
-        }
-        for i, country in enumerate(voting_matrix.index)
-    ]
-
-    return  jsonify({
-        "clusters": cluster_data,
-        "explained_variance": explained_variance.tolist()
-    })
+    layout, precision = cluster_layout()
+    return jsonify(payloads.voting_clusters(yearRangeStart, yearRangeEnd, numberOfClusters, layout, precision))
 
 @app.route('/api/voting_clusters_fullname', methods=['GET'])
+@cached_response
 def voting_clusters_fullName():
-    color_palette = ['blue', 'orange', 'green', 'red', 'purple', 'brown', 'pink']  # Extend if needed
-
     # Get year range from the request
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
@@ -340,219 +327,130 @@ def voting_clusters_fullName():
 
     if not yearRangeStart or not yearRangeEnd:
         return jsonify({"error": "Year range parameters are required"}), 400
+    error = cluster_count_error(yearRangeStart, yearRangeEnd, numberOfClusters)
+    if error:
+        return jsonify({"error": error}), 400
 
-    # Filter the voting data based on the selected year range
-    filtered_votes = votes_df[
-        (votes_df['year'] >= yearRangeStart) &
-        (votes_df['year'] <= yearRangeEnd) &
-        (votes_df['round'] == 'final')
-    ]
-
-    # Pivot table to create the voting matrix
-    voting_matrix = filtered_votes.pivot_table(
-        index='from_country_id',
-        columns='to_country_id',
-        values='perc_of_max',  # Replace with your relevant value column
-        aggfunc='sum',
-        fill_value=0
-    )
-
-    # Standardize the voting matrix
-    scaler = StandardScaler()
-    standardized_matrix = scaler.fit_transform(voting_matrix)
-
-    # Reduce dimensions using PCA
-    pca = PCA(n_components=2)
-    voting_matrix_2d = pca.fit_transform(standardized_matrix)
-    explained_variance = pca.explained_variance_ratio_ * 100  # Convert to percentage
-
-    # Apply K-Means clustering (you can adjust the number of clusters)
-    kmeans = KMeans(n_clusters=numberOfClusters, random_state=42)
-    clusters = kmeans.fit_predict(voting_matrix_2d)
+    layout, precision = cluster_layout()
+    return jsonify(payloads.voting_clusters_fullname(yearRangeStart, yearRangeEnd, numberOfClusters, layout, precision))
 
-    # Use the existing `country_df` and its dictionary mapping
-    country_dict = dict(zip(country_df['Code'], country_df['Name']))
-
-    # Assign colors to clusters
-    cluster_colors = {cluster: color_palette[cluster % len(color_palette)] for cluster in range(numberOfClusters)}
-
-    # Prepare data for visualization
-    cluster_data = [
-        {
-            "country": country_dict.get(country.lower(), country),  # Convert abbreviation to full name
-            "x": float(voting_matrix_2d[i, 0]),  # PCA Component 1
-            "y": float(voting_matrix_2d[i, 1]),  # PCA Component 2
-            "cluster": int(clusters[i]),  # Cluster ID
-            "color": cluster_colors[clusters[i]]  # Cluster color
-        }
-        for i, country in enumerate(voting_matrix.index)
-    ]
-
-    # Compute regional composition
-    region_info = compute_cluster_regions(cluster_data, countries_regions_df)
-
-    return jsonify({
-        "clusters": cluster_data,
-        "explained_variance": explained_variance.tolist(),
-        "region_info": region_info
-    })
-
-
-
-def compute_cluster_regions(cluster_data, region_df):
-    # Convert cluster_data to DataFrame
-    region_df['country'] = region_df['country'].str.strip().str.lower()
-
-    cluster_df = pd.DataFrame(cluster_data)
-
-    # Map full country names to country codes
-    country_name_to_code = dict(zip(country_df['Name'], country_df['Code']))
-    cluster_df['country_code'] = cluster_df['country'].map(country_name_to_code)
 
+@app.route('/api/top5barchart', methods=['GET'])
+@cached_response
+def top5_ranking_data():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
 
-    # Debug: Check for unmapped countries
-    print("Unmapped Countries:", cluster_df[cluster_df['country_code'].isnull()])
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
 
-    # Merge cluster data with region information
-    cluster_df = cluster_df.merge(
-        region_df[['country', 'region']],
-        left_on='country_code',
-        right_on='country',
-        how='left'
-    )
+    region_rankings = payloads.top5barchart(yearRangeStart, yearRangeEnd)
 
-    # Debug: Check for missing regions after merge
-    print("Merged Data Missing Regions:", cluster_df[cluster_df['region'].isnull()])
+    logger.debug("Top 5 rankings by region (average per competition): %s", region_rankings)
+    return jsonify(region_rankings)
 
-    # Group by cluster and calculate the percentage of each region
-    region_summary = cluster_df.groupby('cluster')['region'].value_counts(normalize=True) * 100
-    region_summary = region_summary.rename("percentage").reset_index()
+@app.route('/api/top5barchartnormalized', methods=['GET'])
+@cached_response
+def top5_ranking_data_normalized():
+    yearRangeStart = request.args.get('yearRangeStart', type=int)
+    yearRangeEnd = request.args.get('yearRangeEnd', type=int)
 
-    # Format as dictionary for easier frontend use
-    region_info = {}
-    for cluster in region_summary['cluster'].unique():
-        cluster_regions = region_summary[region_summary['cluster'] == cluster]
-        # Convert cluster ID to int explicitly
-        region_info[int(cluster)] = cluster_regions[['region', 'percentage']].to_dict('records')
+    if not yearRangeStart or not yearRangeEnd:
+        return jsonify({"error": "Year range parameters are required"}), 400
 
-    return region_info
+    normalized_region_rankings = payloads.top5barchartnormalized(yearRangeStart, yearRangeEnd)
 
+    logger.debug("Top 5 rankings by region (normalized per country): %s", normalized_region_rankings)
+    return jsonify(normalized_region_rankings)
 
 
-@app.route('/api/top5barchart', methods=['GET'])
-def top5_ranking_data():
+# Endpoint: both top 5 bar charts from one computation, {"raw": ..., "normalized": ...}
+@app.route('/api/top5barchart_combined', methods=['GET'])
+@cached_response
+def top5_ranking_data_combined():
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
 
     if not yearRangeStart or not yearRangeEnd:
         return jsonify({"error": "Year range parameters are required"}), 400
 
-    # Fetch yearly rankings
-    response = requests.get(
-        "http://127.0.0.1:5000/api/yearly_rankings",
-        params={"yearRangeStart": yearRangeStart, "yearRangeEnd": yearRangeEnd},
-    )
-    yearly_rankings = response.json()
-
-    # Initialize region rankings
-    region_rankings = {}
-
-    # Iterate through yearly rankings
-    for country, years in yearly_rankings.items():
-        # Filter years to include only those in the selected range
-        filtered_years = {year: value for year, value in years.items() if yearRangeStart <= int(year) <= yearRangeEnd}
-        
-        # Calculate the total number of top 5 rankings and number of participations
-        total_top5 = sum(1 for value in filtered_years.values() if 1 <= value <= 5)
-        participations = len(filtered_years)  # Count of years with an entry
-
-        # Skip if no participations to avoid division by zero
-        if participations == 0:
-            continue
-
-        # Calculate the average number of top 5 rankings for the country
-        average_top5 = total_top5 / participations
-
-        # Find the region for the country from the DataFrame
-        region = countries_regions_df.loc[
-            countries_regions_df['country_name'] == country, 'region'
-        ].values
-
-        if len(region) == 0:
-            region = "Unknown"
-        else:
-            region = region[0]
-
-        # Aggregate by region
-        if region not in region_rankings:
-            region_rankings[region] = 0
-        region_rankings[region] += average_top5
-
-    print(f"Top 5 rankings by region (average per competition): {region_rankings}")
-    return jsonify(region_rankings)
+    return jsonify(payloads.top5barchart_combined(yearRangeStart, yearRangeEnd))
 
-@app.route('/api/top5barchartnormalized', methods=['GET'])
-def top5_ranking_data_normalized():
+
+# Endpoint: every requested panel for one year range in a single round trip
+# e.g. /api/dashboard?yearRangeStart=2000&yearRangeEnd=2010&panels=countries_in_favor,word_cloud_filter
+# stream=true answers as NDJSON, one {"panel", "data"} line as soon as each panel is ready
+@app.route('/api/dashboard', methods=['GET'])
+def dashboard():
     yearRangeStart = request.args.get('yearRangeStart', type=int)
     yearRangeEnd = request.args.get('yearRangeEnd', type=int)
+    panels = [p for arg in request.args.getlist('panels') for p in arg.split(',') if p] or list(payloads.PANELS)
+    stream = request.args.get('stream', default='false').lower() == 'true'
 
     if not yearRangeStart or not yearRangeEnd:
         return jsonify({"error": "Year range parameters are required"}), 400
 
-    # Fetch yearly rankings
-    response = requests.get(
-        "http://127.0.0.1:5000/api/yearly_rankings",
-        params={"yearRangeStart": yearRangeStart, "yearRangeEnd": yearRangeEnd},
-    )
-    yearly_rankings = response.json()
-
-    # Initialize region rankings and country counts
-    region_rankings = {}
-    region_country_counts = countries_regions_df.groupby('region')['country_name'].count().to_dict()
-
-    # Iterate through yearly rankings
-    for country, years in yearly_rankings.items():
-        # Filter years to include only those in the selected range
-        filtered_years = {year: value for year, value in years.items() if yearRangeStart <= int(year) <= yearRangeEnd}
-        
-        # Calculate the total number of top 5 rankings and number of participations
-        total_top5 = sum(1 for value in filtered_years.values() if 1 <= value <= 5)
-        participations = len(filtered_years)  # Count of years with an entry
-
-        # Skip if no participations to avoid division by zero
-        if participations == 0:
-            continue
-
-        # Calculate the average number of top 5 rankings for the country
-        average_top5 = total_top5 / participations
-
-        # Find the region for the country from the DataFrame
-        region = countries_regions_df.loc[
-            countries_regions_df['country_name'] == country, 'region'
-        ].values
-
-        if len(region) == 0:
-            region = "Unknown"
-        else:
-            region = region[0]
-
-        # Aggregate by region
-        if region not in region_rankings:
-            region_rankings[region] = 0
-        region_rankings[region] += average_top5
-
-    # Normalize region rankings by the number of countries in each region
-    normalized_region_rankings = {
-        region: region_rankings[region] / region_country_counts.get(region, 1)
-        for region in region_rankings
+    unknown = [p for p in panels if p not in payloads.PANELS]
+    if unknown:
+        return jsonify({"error": f"Unknown panels: {', '.join(unknown)}"}), 400
+
+    selectedCountries = [c for arg in request.args.getlist('countries') for c in arg.split(',') if c]
+    params = {
+        'start': yearRangeStart,
+        'end': yearRangeEnd,
+        'number_of_clusters': request.args.get('numberOfClusters', default=3, type=int),
+        'countries': queries.filter_countries(
+            yearRangeStart, yearRangeEnd, request.args.get('filter', default='All', type=str), selectedCountries
+        ),
     }
 
-    print(f"Top 5 rankings by region (normalized per country): {normalized_region_rankings}")
-    return jsonify(normalized_region_rankings)
+    if stream:
+        def generate():
+            for panel in panels:
+                yield json.dumps({"panel": panel, "data": payloads.PANELS[panel](params)}) + "\n"
 
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
+    return jsonify({panel: payloads.PANELS[panel](params) for panel in panels})
 
 
+# Endpoint: append a new contest year to the loaded dataset, see src/ingest.py
+# POST {"year": 2023, "votes": [...], "contestants": [...], "maxPoints": 24, "persist": false};
+# votes / contestants are rows in the raw votes.csv / contestants.csv layout and default to that
+# year's rows of those files. Disabled unless EUROTRASH_INGEST_TOKEN is set and sent as X-Ingest-Token.
+@app.route('/api/admin/ingest', methods=['POST'])
+def ingest_year():
+    from . import ingest  # imported here so python -m src.ingest does not import itself twice
+
+    token = os.environ.get('EUROTRASH_INGEST_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Ingest-Token', ''), token):
+        return jsonify({"error": "Ingest is disabled or the token is wrong"}), 403
+
+    body = request.get_json(silent=True) or {}
+    year = body.get('year')
+    if not isinstance(year, int):
+        return jsonify({"error": "Year parameter is required"}), 400
+
+    try:
+        summary = ingest.ingest_year(
+            year,
+            ingest.parse_rows(body.get('votes')),
+            ingest.parse_rows(body.get('contestants')),
+            body.get('maxPoints'),
+            bool(body.get('persist', False)),
+        )
+    except (ValueError, KeyError) as error:
+        return jsonify({"error": f"Cannot ingest {year}: {error}"}), 400
+    return jsonify(summary)
+
+
+# Endpoint: response cache counters, plus the precomputed store's in precomputed mode
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    stats = response_cache.stats()
+    if precomputed is not None:
+        stats['precomputed'] = precomputed.stats()
+    return jsonify(stats)
 
 
 # Run Flask app
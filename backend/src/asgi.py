@@ -0,0 +1,205 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from . import app as flask_app
+from . import data, instrumentation
+
+
+# Async serving mode: an ASGI app around the Flask app, e.g.
+#
+#   uvicorn src.asgi:app --port 5000        or        python serve.py --asgi
+#
+# Lookups (LIGHT_PATHS) are answered directly on the event loop, so they may only read what is
+# already in memory; song_details is not one of them, its first call loads the cold columns.
+# Every other request runs the Flask app in a bounded thread pool, so one slow K-means fit no
+# longer holds up the rest:
+#   - identical concurrent GET requests share one computation (request coalescing)
+#   - a request gets EUROTRASH_REQUEST_TIMEOUT seconds before it is answered with 504, the
+#     computation itself finishes in the background and still fills the caches
+#   - with EUROTRASH_MAX_PENDING computations queued or running, new ones are refused with 503
+# Threads rather than processes: the dataset, the caches and ingests live in this process, and
+# the numpy / scikit-learn work releases the GIL.
+#
+#   EUROTRASH_POOL_SIZE=N           threads computing responses (default: one per CPU)
+#   EUROTRASH_MAX_PENDING=N         computations queued or running before 503 (default: 4 per thread)
+#   EUROTRASH_REQUEST_TIMEOUT=S     seconds before 504 (default 30)
+
+LIGHT_PATHS = {'/api/available_years', '/api/available_countries', '/metrics', '/api/cache_stats'}
+
+# Request headers that change the response, part of the coalescing key
+VARYING_HEADERS = (b'accept', b'accept-encoding', b'if-none-match')
+
+POOL_SIZE = int(os.environ.get('EUROTRASH_POOL_SIZE', os.cpu_count() or 1))
+MAX_PENDING = int(os.environ.get('EUROTRASH_MAX_PENDING', 4 * POOL_SIZE))
+REQUEST_TIMEOUT = float(os.environ.get('EUROTRASH_REQUEST_TIMEOUT', 30))
+
+async_requests = instrumentation.Counter(
+    'eurotrash_async_requests_total',
+    'Requests of the async server by how they were answered: inline, pooled, coalesced, timeout or rejected',
+    ('outcome',),
+)
+instrumentation.METRICS.append(async_requests)
+
+
+def wsgi_environ(scope, body):
+    # WSGI environ of an ASGI HTTP request (PEP 3333 strings: latin-1 decoded bytes)
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value.decode('latin-1')
+            continue
+        key = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """(status code, [(name, value)], body) of a WSGI call, streamed bodies are read to the end."""
+    started = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+        return chunks.append
+
+    result = wsgi_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(started['status'].split(' ', 1)[0]), started['headers'], b''.join(chunks)
+
+
+def coalescing_key(scope):
+    # Identical requests: same path, same parameters in any order, same negotiated headers
+    headers = dict(scope['headers'])
+    params = tuple(sorted(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)))
+    return scope['method'], scope['path'], params, tuple(headers.get(name) for name in VARYING_HEADERS)
+
+
+class AsyncApp:
+    """ASGI app serving a WSGI app: light paths inline, the rest pooled, coalesced, timed out and bounded."""
+
+    def __init__(self, wsgi_app, pool_size=POOL_SIZE, max_pending=MAX_PENDING, timeout=REQUEST_TIMEOUT,
+                 light_paths=LIGHT_PATHS):
+        self.wsgi_app = wsgi_app
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.light_paths = light_paths
+        self._pool = None
+        self._in_flight = {}  # coalescing key -> asyncio.Future of (status, headers, body)
+        self._pending = 0  # computations submitted to the pool and not finished yet
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.pool_size, thread_name_prefix='eurotrash-compute')
+        return self._pool
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, headers, body = await self._respond(scope, await _read_body(receive))
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            })
+            await send({'type': 'http.response.body', 'body': body if scope['method'] != 'HEAD' else b''})
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # load the dataset before the first request, off the event loop
+                await asyncio.get_running_loop().run_in_executor(self.pool, data.get_dataset)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _respond(self, scope, body):
+        environ = wsgi_environ(scope, body)
+        if scope['path'] in self.light_paths:
+            async_requests.inc('inline')
+            return call_wsgi(self.wsgi_app, environ)
+
+        coalesce = scope['method'] in ('GET', 'HEAD')
+        key = coalescing_key(scope) if coalesce else None
+        future = self._in_flight.get(key) if coalesce else None
+        if future is not None:
+            async_requests.inc('coalesced')
+        else:
+            if self._pending >= self.max_pending:
+                async_requests.inc('rejected')
+                return _error(503, "Server busy, retry shortly", [('Retry-After', '1')])
+            future = self._submit(environ, key)
+            async_requests.inc('pooled')
+
+        try:
+            # shielded: a timed-out waiter must not cancel the computation other waiters share
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            async_requests.inc('timeout')
+            return _error(504, f"Request did not finish within {self.timeout:g}s")
+
+    def _submit(self, environ, key):
+        self._pending += 1
+        future = asyncio.wrap_future(self.pool.submit(call_wsgi, self.wsgi_app, environ))
+        if key is not None:
+            self._in_flight[key] = future
+
+        def finished(_):
+            self._pending -= 1
+            if key is not None and self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        future.add_done_callback(finished)
+        return future
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def _error(status, message, headers=()):
+    body = flask_app.json.dumps({"error": message}).encode('utf-8')
+    return status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body))), *headers], body
+
+
+app = AsyncApp(flask_app)
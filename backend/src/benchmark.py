@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlencode
+
+import numpy as np
+import pandas as pd
+
+
+# Replays a dashboard session against the Flask app through its test client (no network)
+# and reports latency percentiles, throughput and peak RSS per endpoint:
+#
+#   python -m src.benchmark --output bench.json                 # current dataset
+#   python -m src.benchmark --compare old.json                  # ... and diff against an earlier run
+#   python -m src.benchmark --scale 1 10 100 --output scale.json
+#
+# The first pass starts from empty caches (cold), later passes replay the same requests
+# against warm caches. --scale N replicates every contestants / votes row N times within
+# the same years and benchmarks the copy in a subprocess, so the dataset env vars apply.
+# Requests that do not answer 200 are counted as errors and listed with their URLs.
+
+ENDPOINTS_PER_RANGE = [
+    'most_dominating_countries', 'yearly_rankings', 'word_cloud', 'top5barchart', 'top5barchartnormalized',
+]
+# the analysis panels, on the sampled ranges
+ANALYSIS_ENDPOINTS = ['top5barchart_combined', 'tele_jury_split', 'dashboard']
+FILTERS = ['All', 'Top 5', 'Worst 5']
+CLUSTER_COUNTS = range(2, 8)
+SIMULATION_RULES = ['actual', 'eurovision', 'linear', 'jury_only', 'tele_only']
+SEARCHES = ['love', 'fire', '"love you"', 'dance tonight', 'heart']
+COUNTRIES = ['Sweden', 'Italy', 'Ukraine', 'United Kingdom', 'Norway']
+
+
+def build_workload(first, last, width=10, step=1, every=5, songs=(), countries=COUNTRIES):
+    """(endpoint, url) pairs in the order a user clicking through the dashboard sends them.
+
+    songs are titles to open with song_details, countries the ones picked in the country filters.
+    """
+    requests = []
+
+    def add(endpoint, **params):
+        query = urlencode(params, safe=',', quote_via=quote)
+        requests.append((endpoint, f'/api/{endpoint}?{query}' if query else f'/api/{endpoint}'))
+
+    # the dashboard's first load
+    add('available_years')
+    add('available_countries')
+
+    # year slider dragged across the whole range, then the start handle dragged up to the end
+    ranges = [(start, start + width - 1) for start in range(first, last - width + 2, step)]
+    ranges += [(start, last) for start in range(last - width + 2, last + 1, step)]
+    for start, end in ranges:
+        for endpoint in ENDPOINTS_PER_RANGE:
+            add(endpoint, yearRangeStart=start, yearRangeEnd=end)
+
+    # word cloud filter toggles, cluster counts and the analysis panels on a few of those ranges
+    sampled = ranges[::every] + [(first, last), (last - 2, last)]
+    selected = ','.join(countries)
+    for start, end in sampled:
+        for chosen in FILTERS:
+            add('word_cloud_filter', yearRangeStart=start, yearRangeEnd=end, filter=chosen)
+        for k in CLUSTER_COUNTS:
+            add('voting_clusters', yearRangeStart=start, yearRangeEnd=end, numberOfClusters=k)
+            add('voting_clusters_fullname', yearRangeStart=start, yearRangeEnd=end, numberOfClusters=k)
+        for endpoint in ANALYSIS_ENDPOINTS:
+            add(endpoint, yearRangeStart=start, yearRangeEnd=end)
+        add('country_trajectories', yearRangeStart=start, yearRangeEnd=end, countries=selected)
+        add('voting_similarity', yearRangeStart=start, yearRangeEnd=end)
+        add('voting_similarity', yearRangeStart=start, yearRangeEnd=end, metric='cosine', permutations=1000)
+        for rule in SIMULATION_RULES:
+            add('simulate', yearRangeStart=start, yearRangeEnd=end, rule=rule)
+        add('simulate', yearRangeStart=start, yearRangeEnd=end, exclude=countries[0], monteCarlo=500)
+        for query in SEARCHES:
+            add('lyrics_search', q=query, yearRangeStart=start, yearRangeEnd=end)
+
+    # song list by year and by country, a few pages of the full list, and some songs opened
+    for year in range(first, last + 1, every):
+        add('songs_list', year=year)
+    for country in countries:
+        add('songs_list', country=country)
+    add('songs_list', limit=50)
+    for cursor in range(49, 49 + 50 * 4, 50):
+        add('songs_list', limit=50, cursor=cursor)
+    for title in songs:
+        add('song_details', song=title)
+    add('cache_stats')
+
+    # heatmap over single years, decades and everything
+    heatmap_ranges = [(year, year) for year in range(first, last + 1, every)]
+    heatmap_ranges += [(start, min(start + 9, last)) for start in range(first, last + 1, 10)] + [(first, last)]
+    for start, end in heatmap_ranges:
+        add('countries_in_favor', yearRangeStart=start, yearRangeEnd=end)
+    return requests
+
+
+def current_rss():
+    # resident set size in bytes, the lifetime peak where /proc is not available
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def clear_caches():
+    # Empty every response / query / clustering cache, the next request is cold
+    from . import data, queries
+    from .cache import response_cache
+
+    response_cache.invalidate()
+    for value in vars(queries).values():
+        if hasattr(value, 'cache_clear'):
+            value.cache_clear()
+    data.dataset.global_clusters.clear()
+    data.dataset.range_clusters.clear()
+
+
+def summarize(latencies, rss):
+    latencies = np.array(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "mean_ms": round(latencies.mean() * 1000, 3),
+        "throughput_rps": round(len(latencies) / latencies.sum(), 1),
+        "peak_rss_mb": round(max(rss) / 1e6, 1),
+    }
+
+
+def run_benchmark(passes=2, width=10, step=1):
+    from . import app, data
+
+    started = time.perf_counter()
+    dataset = data.get_dataset()
+    startup = time.perf_counter() - started
+
+    years = dataset.contestants_df['year']
+    songs = dataset.contestants_df['song'].iloc[::50].tolist()
+    workload = build_workload(int(years.min()), int(years.max()), width, step, songs=songs)
+    client = app.test_client()
+    clear_caches()
+
+    results, failures = {}, {}
+    wall_started = time.perf_counter()
+    for pass_no in range(passes):
+        phase = 'cold' if pass_no == 0 else 'warm'
+        for endpoint, url in workload:
+            request_started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            elapsed = time.perf_counter() - request_started
+            if response.status_code != 200:
+                failures.setdefault(url, []).append(response.status_code)
+            latencies, rss = results.setdefault(endpoint, {}).setdefault(phase, ([], []))
+            latencies.append(elapsed)
+            rss.append(current_rss())
+    wall = time.perf_counter() - wall_started
+
+    total = len(workload) * passes
+    return {
+        "rows": {"contestants": len(dataset.contestants_df), "votes": len(dataset.votes_df)},
+        "startup_s": round(startup, 3),
+        "requests": total,
+        "errors": sum(len(statuses) for statuses in failures.values()),
+        # URL -> status of every failed request, one per pass
+        "failures": failures,
+        "throughput_rps": round(total / wall, 1),
+        "peak_rss_mb": round(peak_rss() / 1e6, 1),
+        "endpoints": {
+            endpoint: {phase: summarize(*samples) for phase, samples in phases.items()}
+            for endpoint, phases in results.items()
+        },
+    }
+
+
+def replicate_dataset(factor, dataset_dir, out_dir):
+    """Copy of the dataset with every contestants / votes row repeated factor times, same years."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ['contestants_cleaned.csv', 'votes_cleaned.csv']:
+        df = pd.read_csv(os.path.join(dataset_dir, name))
+        pd.concat([df] * factor, ignore_index=True).to_csv(os.path.join(out_dir, name), index=False)
+    for name in ['countries.csv', 'country_mapping_iso.csv']:
+        shutil.copy(os.path.join(dataset_dir, name), out_dir)
+
+
+def run_scaled(factor, passes, width, step):
+    from . import data
+
+    with tempfile.TemporaryDirectory(prefix=f'eurotrash-x{factor}-') as tmp_dir:
+        replicate_dataset(factor, data.DATASET_DIR, tmp_dir)
+        output = os.path.join(tmp_dir, 'result.json')
+        env = dict(os.environ, EUROTRASH_DATASET_DIR=tmp_dir, EUROTRASH_SNAPSHOT_DIR=os.path.join(tmp_dir, 'snapshot'))
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run(
+            [sys.executable, '-m', 'src.benchmark', '--passes', str(passes), '--width', str(width),
+             '--step', str(step), '--output', output, '--quiet'],
+            cwd=backend_dir, env=env, check=True,
+        )
+        with open(output) as file:
+            return json.load(file)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def print_result(result):
+    print(f"contestants {result['rows']['contestants']}, votes {result['rows']['votes']}, "
+          f"startup {result['startup_s']:.2f}s, {result['requests']} requests, {result['errors']} errors, "
+          f"{result['throughput_rps']} req/s, peak RSS {result['peak_rss_mb']} MB")
+    for url, statuses in result.get('failures', {}).items():
+        print(f"  {', '.join(map(str, statuses))}  {url}")
+    print(f"{'endpoint':<28}{'phase':<6}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'RSS MB':>9}")
+    for endpoint, phases in result['endpoints'].items():
+        for phase, s in phases.items():
+            print(f"{endpoint:<28}{phase:<6}{s['requests']:>6}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                  f"{s['p99_ms']:>10.2f}{s['throughput_rps']:>10.1f}{s['peak_rss_mb']:>9.1f}")
+
+
+def print_comparison(baseline, result):
+    # p50 / p95 of this run relative to the baseline, > 1 is slower
+    print(f"\nvs {baseline.get('commit') or 'baseline'}")
+    print(f"{'endpoint':<28}{'phase':<6}{'p50 ratio':>11}{'p95 ratio':>11}")
+    for endpoint, phases in result['endpoints'].items():
+        for phase, s in phases.items():
+            old = baseline.get('endpoints', {}).get(endpoint, {}).get(phase)
+            if old:
+                print(f"{endpoint:<28}{phase:<6}{s['p50_ms'] / old['p50_ms']:>11.2f}{s['p95_ms'] / old['p95_ms']:>11.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the API with a replayed dashboard workload")
+    parser.add_argument('--passes', type=int, default=2, help="first pass cold, the rest warm")
+    parser.add_argument('--width', type=int, default=10, help="year slider window")
+    parser.add_argument('--step', type=int, default=1, help="years the slider moves per step")
+    parser.add_argument('--scale', type=int, nargs='+', help="replication factors to benchmark, e.g. 1 10 100")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--compare', help="earlier JSON result to compare against")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    if args.scale:
+        report = {"commit": git_commit(), "scales": {}}
+        for factor in args.scale:
+            result = run_scaled(factor, args.passes, args.width, args.step)
+            report["scales"][str(factor)] = result
+            if not args.quiet:
+                print(f"\n== x{factor}")
+                print_result(result)
+    else:
+        report = dict(run_benchmark(args.passes, args.width, args.step), commit=git_commit())
+        if not args.quiet:
+            print_result(report)
+        if args.compare:
+            with open(args.compare) as file:
+                print_comparison(json.load(file), report)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
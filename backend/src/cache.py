@@ -0,0 +1,266 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, has_request_context, request
+
+from . import data
+from .encoding import JSON_MIMETYPE, MATRIX_MIMETYPE
+from .response_store import ResponseStore
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        # Drop every entry, or only the keys the predicate matches
+        with self._lock:
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = LRUCache(maxsize=int(os.environ.get('EUROTRASH_CACHE_SIZE', 1024)))
+
+# Precomputed mode: EUROTRASH_PRECOMPUTED=<store built by python -m src.precompute> answers cache
+# misses from the store before computing them live
+precomputed = ResponseStore.open(os.environ.get('EUROTRASH_PRECOMPUTED'))
+
+# LRUCache of every memoized() query function
+query_caches = []
+
+# Endpoints whose answers depend on every year (e.g. BM25 statistics), dropped on any data change
+UNBOUNDED_PATHS = {'/api/lyrics_search'}
+
+
+def put_if_current(cache, key, value, version):
+    # Store only while data.dataset is still the dataset the value was computed from
+    with data.swap_lock:
+        if data.dataset.version == version:
+            cache.put(key, value)
+
+
+# memoized() entry of a None result, since LRUCache.get() answers a miss with None
+_NONE = object()
+
+
+def memoized(maxsize=256):
+    """functools.lru_cache for the query layer, with entries invalidate_years() can drop selectively."""
+    def decorator(func):
+        cache = LRUCache(maxsize)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            value = cache.get(key)
+            if value is None:
+                version = data.dataset.version
+                value = func(*args, **kwargs)
+                put_if_current(cache, key, _NONE if value is None else value, version)
+            return None if value is _NONE else value
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.invalidate
+        query_caches.append(cache)
+        return wrapper
+
+    return decorator
+
+
+def invalidate_years(first, last):
+    """Drop every cached response and query result whose year range overlaps first..last.
+
+    Range queries take (start, end, ...) and range endpoints yearRangeStart / yearRangeEnd,
+    anything without both is dropped too. Returns the number of entries removed.
+    """
+    def overlaps(start, end):
+        return start <= last and end >= first
+
+    def response_affected(key):
+        path, params = key
+        params = dict(params)
+        try:
+            return path in UNBOUNDED_PATHS or overlaps(int(params['yearRangeStart']), int(params['yearRangeEnd']))
+        except (KeyError, ValueError):
+            return True
+
+    def query_affected(key):
+        args = key[0]
+        if len(args) >= 2 and isinstance(args[0], int) and isinstance(args[1], int):
+            return overlaps(args[0], args[1])
+        return True
+
+    removed = response_cache.invalidate(response_affected)
+    return removed + sum(cache.invalidate(query_affected) for cache in query_caches)
+
+
+# Parameters whose value is an unordered, comma-separated list
+LIST_PARAMS = {'countries', 'exclude'}
+
+# Parameters the routes read with type=int, so " 05" and "5" mean the same; everything else
+# (q, filter, country, ...) is keyed exactly as sent
+INT_PARAMS = {
+    'yearRangeStart', 'yearRangeEnd', 'numberOfClusters', 'numberOfBlocs', 'window', 'limit', 'cursor',
+    'year', 'precision', 'permutations', 'seed', 'monteCarlo',
+}
+
+# Response types a route can negotiate through the Accept header, JSON unless asked otherwise
+REPRESENTATIONS = [JSON_MIMETYPE, MATRIX_MIMETYPE]
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+
+def _normalize(name, values):
+    if name in LIST_PARAMS:
+        return ','.join(sorted({v for value in values for v in value.split(',') if v}))
+    # request.args.get() reads the first value of a repeated parameter
+    value = values[0]
+    if name in INT_PARAMS:
+        try:
+            return str(int(value))
+        except ValueError:
+            pass
+    return value
+
+
+def _blank(name, values):
+    # An empty list or integer parameter reads as absent; an empty string parameter does not
+    # (filter= is not the filter default)
+    return (name in LIST_PARAMS or name in INT_PARAMS) and not any(value.strip() for value in values)
+
+
+def negotiated_mimetype():
+    # Best of REPRESENTATIONS for the request's Accept header
+    return request.accept_mimetypes.best_match(REPRESENTATIONS, default=JSON_MIMETYPE)
+
+
+def cache_key(path=None, args=None, accept=None):
+    # (endpoint path, sorted normalized parameters), so ?a=1&b=02 and ?b=2&a=1 share an entry;
+    # a non-JSON Accept representation is part of the key
+    path = request.path if path is None else path
+    args = request.args if args is None else args
+    if accept is None and has_request_context():
+        accept = negotiated_mimetype()
+    params = sorted((name, _normalize(name, args.getlist(name))) for name in args if not _blank(name, args.getlist(name)))
+    if accept and accept != JSON_MIMETYPE:
+        params.append(('accept', accept))
+    return path, tuple(params)
+
+
+def content_encoding():
+    # brotli when installed and accepted, else gzip, else None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def make_etag(key):
+    # Strong ETag: the same request against the same dataset always produces the same body
+    return hashlib.sha1(f"{data.dataset.version}:{key!r}".encode()).hexdigest()
+
+
+def cached_response(view):
+    """Serve a GET endpoint from the response cache, answering If-None-Match with 304.
+
+    Only successful responses are cached, errors are recomputed every time. Misses are
+    looked up in the precomputed store first, when one is configured. Bodies of
+    MIN_COMPRESS_SIZE and up are sent gzip / brotli compressed when the client accepts
+    it, the compressed variants are cached next to the plain body and get their own
+    ETag (suffixed with the encoding).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = cache_key()
+        etag = make_etag(key)
+        encoding = content_encoding()
+
+        # The ETag only depends on the request and the dataset, so a revalidation needs no work
+        for candidate in [etag, f"{etag}-{encoding}"] if encoding else [etag]:
+            if request.if_none_match.contains_weak(candidate):
+                response = Response(status=304)
+                response.set_etag(candidate)
+                response.vary.update(['Accept', 'Accept-Encoding'])
+                return response
+
+        entry = response_cache.get(key)
+        if entry is None:
+            version = data.dataset.version
+            stored = precomputed.get(key, version) if precomputed is not None else None
+            if stored is not None:
+                entry = (*stored, {})
+            else:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                entry = (response.get_data(), response.mimetype, {})
+            put_if_current(response_cache, key, entry, version)
+
+        body, mimetype, compressed = entry
+        response = Response(body, mimetype=mimetype)
+        if encoding and len(body) >= MIN_COMPRESS_SIZE:
+            if encoding not in compressed:
+                compressed[encoding] = compress(body, encoding)
+            response.set_data(compressed[encoding])
+            response.headers['Content-Encoding'] = encoding
+            etag = f"{etag}-{encoding}"
+        response.set_etag(etag)
+        response.vary.update(['Accept', 'Accept-Encoding'])
+        # let browsers keep the body but revalidate it with the ETag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
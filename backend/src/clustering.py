@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+
+# numberOfClusters values the frontend offers, solved together for every year range
+CLUSTER_COUNTS = range(2, 8)
+
+initial_centroids = np.random.RandomState(42).rand(6, 2)  # Adjust dimensions to match your data
+
+
+class Projection:
+    def __init__(self, countries, points, explained_variance):
+        self.countries = countries  # country codes, one per row of points
+        self.points = points  # 2-D coordinates
+        self.explained_variance = explained_variance  # percentage per component
+
+
+class ClusteringEngine:
+    """K-means solutions for every cluster count, cached per year range.
+
+    Every range ending in the same year is warm-started from, and has its labels matched to,
+    one reference: the range from the first year to that end. The references form a chain,
+    (first, end) is warm-started from (first, end - 1), solved first when missing. So moving
+    either end of the slider by a year converges in a couple of iterations and keeps cluster
+    ids (and colours) stable, a new range costs one solve once its reference is cached, and
+    a solution depends only on (start, end, number of clusters), not on which ranges were
+    asked for before. Ranges without votes get no solutions and are no neighbour to others.
+    project(start, end) returns the Projection to cluster, with no points for such a range.
+    """
+
+    def __init__(self, project, first_year, last_year, align_axes=False, initial_centroids=None,
+                 cluster_counts=CLUSTER_COUNTS, maxsize=512):
+        self.project = project
+        # years with votes, ranges are clipped to them
+        self.first_year = first_year
+        self.last_year = last_year
+        # cold-start centroids, k-means++ when missing or too few
+        self.initial_centroids = initial_centroids
+        # per-range PCA axes can flip sign between ranges, align them to the neighbour first
+        self.align_axes = align_axes
+        self.cluster_counts = list(cluster_counts)
+        self.maxsize = maxsize
+        self._ranges = OrderedDict()  # (start, end) -> (Projection, {k: (labels, centroids)})
+        self._lock = threading.Lock()
+
+    def _cached(self, start, end):
+        with self._lock:
+            entry = self._ranges.get((start, end))
+            if entry is not None:
+                self._ranges.move_to_end((start, end))
+            return entry
+
+    def _solve_range(self, start, end, neighbour):
+        # Solve every cluster count of one range, warm-started from neighbour's solutions when given
+        projection = self.project(start, end)
+        if neighbour is not None and self.align_axes:
+            _align_axes(projection, neighbour[0])
+        solutions = {k: self._fit(projection, k, neighbour) for k in self.cluster_counts}
+        entry = (projection, {k: solution for k, solution in solutions.items() if solution is not None})
+        with self._lock:
+            self._ranges[(start, end)] = entry
+            while len(self._ranges) > self.maxsize:
+                self._ranges.popitem(last=False)
+        return entry
+
+    def _reference(self, end):
+        # (first year, end), after the missing ranges of the chain from the latest cached (first year, e < end)
+        first = end
+        neighbour = self._cached(self.first_year, end)
+        while neighbour is None and first > self.first_year:
+            neighbour = self._cached(self.first_year, first - 1)
+            if neighbour is None:
+                first -= 1
+        for chain_end in range(first, end + 1):
+            entry = self._cached(self.first_year, chain_end) or self._solve_range(self.first_year, chain_end, neighbour)
+            if len(entry[0].countries):
+                neighbour = entry
+        return entry
+
+    def solve(self, start, end, number_of_clusters=None):
+        """(Projection, {number of clusters: (labels, centroids)}) for the year range.
+
+        Every count in cluster_counts is solved on the first call for a range, other
+        counts are added, from a cold start, when they are first asked for. Counts above
+        the number of projected countries have no solution.
+        """
+        start, end = max(start, self.first_year), min(end, self.last_year)
+        entry = self._cached(start, end)
+        if entry is None:
+            if start > end:
+                entry = self._solve_range(start, end, None)
+            elif start == self.first_year:
+                entry = self._reference(end)
+            else:
+                reference = self._reference(end)
+                entry = self._solve_range(start, end, reference if len(reference[0].countries) else None)
+
+        projection, solutions = entry
+        if number_of_clusters is not None and number_of_clusters not in solutions:
+            solution = self._fit(projection, number_of_clusters, None)
+            if solution is not None:
+                solutions[number_of_clusters] = solution
+        return entry
+
+    def _fit(self, projection, k, neighbour):
+        if k < 1 or len(projection.points) < k:
+            return None
+        previous = neighbour[1].get(k) if neighbour is not None else None
+        if previous is None:
+            init = 'k-means++'
+            if self.initial_centroids is not None and k <= len(self.initial_centroids):
+                init = self.initial_centroids[:k]
+            kmeans = KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+        else:
+            # warm start from the neighbour's centroids
+            kmeans = KMeans(n_clusters=k, init=previous[1], n_init=1, random_state=42)
+        labels = kmeans.fit_predict(projection.points)
+        centroids = kmeans.cluster_centers_
+        if previous is not None:
+            labels, centroids = _match_labels(projection, labels, centroids, neighbour[0], previous[0], k)
+        return labels, centroids
+
+    def clear(self):
+        with self._lock:
+            self._ranges.clear()
+
+    def inherit(self, other, keep):
+        # Copy the solutions of other's ranges for which keep(start, end) holds, e.g. after an ingest
+        with other._lock:
+            ranges = [(key, entry) for key, entry in other._ranges.items() if keep(*key)]
+        with self._lock:
+            self._ranges.update(ranges)
+
+
+def empty_projection():
+    # Projection of a range without votes
+    return Projection([], np.empty((0, 2)), np.zeros(2))
+
+
+def _shared(projection, reference):
+    # row positions of the countries present in both projections
+    ref_rows = {country: i for i, country in enumerate(reference.countries)}
+    rows = [i for i, country in enumerate(projection.countries) if country in ref_rows]
+    return np.array(rows, dtype=int), np.array([ref_rows[projection.countries[i]] for i in rows], dtype=int)
+
+
+def _align_axes(projection, reference):
+    # Flip each component whose direction disagrees with the reference on the shared countries
+    rows, ref_rows = _shared(projection, reference)
+    if len(rows) == 0:
+        return
+    signs = np.sign((projection.points[rows] * reference.points[ref_rows]).sum(axis=0))
+    signs[signs == 0] = 1
+    projection.points = projection.points * signs
+
+
+def _match_labels(projection, labels, centroids, reference, ref_labels, k):
+    # Relabel so each cluster takes the id of the reference cluster sharing most of its countries
+    rows, ref_rows = _shared(projection, reference)
+    overlap = np.zeros((k, k))
+    np.add.at(overlap, (labels[rows], ref_labels[ref_rows]), 1)
+    new_ids, old_ids = linear_sum_assignment(-overlap)
+    mapping = np.empty(k, dtype=int)
+    mapping[new_ids] = old_ids
+    relabelled_centroids = np.empty_like(centroids)
+    relabelled_centroids[mapping] = centroids
+    return mapping[labels], relabelled_centroids
+
+
+def global_pca_engine(dataset):
+    # Ranges projected onto the global scaler + PCA, so every range shares one plane
+    def project(start, end):
+        voting_matrix = dataset.vote_cube.pivot(start, end, columns=dataset.all_columns)
+        if voting_matrix.empty:
+            return empty_projection()
+        points = dataset.pca.transform(dataset.scaler.transform(voting_matrix))
+        return Projection(voting_matrix.index.tolist(), points, dataset.pca.explained_variance_ratio_ * 100)
+
+    cube = dataset.vote_cube
+    return ClusteringEngine(project, cube.first_year, cube.last_year, initial_centroids=initial_centroids)
+
+
+def range_pca_engine(dataset):
+    # Scaler + PCA fitted to each range on its own
+    def project(start, end):
+        voting_matrix = dataset.vote_cube.pivot(start, end)
+        # PCA needs two countries with votes
+        if min(voting_matrix.shape) < 2:
+            return empty_projection()
+        standardized_matrix = StandardScaler().fit_transform(voting_matrix)
+        pca = PCA(n_components=2)
+        points = pca.fit_transform(standardized_matrix)
+        return Projection(voting_matrix.index.tolist(), points, pca.explained_variance_ratio_ * 100)
+
+    cube = dataset.vote_cube
+    return ClusteringEngine(project, cube.first_year, cube.last_year, align_axes=True)
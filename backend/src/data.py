@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+from . import clustering
+from .lyrics_index import LyricsIndex
+from .placements import PlacementMatrix
+from .search_index import SearchIndex
+from .simulation import Simulator
+from .song_index import SongIndex
+from .tele_jury import TeleJurySplit
+from .voting_cube import VotingCube
+
+logger = logging.getLogger(__name__)
+
+
+# Dataset locations, configurable through the environment
+DATASET_DIR = os.environ.get(
+    'EUROTRASH_DATASET_DIR', os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'dataset'))
+)
+SNAPSHOT_DIR = os.environ.get('EUROTRASH_SNAPSHOT_DIR', os.path.join(DATASET_DIR, 'snapshot'))
+# Output directory of python -m src.lyrics_pipeline, its word cloud index replaces the lyrics_token column's
+LYRICS_TOKENS_DIR = os.environ.get('EUROTRASH_LYRICS_TOKENS')
+
+DATASET_FILES = ['contestants_cleaned.csv', 'votes_cleaned.csv', 'countries.csv', 'country_mapping_iso.csv']
+
+# contestants_df columns the analytic endpoints touch, everything else (lyrics, composers,
+# youtube_url, ...) is only loaded when song_details first asks for it
+HOT_CONTESTANT_COLUMNS = ['year', 'to_country_id', 'to_country', 'song', 'place_contest', 'per_of_pot_max', 'region']
+
+
+def compact_contestants(contestants_df):
+    # Hot columns only, as compact typed arrays
+    return pd.DataFrame({
+        'year': contestants_df['year'].astype('int16'),
+        'to_country_id': contestants_df['to_country_id'].astype('category'),
+        'to_country': contestants_df['to_country'].astype('category'),
+        'song': contestants_df['song'],
+        'place_contest': contestants_df['place_contest'].astype('float32'),
+        'per_of_pot_max': contestants_df['per_of_pot_max'].astype('float32'),
+        'region': contestants_df['region'].astype('category'),
+    })
+
+
+def compact_votes(votes_df):
+    # int16 years and points, category rounds / country codes, float32 percentages and an is_final mask
+    return pd.DataFrame({
+        'year': votes_df['year'].astype('int16'),
+        'round': votes_df['round'].astype('category'),
+        'is_final': (votes_df['round'] == 'final').to_numpy(),
+        'from_country_id': votes_df['from_country_id'].astype('category'),
+        'to_country_id': votes_df['to_country_id'].astype('category'),
+        'total_points': votes_df['total_points'].astype('int16'),
+        'tele_points': votes_df['tele_points'].astype('float32'),
+        'jury_points': votes_df['jury_points'].astype('float32'),
+        'max points per country': votes_df['max points per country'].astype('int16'),
+        'perc_of_max': votes_df['perc_of_max'].astype('float32'),
+        'tele_percentage': votes_df['tele_percentage'].astype('float32'),
+        'jury_percentage': votes_df['jury_percentage'].astype('float32'),
+    })
+
+
+def native(value):
+    # Python scalar for JSON, float32 values at their shortest decimal form (34.4, not 34.400001525878906)
+    if isinstance(value, np.float32):
+        return float(str(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class Dataset:
+    """The loaded DataFrames plus every structure derived from them at startup.
+
+    Derived structures are built from the DataFrames unless they are passed in,
+    e.g. memory-mapped from a snapshot.
+    """
+
+    def __init__(self, contestants_df, votes_df, countries_regions_df, country_df, version='',
+                 vote_cube=None, lyrics_index=None, load_cold=None, contestant_columns=None, search_index=None,
+                 global_projection=None):
+        self.version = version  # content hash of the source files, used for cache validation
+        self.contestants_df = contestants_df
+        self.votes_df = votes_df
+        self.countries_regions_df = countries_regions_df
+        self.country_df = country_df
+
+        # Cumulative [round, points type, year, from, to] cube, every vote-matrix query reads from it
+        self.vote_cube = vote_cube if vote_cube is not None else VotingCube.from_votes(votes_df)
+
+        # Tokenized lyrics as a sparse entry x word count matrix for the word cloud queries
+        self.lyrics_index = lyrics_index if lyrics_index is not None else LyricsIndex.from_contestants(contestants_df)
+
+        if global_projection is not None:
+            # (all_columns, scaler, pca) kept from an earlier dataset, see src/ingest.py
+            self.all_columns, self.scaler, self.pca = global_projection
+        else:
+            # Global voting matrix over all rounds and years
+            voting_matrix = self.vote_cube.pivot(round=self.vote_cube.rounds)
+            self.all_columns = voting_matrix.columns.tolist()
+
+            # Standardize the voting matrix
+            self.scaler = StandardScaler()
+            standardized_matrix = self.scaler.fit_transform(voting_matrix)
+
+            # global PCA for stable plotting
+            self.pca = PCA(n_components=2)
+            self.pca.fit(standardized_matrix)
+
+        # per-year televote / jury totals of the final for the tele vs jury endpoint
+        self.tele_jury = TeleJurySplit(self.vote_cube)
+
+        # per-year points of the final by type, voter and receiver for the scoring simulations
+        self.simulator = Simulator(votes_df)
+
+        # year x country placements with integer region ids
+        self.placements = PlacementMatrix(contestants_df, countries_regions_df)
+
+        # year / country / title lookups for the song list and details
+        self.song_index = SongIndex(contestants_df)
+
+        # Warm-started K-means per year range for both clustering endpoints
+        self.global_clusters = clustering.global_pca_engine(self)
+        self.range_clusters = clustering.range_pca_engine(self)
+
+        # Cold contestants_df columns, loaded on first use
+        self.contestant_columns = contestant_columns or contestants_df.columns.tolist()
+        self._load_cold = load_cold
+        self._cold_df = None
+        self._cold_lock = threading.Lock()
+
+        # Positional index over lyrics_english (a cold column), built on first use unless passed in
+        self._search_index = search_index
+        self._search_lock = threading.Lock()
+
+    def cold_contestants(self):
+        """The contestants_df columns that are not kept in memory, same row order."""
+        with self._cold_lock:
+            if self._cold_df is None:
+                self._cold_df = self._load_cold() if self._load_cold else pd.DataFrame(index=self.contestants_df.index)
+            return self._cold_df
+
+    def search_index(self):
+        """The lyrics_english SearchIndex, rows in contestants_df order."""
+        with self._search_lock:
+            if self._search_index is None:
+                self._search_index = SearchIndex.from_texts(self.cold_contestants()['lyrics_english'])
+            return self._search_index
+
+    def contestant_record(self, row):
+        # Every column of one contestants row as a dict, in the source column order
+        hot = self.contestants_df
+        cold = self.cold_contestants() if len(hot.columns) < len(self.contestant_columns) else None
+        return {
+            column: native(hot[column].iloc[row] if column in hot.columns else cold[column].iloc[row])
+            for column in self.contestant_columns
+        }
+
+
+def dataset_version(dataset_dir=DATASET_DIR):
+    # sha1 over the contents of every source file
+    digest = hashlib.sha1()
+    for name in DATASET_FILES:
+        with open(os.path.join(dataset_dir, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def read_csvs(dataset_dir=DATASET_DIR):
+    contestants_df = pd.read_csv(os.path.join(dataset_dir, 'contestants_cleaned.csv'))
+    votes_df = pd.read_csv(os.path.join(dataset_dir, 'votes_cleaned.csv'))
+    countries_regions_df = pd.read_csv(os.path.join(dataset_dir, 'countries.csv'))
+    country_df = pd.read_csv(os.path.join(dataset_dir, 'country_mapping_iso.csv'))
+    country_df['Code'] = country_df['Code'].str.lower()
+    # region lookups join on lowercase ISO codes
+    countries_regions_df['country'] = countries_regions_df['country'].str.strip().str.lower()
+
+    # derived structures come from the full-precision frames, the Dataset keeps the compact ones
+    return Dataset(
+        compact_contestants(contestants_df), compact_votes(votes_df), countries_regions_df, country_df,
+        dataset_version(dataset_dir),
+        vote_cube=VotingCube.from_votes(votes_df),
+        lyrics_index=read_lyrics_index(contestants_df),
+        load_cold=lambda: read_cold_contestants(dataset_dir),
+        contestant_columns=contestants_df.columns.tolist(),
+    )
+
+
+def read_lyrics_index(contestants_df, tokens_dir=None):
+    # Word cloud index from the lyric token store when one is configured and built from these lyrics
+    tokens_dir = tokens_dir or LYRICS_TOKENS_DIR
+    if tokens_dir:
+        from . import lyrics_pipeline
+
+        index = lyrics_pipeline.load_store(tokens_dir, contestants_df)
+        if index is not None:
+            return index
+        logger.warning("No lyric token store for the current lyrics in %s, using the lyrics_token column", tokens_dir)
+    return LyricsIndex.from_contestants(contestants_df)
+
+
+def read_cold_contestants(dataset_dir=DATASET_DIR):
+    path = os.path.join(dataset_dir, 'contestants_cleaned.csv')
+    return pd.read_csv(path, usecols=lambda column: column not in HOT_CONTESTANT_COLUMNS)
+
+
+def load_dataset(dataset_dir=DATASET_DIR, snapshot_dir=SNAPSHOT_DIR):
+    # Memory-map the binary snapshot when it is up to date, parse the CSVs otherwise
+    from . import snapshot
+
+    if snapshot.is_fresh(snapshot_dir, dataset_dir):
+        return snapshot.load_snapshot(snapshot_dir)
+    logger.warning("No up-to-date snapshot in %s, reading CSVs from %s", snapshot_dir, dataset_dir)
+    return read_csvs(dataset_dir)
+
+
+_load_lock = threading.Lock()
+# held while data.dataset is replaced, caches only store results of the dataset still in place
+swap_lock = threading.RLock()
+
+
+def get_dataset():
+    # Load on first use, so importing the package (e.g. for the snapshot build) stays cheap
+    global dataset
+    with _load_lock:
+        if 'dataset' not in globals():
+            dataset = load_dataset()
+    return dataset
+
+
+def swap_dataset(new_dataset, invalidate=None):
+    """Replace data.dataset in one step, then drop the cache entries invalidate() picks.
+
+    Requests already running may finish on the old dataset, the caches do not keep their results.
+    """
+    global dataset
+    with swap_lock:
+        dataset = new_dataset
+        if invalidate is not None:
+            invalidate()
+
+
+def __getattr__(name):
+    # data.dataset resolves lazily through get_dataset()
+    if name == 'dataset':
+        return get_dataset()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
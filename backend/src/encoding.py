@@ -0,0 +1,52 @@
+import json
+import struct
+
+import numpy as np
+
+
+# Compact response representations, picked by content negotiation in the routes.
+#
+# Binary matrix (MATRIX_MIMETYPE), little-endian:
+#   uint32 header length | UTF-8 JSON header, space-padded to a multiple of 4 bytes | float32 row-major data
+# The header holds {"countries": [...], "shape": [rows, cols], "dtype": "float32"}, so a browser can
+# read it with one DataView call and wrap the rest in a Float32Array without copying:
+#   const n = new DataView(buf).getUint32(0, true)
+#   const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 4, n)))
+#   const matrix = new Float32Array(buf, 4 + n, header.shape[0] * header.shape[1])
+
+JSON_MIMETYPE = 'application/json'
+MATRIX_MIMETYPE = 'application/octet-stream'
+
+
+def encode_matrix(countries, matrix):
+    matrix = np.ascontiguousarray(matrix, dtype='<f4')
+    header = json.dumps({"countries": list(countries), "shape": list(matrix.shape), "dtype": "float32"}).encode('utf-8')
+    # data starts 4-byte aligned so it can be viewed as a Float32Array in place
+    header += b' ' * (-(4 + len(header)) % 4)
+    return struct.pack('<I', len(header)) + header + matrix.tobytes()
+
+
+def decode_matrix(body):
+    (length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + length].decode('utf-8'))
+    matrix = np.frombuffer(body, dtype='<f4', offset=4 + length).reshape(header['shape'])
+    return header['countries'], matrix
+
+
+def rounded(values, precision=None):
+    # float array as (nested) lists, rounded to precision decimals when given
+    values = np.asarray(values)
+    return (values if precision is None else np.round(values, precision)).tolist()
+
+
+def frame(df, layout='records', precision=None):
+    """A DataFrame as a list of row dicts ('records') or as {column: values} ('columnar')."""
+    if layout == 'records' and precision is None:
+        return df.to_dict(orient='records')
+    columns = {
+        column: rounded(df[column].to_numpy(), precision) if df[column].dtype.kind == 'f' else df[column].tolist()
+        for column in df.columns
+    }
+    if layout == 'columnar':
+        return columns
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
@@ -0,0 +1,306 @@
+import argparse
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import data
+from .cache import invalidate_years, query_caches, response_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Adds one new contest year to the running app without a restart:
+#
+#   python -m src.ingest --year 2023 --write      # derive the cleaned rows from dataset/votes.csv +
+#                                                 # contestants.csv and append them to the *_cleaned.csv files
+#   POST /api/admin/ingest {"year": 2023}          # same rows, appended to the loaded dataset in place
+#
+# The derived columns (max points per country, perc_of_max, per_of_pot_max, lyrics_token, region, ...)
+# are computed for the new rows only, the same way the cleaning notebook (data_review.ipynb) computes
+# them for the whole table. The voting cube, lyrics and search indexes are extended instead of rebuilt,
+# the global scaler / PCA is kept unless the year brings a new country, and only cache entries whose
+# year range includes the new year are dropped.
+#
+# Every gunicorn worker holds its own dataset: the endpoint updates the worker that answers it, so with
+# more than one worker persist the rows (--write / "persist": true) and reload the workers instead.
+
+VOTE_COLUMNS = [
+    'year', 'round', 'from_country_id', 'to_country_id', 'total_points', 'tele_points', 'jury_points',
+    'max points per country', 'perc_of_max', 'tele_percentage', 'jury_percentage',
+]
+CONTESTANT_COLUMNS = [
+    'year', 'to_country_id', 'to_country', 'performer', 'song', 'place_contest', 'place_final', 'points_final',
+    'points_tele_final', 'points_jury_final', 'composers', 'youtube_url', 'winner', 'top5', 'finalist',
+    'lyrics_english', 'total_without_contestant', 'per_of_pot_max', 'lyrics_token', 'tele_percentage',
+    'jury_percentage', 'region',
+]
+
+# Country name spellings of the raw file the cleaned data replaces
+COUNTRY_NAMES = {'Czechia': 'Czech Republic', 'North MacedoniaN.Macedonia': 'North Macedonia'}
+
+# Fallback tokenizer when spaCy is not installed: words minus the usual English function words
+WORD = re.compile(r'[a-z]+')
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i if in into is it its itself just let me more most my myself no nor not now of off
+on once only or other our ours ourselves out over own same she should so some such than that the their theirs
+them themselves then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours yourself yourselves oh ooh yeah la na hey whoa ll re ve don won ain
+""".split())
+
+_nlp = None
+_ingest_lock = threading.Lock()
+
+
+def _spacy():
+    # en_core_web_sm pipeline, False when spaCy or the model is missing
+    global _nlp
+    if _nlp is None:
+        try:
+            import spacy
+            _nlp = spacy.load('en_core_web_sm')
+        except (ImportError, OSError):
+            logger.warning("spaCy / en_core_web_sm not available, lyrics_token falls back to stopword filtering")
+            _nlp = False
+    return _nlp
+
+
+def lyric_tokens(text):
+    # noun lemmas of one lyrics_english text with spaCy, the remaining words after stopword filtering without
+    if not isinstance(text, str):
+        return []
+    nlp = _spacy()
+    if nlp:
+        return [token.lemma_ for token in nlp(text) if token.pos_ == 'NOUN']
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+def tokenizer_name():
+    # which tokenizer lyric_tokens uses here, e.g. for cache keys
+    nlp = _spacy()
+    return f"spacy:{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}" if nlp else 'stopwords'
+
+
+def tokenize_lyrics(text):
+    """lyrics_token value of one lyrics_english text: the noun lemmas as a str(list), like the notebook."""
+    return str(lyric_tokens(text))
+
+
+def rules_max_points(raw_votes):
+    # Points one country can give one entry: 12, or 24 since jury and televote are split (2016)
+    split = raw_votes['tele_points'].notna().any() and raw_votes['jury_points'].notna().any()
+    if split:
+        return int(max(raw_votes['tele_points'].max(), raw_votes['jury_points'].max())) * 2
+    return int(raw_votes['total_points'].max())
+
+
+def derive_votes(raw_votes, max_points=None):
+    """votes_cleaned rows for the raw votes.csv rows of one year."""
+    votes = raw_votes[VOTE_COLUMNS[:7]].reset_index(drop=True)
+    max_points = max_points or rules_max_points(raw_votes)
+    share = 100 / max_points
+
+    votes['max points per country'] = max_points
+    votes['perc_of_max'] = (votes['total_points'] * share).round(1).where(votes['round'] == 'final')
+    votes['tele_percentage'] = (votes['tele_points'] * share).round(1)
+    votes['jury_percentage'] = (votes['jury_points'] * share).round(1)
+    return votes
+
+
+def unique_entries(raw_contestants):
+    # contestants.csv repeats some entries, e.g. a second 2023 row with only the semi-final results:
+    # one row per entry, the one with the contest results
+    has_results = raw_contestants[['place_contest', 'points_final']].notna()
+    order = np.lexsort((~has_results['points_final'].to_numpy(), ~has_results['place_contest'].to_numpy()))
+    contestants = (
+        raw_contestants.iloc[order]
+        .drop_duplicates(['year', 'to_country_id', 'song'])
+        .sort_index()
+        .reset_index(drop=True)
+    )
+    repeated = contestants.loc[contestants.duplicated(['year', 'to_country_id'], keep=False), 'to_country_id']
+    if not repeated.empty:
+        raise ValueError(f"More than one entry for {', '.join(sorted(set(repeated.astype(str))))}")
+    return contestants
+
+
+def derive_contestants(raw_contestants, votes, countries_regions_df):
+    """contestants_cleaned rows for the raw contestants.csv rows of one year, votes from derive_votes().
+
+    Raises ValueError unless there is one entry per country and year once duplicate rows are dropped.
+    """
+    contestants = unique_entries(raw_contestants)
+    contestants['song'] = contestants['song'].fillna(contestants['performer'])
+    contestants['to_country'] = contestants['to_country'].replace(COUNTRY_NAMES)
+
+    # every final voter but the entry's own country can give it the maximum
+    final_voters = votes.loc[votes['round'] == 'final', 'from_country_id'].nunique()
+    total_without_contestant = (final_voters - 1) * int(votes['max points per country'].iloc[0])
+    share = 100 / total_without_contestant
+
+    contestants['place_final'] = contestants['place_final'].astype(object).where(
+        contestants['place_final'].notna(), 'non-qualified'
+    )
+    contestants['winner'] = (contestants['place_contest'] == 1).astype(int)
+    contestants['top5'] = contestants['place_contest'].between(1, 5).astype(int)
+    contestants['finalist'] = (contestants['place_final'] != 'non-qualified').astype(int)
+
+    # contestants.csv only has the original lyrics (newlines escaped as \n),
+    # an English translation can be supplied as lyrics_english
+    lyrics = contestants['lyrics'].str.replace('\\n', '\n', regex=False)
+    if 'lyrics_english' not in contestants:
+        contestants['lyrics_english'] = lyrics
+    contestants['lyrics_english'] = contestants['lyrics_english'].fillna(lyrics)
+    contestants['lyrics_token'] = contestants['lyrics_english'].map(tokenize_lyrics)
+
+    contestants['total_without_contestant'] = total_without_contestant
+    contestants['per_of_pot_max'] = (contestants['points_final'] * share).round(1).fillna(0.0)
+    contestants['tele_percentage'] = (contestants['points_tele_final'] * share).round(1)
+    contestants['jury_percentage'] = (contestants['points_jury_final'] * share).round(1)
+
+    regions = dict(zip(countries_regions_df['country'], countries_regions_df['region']))
+    contestants['region'] = contestants['to_country_id'].map(regions)
+    return contestants[CONTESTANT_COLUMNS]
+
+
+def read_raw(year, dataset_dir=data.DATASET_DIR):
+    # The year's rows of the raw votes.csv / contestants.csv
+    votes = pd.read_csv(os.path.join(dataset_dir, 'votes.csv'))
+    contestants = pd.read_csv(os.path.join(dataset_dir, 'contestants.csv'))
+    return votes[votes['year'] == year], contestants[contestants['year'] == year]
+
+
+def _validate(year, raw_votes, raw_contestants, last_year):
+    if year <= last_year:
+        raise ValueError(f"Only years after {last_year} can be ingested")
+    if raw_votes.empty or raw_contestants.empty:
+        raise ValueError(f"No votes or contestants for {year}")
+    for name, df in [('votes', raw_votes), ('contestants', raw_contestants)]:
+        if (df['year'] != year).any():
+            raise ValueError(f"Every {name} row must be from {year}")
+
+
+def _invalidate_all():
+    response_cache.invalidate()
+    for cache in query_caches:
+        cache.invalidate()
+
+
+def ingest_year(year, raw_votes=None, raw_contestants=None, max_points=None, persist=False):
+    """Append one contest year to data.dataset and swap it in, returns a summary dict.
+
+    raw_votes / raw_contestants are rows in the raw votes.csv / contestants.csv layout and default to
+    that year's rows of those files. max_points overrides the points one country can give one entry.
+    """
+    with _ingest_lock:
+        started = time.perf_counter()
+        if raw_votes is None or raw_contestants is None:
+            file_votes, file_contestants = read_raw(year)
+            raw_votes = file_votes if raw_votes is None else raw_votes
+            raw_contestants = file_contestants if raw_contestants is None else raw_contestants
+
+        old = data.get_dataset()
+        _validate(year, raw_votes, raw_contestants, int(old.contestants_df['year'].max()))
+
+        votes = derive_votes(raw_votes, max_points)
+        contestants = derive_contestants(raw_contestants, votes, old.countries_regions_df)
+
+        # prefix sums and token indexes grow by the new rows, nothing already built is recomputed
+        vote_cube = old.vote_cube.append(votes)
+        lyrics_index = old.lyrics_index.append(contestants)
+        search_index = old._search_index.append(contestants['lyrics_english']) if old._search_index else None
+
+        # same countries keep the global scaler / PCA, so cached global clusters of other years stay valid
+        same_countries = np.array_equal(vote_cube.countries, old.vote_cube.countries)
+        cold_columns = [c for c in old.contestant_columns if c not in data.HOT_CONTESTANT_COLUMNS]
+        cold_rows = contestants.reindex(columns=cold_columns)
+
+        version = hashlib.sha1(f"{old.version}+{year}:{len(votes)}:{len(contestants)}".encode()).hexdigest()
+        dataset = data.Dataset(
+            data.compact_contestants(pd.concat([old.contestants_df, contestants], ignore_index=True)),
+            data.compact_votes(pd.concat([old.votes_df, votes], ignore_index=True)),
+            old.countries_regions_df,
+            old.country_df,
+            version,
+            vote_cube=vote_cube,
+            lyrics_index=lyrics_index,
+            load_cold=lambda: pd.concat([old.cold_contestants(), cold_rows], ignore_index=True),
+            contestant_columns=old.contestant_columns,
+            search_index=search_index,
+            global_projection=(old.all_columns, old.scaler, old.pca) if same_countries else None,
+        )
+
+        # clustering solutions of ranges without the new year carry over
+        def unaffected(start, end):
+            return not start <= year <= end
+
+        dataset.range_clusters.inherit(old.range_clusters, unaffected)
+        if same_countries:
+            dataset.global_clusters.inherit(old.global_clusters, unaffected)
+
+        data.swap_dataset(dataset, (lambda: invalidate_years(year, year)) if same_countries else _invalidate_all)
+
+        if persist:
+            write_cleaned(votes, contestants)
+
+        summary = {
+            "year": year,
+            "votes": len(votes),
+            "contestants": len(contestants),
+            "max_points": int(votes['max points per country'].iloc[0]),
+            "refit_projection": not same_countries,
+            "persisted": persist,
+            "version": version,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info("Ingested %s", summary)
+        return summary
+
+
+def write_cleaned(votes, contestants, dataset_dir=data.DATASET_DIR):
+    # Append the derived rows to the cleaned CSVs, so the next start (or snapshot build) includes them
+    for name, rows in [('votes_cleaned.csv', votes), ('contestants_cleaned.csv', contestants)]:
+        path = os.path.join(dataset_dir, name)
+        columns = pd.read_csv(path, nrows=0).columns
+        rows.reindex(columns=columns).to_csv(path, mode='a', header=False, index=False)
+
+
+def parse_rows(rows):
+    # Request body rows (list of dicts) as a DataFrame, None when not given
+    return pd.DataFrame(rows) if rows is not None else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Derive the cleaned rows of a new contest year")
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--votes', help="raw votes CSV (default: the year's rows of dataset/votes.csv)")
+    parser.add_argument('--contestants', help="raw contestants CSV (default: dataset/contestants.csv)")
+    parser.add_argument('--max-points', type=int, help="points one country can give one entry")
+    parser.add_argument('--write', action='store_true', help="append the rows to the *_cleaned.csv files")
+    args = parser.parse_args()
+
+    raw_votes, raw_contestants = read_raw(args.year)
+    if args.votes:
+        raw_votes = pd.read_csv(args.votes)
+    if args.contestants:
+        raw_contestants = pd.read_csv(args.contestants)
+
+    last_year = int(pd.read_csv(os.path.join(data.DATASET_DIR, 'contestants_cleaned.csv'), usecols=['year'])['year'].max())
+    _validate(args.year, raw_votes, raw_contestants, last_year)
+    countries_regions_df = pd.read_csv(os.path.join(data.DATASET_DIR, 'countries.csv'))
+    countries_regions_df['country'] = countries_regions_df['country'].str.strip().str.lower()
+
+    derived_votes = derive_votes(raw_votes, args.max_points)
+    derived_contestants = derive_contestants(raw_contestants, derived_votes, countries_regions_df)
+    print(f"{args.year}: {len(derived_votes)} votes, {len(derived_contestants)} contestants, "
+          f"max points per country {derived_votes['max points per country'].iloc[0]}")
+    if args.write:
+        write_cleaned(derived_votes, derived_contestants)
+        print("Appended to the cleaned CSVs, rebuild the snapshot with python -m src.snapshot")
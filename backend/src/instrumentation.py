@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+
+
+# Request instrumentation: per-route latency histograms split into stages, request /
+# response sizes and optional tracemalloc peaks, served in the Prometheus text format
+# at /metrics. Every instrumented response also carries a Server-Timing header.
+#
+#   EUROTRASH_LOG_LEVEL=DEBUG   log level of the eurotrash loggers (default WARNING)
+#   EUROTRASH_TRACEMALLOC=1     record peak traced memory per request (slows every request down)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+TRACEMALLOC = os.environ.get('EUROTRASH_TRACEMALLOC', '') not in ('', '0')
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, like a Prometheus histogram."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, counts in series:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {counts[-1]}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+request_latency = Histogram(
+    'eurotrash_request_duration_seconds', 'Request latency by route and stage, stage="total" is the whole request',
+    ('route', 'stage'), LATENCY_BUCKETS,
+)
+request_size = Histogram('eurotrash_request_size_bytes', 'Query string plus body size', ('route',), SIZE_BUCKETS)
+response_size = Histogram('eurotrash_response_size_bytes', 'Response body size', ('route',), SIZE_BUCKETS)
+peak_memory = Histogram(
+    'eurotrash_request_peak_memory_bytes', 'tracemalloc peak during the request (EUROTRASH_TRACEMALLOC=1)',
+    ('route',), SIZE_BUCKETS + (16777216, 67108864, 268435456),
+)
+requests_total = Counter('eurotrash_requests_total', 'Requests by route and status', ('route', 'status'))
+
+METRICS = [request_latency, request_size, response_size, peak_memory, requests_total]
+
+
+class StageTimer:
+    # Exclusive time per stage: entering a nested stage pauses the enclosing one
+    def __init__(self):
+        self.durations = {}
+        self._stack = []  # [name, resumed at]
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            self._charge(now)
+        self._stack.append([name, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        self._charge(now)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def _charge(self, now):
+        name, resumed = self._stack[-1]
+        self.durations[name] = self.durations.get(name, 0.0) + now - resumed
+
+
+_timer = contextvars.ContextVar('eurotrash_stage_timer', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Charge the enclosed work to a stage of the current request, no-op outside a request."""
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify() time is the serialize stage
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.instrumentation_token = _timer.set(StageTimer())
+    g.instrumentation_started = time.perf_counter()
+    if TRACEMALLOC:
+        # process-wide peak, concurrent requests share it
+        tracemalloc.reset_peak()
+
+
+def _after_request(response):
+    started = g.pop('instrumentation_started', None)
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    timer = _timer.get()
+    _timer.reset(g.pop('instrumentation_token'))
+
+    route = _route()
+    request_latency.observe(total, route, 'total')
+    for name, duration in timer.durations.items():
+        request_latency.observe(duration, route, name)
+    request_size.observe(len(request.query_string) + (request.content_length or 0), route)
+    if not response.is_streamed:
+        response_size.observe(response.calculate_content_length() or 0, route)
+    if TRACEMALLOC:
+        peak_memory.observe(tracemalloc.get_traced_memory()[1], route)
+    requests_total.inc(route, response.status_code)
+
+    timings = [f"{name};dur={duration * 1000:.2f}" for name, duration in timer.durations.items()]
+    response.headers['Server-Timing'] = ', '.join(timings + [f"total;dur={total * 1000:.2f}"])
+    return response
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def configure_logging():
+    # Leveled eurotrash logging, silent below WARNING unless EUROTRASH_LOG_LEVEL says otherwise
+    level = os.environ.get('EUROTRASH_LOG_LEVEL', 'WARNING').upper()
+    package_logger = logging.getLogger(__name__.rsplit('.', 1)[0])
+    package_logger.setLevel(level)
+    if not package_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        package_logger.addHandler(handler)
+
+
+def init_app(app):
+    configure_logging()
+    if TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -1,42 +1,150 @@
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import json
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # Load environment variables from .env
 load_dotenv()
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+# point at a local stub (python -m src.llm.stub_server) to run without the real API
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL', "https://api.groq.com/openai/v1")
+GROQ_MODEL = os.getenv('GROQ_MODEL', "llama3-8b-8192")
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 30)
+# status codes worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_prompt(prompt_file_path):
+    # Parsed prompt messages, re-read only when the file changes
+    path = os.path.abspath(prompt_file_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _templates_lock:
+        cached = _templates.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'r') as file:
+        messages = tuple((m["role"], m["content"]) for m in json.load(file)["messages"])
+    with _templates_lock:
+        _templates[path] = (mtime, messages)
+    return messages
+
+
+def render(template, company_name, placeholder="{company}"):
+    # Replace {company} (or another placeholder) in the prompt
+    return [{"role": role, "content": content.replace(placeholder, company_name)} for role, content in template]
+
+
+def response_key(model, template, company_name, placeholder="{company}"):
+    # content address of a completion: same model, prompt and substitution -> same answer
+    payload = {"model": model, "prompt": template, "company": company_name}
+    if placeholder != "{company}":
+        payload["placeholder"] = placeholder
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
 
 
 class GroqClient:
-    def __init__(self):
-        self.api_key = GROQ_API_KEY
-        self.base_url = "https://api.groq.com/openai/v1"
+    """Chat completions over one keep-alive session, with cached prompts and responses.
 
-    def generate_poem(self, company_name, prompt_file_path):
-        url = f"{self.base_url}/chat/completions"
-        headers = {
+    Successful completions are kept in memory by response_key, so asking again for the
+    same model, prompt and company does not hit the API.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model=GROQ_MODEL, timeout=TIMEOUT,
+                 pool_size=10, max_retries=3, backoff=0.5, cache_size=1024):
+        self.api_key = api_key or GROQ_API_KEY
+        self.base_url = (base_url or GROQ_BASE_URL).rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
-        }
-        # Load prompt file
-        with open(prompt_file_path, 'r') as file:
-            messages_data = json.load(file)
-
-        # Replace {company_name} in the prompt
-        for message in messages_data["messages"]:
-            message["content"] = message["content"].replace("{company}", company_name)
-
-        # Make the API request
-        response = requests.post(url, json={"model": "llama3-8b-8192", "messages": messages_data["messages"]},
-                                 headers=headers)
-        print("this is response", response)
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            return f"Error: {response.status_code}"
+        })
+
+        self.cache_size = cache_size
+        self._responses = OrderedDict()
+        self._responses_lock = threading.Lock()
+
+    def _complete(self, messages):
+        # POST with retries on connection errors and retryable statuses, exponential backoff with jitter
+        url = f"{self.base_url}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.post(url, json={"model": self.model, "messages": messages}, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    return None, "Error: connection failed"
+            else:
+                if response.status_code == 200:
+                    try:
+                        content = response.json()["choices"][0]["message"]["content"]
+                    except (KeyError, IndexError, TypeError, ValueError):
+                        content = None
+                    if not isinstance(content, str):
+                        return None, "Error: malformed response"
+                    return content, None
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return None, f"Error: {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+
+    def generate_poem(self, company_name, prompt_file_path):
+        return self.generate(prompt_file_path, company_name)
+
+    def generate(self, prompt_file_path, value, placeholder="{company}"):
+        # Completion of a prompt file with placeholder replaced by value, "Error: ..." on failure
+        template = load_prompt(prompt_file_path)
+        key = response_key(self.model, template, value, placeholder)
+        with self._responses_lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+
+        answer, error = self._complete(render(template, value, placeholder))
+        if error is not None:
+            return error
+
+        with self._responses_lock:
+            self._responses[key] = answer
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+        return answer
+
+    def generate_batch(self, company_names, prompt_file_path, max_concurrency=4, placeholder="{company}"):
+        # {company: answer} for every name, at most max_concurrency requests in flight
+        names = list(dict.fromkeys(company_names))
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            answers = pool.map(lambda name: self.generate(prompt_file_path, name, placeholder), names)
+            return dict(zip(names, answers))
+
+    def close(self):
+        self.session.close()
+
 
 if __name__ == '__main__':
     client = GroqClient()
     answer = client.generate_poem('UBS','llm/prompts/groq_api_poem.json')
-    print(answer)
\ No newline at end of file
+    print(answer)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local stand-in for the Groq chat completions endpoint, for running GroqClient offline:
+#   python -m src.llm.stub_server --port 8765
+#   GROQ_BASE_URL=http://127.0.0.1:8765 python ...
+# Answers echo the last user message. fail_first makes the first N requests return 503
+# and delay slows every answer down, to exercise retries and concurrency limits; max_in_flight
+# is the most requests the stub was answering at once.
+
+class StubGroqServer:
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, fail_first=0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.requests = []  # request bodies in arrival order
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.requests.append(body)
+                    failing = len(stub.requests) <= stub.fail_first
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    self._answer(body, failing)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _answer(self, body, failing):
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                if self.path.rstrip('/') != '/chat/completions':
+                    self._reply(404, {"error": {"message": "not found"}})
+                elif failing:
+                    self._reply(503, {"error": {"message": "stub failure"}})
+                else:
+                    user = [m['content'] for m in body.get('messages', []) if m.get('role') == 'user']
+                    self._reply(200, {
+                        "model": body.get('model'),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": f"stub: {user[-1] if user else ''}"}}],
+                    })
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up waiting, e.g. a read timeout
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stub Groq chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--fail-first', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubGroqServer(args.host, args.port, args.delay, args.fail_first)
+    print(f"Stub Groq API on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
@@ -0,0 +1,136 @@
+import re
+
+import numpy as np
+from scipy import sparse
+
+
+NON_ALPHA = re.compile(r'[^a-zA-Z\s]')
+
+
+def tokenize(lyrics_token):
+    # Same cleanup the word cloud endpoints always used: strip everything but letters, lowercase, split
+    return NON_ALPHA.sub('', lyrics_token).lower().split()
+
+
+class LyricsIndex:
+    """Sparse entry x vocabulary token counts built once from contestants_df['lyrics_token'].
+
+    Rows follow the contestants_df row order. Top-k words for any year range or
+    country subset come from a sparse row-sum instead of re-joining and re-parsing
+    the lyric strings on every request.
+    """
+
+    def __init__(self, vocabulary, counts, first_seen, years, countries):
+        self.vocabulary = vocabulary  # np.array of words, ids in order of first appearance
+        self.counts = counts  # scipy.sparse.csr_matrix, entries x vocabulary
+        self.first_seen = first_seen  # same sparsity, corpus length minus the word's first token offset in the entry
+        self.years = years  # year of every entry
+        self.countries = countries  # to_country of every entry
+
+        # year index: entries sorted by year so a range is one searchsorted + slice
+        self._by_year = np.argsort(years, kind='stable')
+        self._sorted_years = years[self._by_year]
+
+        # country index: to_country -> entry rows
+        self._by_country = {}
+        for row, country in enumerate(countries):
+            self._by_country.setdefault(country, []).append(row)
+        self._by_country = {country: np.array(rows) for country, rows in self._by_country.items()}
+
+    @classmethod
+    def from_contestants(cls, contestants_df):
+        word_ids = {}
+        counts, first_seen, corpus_length = _count_tokens(contestants_df['lyrics_token'], word_ids, len(contestants_df))
+        return cls(
+            np.array(list(word_ids), dtype=object),
+            counts,
+            first_seen,
+            contestants_df['year'].to_numpy(),
+            contestants_df['to_country'].to_numpy(dtype=object),
+        )
+
+    def append(self, contestants_df):
+        """New index with the rows of contestants_df added after the existing entries."""
+        word_ids = {word: i for i, word in enumerate(self.vocabulary)}
+        # existing first-seen values count back from the end of the corpus, which moves by the added tokens
+        offset = int(self.counts.data.sum())
+        counts, first_seen, added_length = _count_tokens(contestants_df['lyrics_token'], word_ids, len(contestants_df), offset)
+        shape = (self.counts.shape[0] + len(contestants_df), len(word_ids))
+
+        def stack(old, new):
+            old = sparse.csr_matrix((old.data, old.indices, old.indptr), shape=(old.shape[0], shape[1]))
+            return sparse.vstack([old, sparse.csr_matrix(new, shape=(new.shape[0], shape[1]))], format='csr')
+
+        old_first_seen = sparse.csr_matrix(
+            (np.asarray(self.first_seen.data) + added_length, self.first_seen.indices, self.first_seen.indptr),
+            shape=self.first_seen.shape,
+        )
+        return LyricsIndex(
+            np.array(list(word_ids), dtype=object),
+            stack(self.counts, counts),
+            stack(old_first_seen, first_seen),
+            np.concatenate([self.years, contestants_df['year'].to_numpy()]),
+            np.concatenate([self.countries, contestants_df['to_country'].to_numpy(dtype=object)]),
+        )
+
+    def rows(self, start, end, countries=None):
+        """Entry rows for the inclusive year range, optionally limited to some countries."""
+        lo = np.searchsorted(self._sorted_years, start, side='left')
+        hi = np.searchsorted(self._sorted_years, end, side='right')
+        rows = self._by_year[lo:hi]
+        if countries is not None:
+            country_rows = [self._by_country[c] for c in countries if c in self._by_country]
+            country_rows = np.concatenate(country_rows) if country_rows else np.array([], dtype=int)
+            rows = np.intersect1d(rows, country_rows)
+        return rows
+
+    def word_counts(self, rows):
+        # Sum of the selected rows as a dense vocabulary-length vector
+        weights = np.zeros(self.counts.shape[0], dtype=np.int32)
+        weights[rows] = 1
+        return self.counts.T @ weights
+
+    def top_words(self, start, end, countries=None, k=30):
+        """The k most frequent words as (word, count) pairs, most frequent first."""
+        rows = self.rows(start, end, countries)
+        totals = self.word_counts(rows)
+        nonzero = np.count_nonzero(totals)
+        k = min(k, nonzero)
+        if k == 0:
+            return []
+
+        # count of the k-th most frequent word, everything at or above it is a candidate
+        kth = totals[np.argpartition(-totals, k - 1)[k - 1]]
+        top = np.flatnonzero(totals >= kth)
+        # ties keep first-appearance order within the selection, like Counter.most_common
+        first = self.first_seen[np.sort(rows)][:, top].max(axis=0).toarray().ravel()
+        top = top[np.lexsort((-first, -totals[top]))][:k]
+        return [(self.vocabulary[i], int(totals[i])) for i in top]
+
+
+def _count_tokens(lyrics_tokens, word_ids, rows, offset=0):
+    # (counts CSR, first_seen CSR, token count) over the rows, new words are added to word_ids;
+    # offset is the corpus position of the first token, first_seen counts back from the end of these rows
+    indptr, indices, counts, first_seen = [0], [], [], []
+    position = offset
+    for lyrics in lyrics_tokens:
+        tokens = tokenize(lyrics) if isinstance(lyrics, str) else []
+        ids = np.array([word_ids.setdefault(token, len(word_ids)) for token in tokens], dtype=np.int64)
+        words, first, count = np.unique(ids, return_index=True, return_counts=True)
+        indices.append(words)
+        counts.append(count)
+        first_seen.append(position + first)
+        indptr.append(indptr[-1] + len(words))
+        position += len(tokens)
+
+    shape = (rows, len(word_ids))
+    indices = np.concatenate(indices).astype(np.int32) if indices else np.array([], dtype=np.int32)
+    indptr = np.array(indptr)
+    counts = np.concatenate(counts).astype(np.int32) if counts else np.array([], dtype=np.int32)
+    first_seen = np.concatenate(first_seen) if first_seen else np.array([], dtype=np.int64)
+    return (
+        sparse.csr_matrix((counts, indices, indptr), shape=shape),
+        # stored as "offset from the end" so implicit zeros lose a max()
+        sparse.csr_matrix(((position - first_seen).astype(np.int64), indices, indptr), shape=shape),
+        position - offset,
+    )
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from . import data, ingest, snapshot
+from .lyrics_index import LyricsIndex
+
+
+# Offline, resumable rebuild of the lyrics_token column (the word cloud tokens), which the cleaning
+# notebook (data_review.ipynb) produced once with an LLM / NLP step:
+#
+#   python -m src.lyrics_pipeline --workers 8        # spaCy noun lemmas
+#   python -m src.lyrics_pipeline --allow-fallback   # stopword filtering when spaCy is not installed
+#   python -m src.lyrics_pipeline --llm              # noun lemmas from the Groq API, GROQ_BASE_URL=http://127.0.0.1:8765
+#                                                    # with python -m src.llm.stub_server --port 8765 for tests
+#   EUROTRASH_LYRICS_TOKENS=dataset/lyrics_tokens python serve.py
+#
+# lyrics_english is tokenized in batches in a process pool (ingest.lyric_tokens), or, with --llm, in a
+# thread pool of GroqClient requests since those only wait on the network. Every finished batch is
+# committed to an SQLite cache keyed by a hash of the tokenizer and the lyric text: the cache is the
+# checkpoint, an interrupted run resumes where it stopped and a rerun only tokenizes new or changed lyrics.
+# The tokenizer in the key names the spaCy model, or the LLM endpoint, model and prompt, so tokens from
+# a stub server are never reused against the real API. Without spaCy every word outside the stopword
+# list is kept (no lemmas, not only nouns), so that fallback only writes a store with --allow-fallback.
+#
+# The output store holds the lyrics_token column and the word cloud's LyricsIndex arrays in the snapshot
+# layout (src/snapshot.py). With EUROTRASH_LYRICS_TOKENS pointing at the output directory the backend
+# memory-maps that index instead of parsing the CSV's lyrics_token column, as long as the store was
+# built from the same lyrics.
+
+DEFAULT_DIR = os.path.join(data.DATASET_DIR, 'lyrics_tokens')
+STORE_FORMAT = 1
+BATCH_SIZE = 32  # lyrics per task, and per cache commit
+
+LYRICS_PROMPT = os.path.join(os.path.dirname(__file__), 'llm', 'prompts', 'groq_api_lyrics_tokens.json')
+LYRICS_PLACEHOLDER = '{lyrics}'
+
+
+def lyric_key(tokenizer, text):
+    # cache key: the same tokenizer on the same text gives the same tokens
+    return hashlib.sha256(f'{tokenizer}\0{text}'.encode('utf-8')).hexdigest()
+
+
+def lyrics_digest(lyrics):
+    # hash of a whole lyrics_english column, to tell whether a store was built from it
+    digest = hashlib.sha256()
+    for text in lyrics:
+        digest.update(text.encode('utf-8') + b'\1' if isinstance(text, str) else b'\0')
+    return digest.hexdigest()
+
+
+class TokenCache:
+    """lyric key -> token list, in an SQLite file committed batch by batch."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT NOT NULL)')
+
+    def get(self, keys, chunk=500):
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), chunk):
+            part = keys[i:i + chunk]
+            rows = self.connection.execute(
+                f"SELECT key, tokens FROM tokens WHERE key IN ({','.join('?' * len(part))})", part
+            )
+            found.update((key, json.loads(tokens)) for key, tokens in rows)
+        return found
+
+    def put(self, rows):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO tokens VALUES (?, ?)', [(key, json.dumps(tokens)) for key, tokens in rows]
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def _tokenize_batch(keys, texts):
+    # (key, tokens) of one batch, in a worker process
+    return [(key, ingest.lyric_tokens(text)) for key, text in zip(keys, texts)]
+
+
+def llm_tokens(answer):
+    """Token list of a completion of the lyrics prompt, None for a failed request.
+
+    The answer should be a JSON list of nouns; anything else is read as plain words. Either way the
+    tokens are lowercase words of two or more letters outside the stopword list, like lyric_tokens.
+    """
+    if answer is None or answer.startswith('Error:'):
+        return None
+    words = None
+    start, end = answer.find('['), answer.rfind(']')
+    if 0 <= start < end:
+        try:
+            words = [str(word) for word in json.loads(answer[start:end + 1])]
+        except ValueError:
+            pass
+    if words is None:
+        words = [answer]
+    tokens = [token for word in words for token in ingest.WORD.findall(word.lower())]
+    return [token for token in tokens if token not in ingest.STOPWORDS and len(token) > 1]
+
+
+def _llm_batch(client, prompt, keys, texts):
+    # (key, tokens) of the lyrics of one batch the API answered, failed ones are left out to be retried
+    rows = []
+    for key, text in zip(keys, texts):
+        tokens = llm_tokens(client.generate(prompt, text, LYRICS_PLACEHOLDER))
+        if tokens is not None:
+            rows.append((key, tokens))
+    return rows
+
+
+def write_store(directory, contestants_df, tokens, tokenizer):
+    """Write the lyrics_token column and its LyricsIndex for contestants_df's rows, replacing any previous store."""
+    column = [str(row) for row in tokens]
+    index = LyricsIndex.from_contestants(pd.DataFrame({
+        'lyrics_token': column, 'year': contestants_df['year'].to_numpy(), 'to_country': contestants_df['to_country'],
+    }))
+
+    tmp_dir = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    snapshot._save_strings(tmp_dir, 'lyrics_token', column)
+    snapshot.save_lyrics_index(tmp_dir, index)
+    manifest = {
+        "format": STORE_FORMAT,
+        "tokenizer": tokenizer,
+        "rows": len(column),
+        "lyrics": lyrics_digest(contestants_df['lyrics_english']),
+        "digest": hashlib.sha256('\n'.join(column).encode('utf-8')).hexdigest(),
+    }
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return manifest
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, 'store', 'manifest.json')) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format') == STORE_FORMAT else None
+
+
+def store_digest(directory):
+    # content hash of the store's token column, None without a store
+    manifest = read_manifest(directory) if directory else None
+    return manifest and manifest['digest']
+
+
+def load_store(directory, contestants_df):
+    """LyricsIndex of the store in directory, None when it is missing or built from other lyrics."""
+    manifest = read_manifest(directory)
+    if manifest is None or manifest['rows'] != len(contestants_df):
+        return None
+    if manifest['lyrics'] != lyrics_digest(contestants_df['lyrics_english']):
+        return None
+    return snapshot.load_lyrics_index(
+        os.path.join(directory, 'store'),
+        contestants_df['year'].to_numpy(),
+        contestants_df['to_country'].to_numpy(dtype=object),
+    )
+
+
+def load_tokens(directory):
+    # the store's lyrics_token column, in contestants_cleaned.csv row order
+    return snapshot._load_strings(os.path.join(directory, 'store'), 'lyrics_token')
+
+
+def run(directory=DEFAULT_DIR, dataset_dir=data.DATASET_DIR, workers=None, batch_size=BATCH_SIZE,
+        llm=False, prompt=LYRICS_PROMPT, quiet=False, allow_fallback=False):
+    """Tokenize every uncached lyric and write the store. Returns the number of lyrics tokenized now.
+
+    Raises SystemExit without spaCy (and without llm) unless allow_fallback accepts stopword filtering.
+    """
+    contestants_df = pd.read_csv(
+        os.path.join(dataset_dir, 'contestants_cleaned.csv'), usecols=['year', 'to_country', 'lyrics_english']
+    )
+    lyrics = contestants_df['lyrics_english']
+
+    client = None
+    if llm:
+        from .llm.groq_llm import GroqClient, load_prompt
+
+        client = GroqClient()
+        # another endpoint, model or prompt means other tokens
+        prompt_hash = hashlib.sha256(json.dumps(load_prompt(prompt)).encode('utf-8')).hexdigest()[:16]
+        tokenizer = f'llm:{client.base_url}:{client.model}:{prompt_hash}'
+    else:
+        tokenizer = ingest.tokenizer_name()
+        if tokenizer == 'stopwords' and not allow_fallback:
+            raise SystemExit("spaCy / en_core_web_sm is not installed, pass --allow-fallback to write a store "
+                             "of stopword-filtered words instead of noun lemmas")
+
+    keys = [lyric_key(tokenizer, text) if isinstance(text, str) else None for text in lyrics]
+    cache = TokenCache(os.path.join(directory, 'cache.sqlite'))
+    try:
+        cached = cache.get({key for key in keys if key is not None})
+        todo = {key: text for key, text in zip(keys, lyrics) if key is not None and key not in cached}
+        todo_keys = list(todo)
+        batches = [todo_keys[i:i + batch_size] for i in range(0, len(todo_keys), batch_size)]
+
+        started = time.perf_counter()
+        if not quiet:
+            print(f"{len(cached)} of {len(cached) + len(todo)} lyrics cached, tokenizing {len(todo)} with {tokenizer}")
+        if batches:
+            if llm:
+                pool = ThreadPoolExecutor(max_workers=workers or 4)
+                futures = [pool.submit(_llm_batch, client, prompt, batch, [todo[key] for key in batch]) for batch in batches]
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers)
+                futures = [pool.submit(_tokenize_batch, batch, [todo[key] for key in batch]) for batch in batches]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    rows = future.result()
+                    # checkpoint: a finished batch is never tokenized again
+                    cache.put(rows)
+                    cached.update(rows)
+                    if not quiet:
+                        print(f"\r{done}/{len(batches)} batches", end='', flush=True)
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise SystemExit(f"\nInterrupted, finished batches are cached in {directory}, run again to resume")
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            pool.shutdown()
+            if not quiet:
+                print()
+    finally:
+        cache.close()
+        if client is not None:
+            client.close()
+
+    missing = sum(1 for key in keys if key is not None and key not in cached)
+    if missing:
+        # failed LLM requests: no store from a partial column, the next run retries them
+        raise SystemExit(f"{missing} lyrics could not be tokenized, run again to retry them")
+
+    manifest = write_store(
+        os.path.join(directory, 'store'), contestants_df, [cached[key] if key else [] for key in keys], tokenizer
+    )
+    if not quiet:
+        print(f"{manifest['rows']} rows in {time.perf_counter() - started:.1f}s -> {os.path.join(directory, 'store')}")
+    return len(todo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tokenize lyrics_english into the word cloud token store")
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="cache and store directory (default: dataset/lyrics_tokens)")
+    parser.add_argument('--dataset-dir', default=data.DATASET_DIR)
+    parser.add_argument('--workers', type=int, help="processes, or concurrent requests with --llm (default: one per CPU / 4)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--llm', action='store_true', help="noun lemmas from the Groq API instead of spaCy")
+    parser.add_argument('--prompt', default=LYRICS_PROMPT)
+    parser.add_argument('--quiet', action='store_true')
+    parser.add_argument('--allow-fallback', action='store_true',
+                        help="without spaCy, write a store of stopword-filtered words instead of failing")
+    args = parser.parse_args()
+
+    run(args.dir, args.dataset_dir, args.workers, args.batch_size, args.llm, args.prompt, args.quiet,
+        args.allow_fallback)
@@ -0,0 +1,33 @@
+import os
+
+import pandas as pd
+
+from . import data
+
+
+# Memory of the raw CSV frames versus the compact in-memory frames
+#   python -m src.memory_report
+
+def frame_memory(df):
+    # deep memory usage in MB, counting the Python string objects
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def memory_report(dataset_dir=data.DATASET_DIR):
+    raw_contestants = pd.read_csv(os.path.join(dataset_dir, 'contestants_cleaned.csv'))
+    raw_votes = pd.read_csv(os.path.join(dataset_dir, 'votes_cleaned.csv'))
+    dataset = data.load_dataset(dataset_dir)
+    return {
+        "contestants_df": (frame_memory(raw_contestants), frame_memory(dataset.contestants_df)),
+        "votes_df": (frame_memory(raw_votes), frame_memory(dataset.votes_df)),
+    }
+
+
+if __name__ == '__main__':
+    report = memory_report()
+    print(f"{'frame':<16}{'before (MB)':>14}{'after (MB)':>14}")
+    for name, (before, after) in report.items():
+        print(f"{name:<16}{before:>14.2f}{after:>14.2f}")
+    total_before = sum(before for before, _ in report.values())
+    total_after = sum(after for _, after in report.values())
+    print(f"{'total':<16}{total_before:>14.2f}{total_after:>14.2f}")
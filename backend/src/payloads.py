@@ -0,0 +1,201 @@
+import numpy as np
+
+from . import queries
+from .encoding import encode_matrix, frame, rounded
+
+
+# JSON-ready response bodies for each analytic endpoint, shared by the
+# individual routes and the batched /api/dashboard endpoint.
+
+def most_dominating_countries(start, end):
+    return queries.dominating_countries(start, end).to_dict(orient='records')
+
+
+def yearly_rankings(start, end):
+    return queries.yearly_rankings(start, end).to_dict()
+
+
+def country_trajectories(start, end, countries, window=5, precision=None):
+    # Placements of the requested countries per contest (null = did not take part), their rolling
+    # mean place / top 5 rate over the last window contests and head-to-head win counts
+    years, places, mean_place, top5_rate, rolling_wins, wins = queries.trajectories(start, end, window)
+    columns = queries.placement_columns(countries)
+    found = [country for country, column in zip(countries, columns) if column >= 0]
+    idx = columns[columns >= 0]
+
+    def series(values):
+        return {country: [None if np.isnan(v) else v for v in rounded(values[:, i], precision)]
+                for country, i in zip(found, idx)}
+
+    return {
+        "years": years.tolist(),
+        "countries": found,
+        "unknown_countries": [country for country, column in zip(countries, columns) if column < 0],
+        "window": window,
+        "places": {country: [None if np.isnan(v) else int(v) for v in places[:, i]] for country, i in zip(found, idx)},
+        "mean_place": series(mean_place),
+        "top5_rate": series(top5_rate),
+        # wins[i][j]: contests in which countries[i] placed ahead of countries[j]
+        "head_to_head": wins[np.ix_(idx, idx)].tolist(),
+        "rolling_head_to_head": rolling_wins[:, idx][:, :, idx].tolist(),
+    }
+
+
+def word_cloud(start, end, countries=None):
+    # Get the 30 most common words, countries is a tuple or None for every country
+    common_words = queries.top_words(start, end, countries, k=30)
+    return [{"word": word, "count": count} for word, count in common_words]
+
+
+def countries_in_favor(start, end, precision=None):
+    all_countries_names, heatmap_matrix = queries.heatmap(start, end)
+    return {
+        "countries": all_countries_names,
+        "matrix": rounded(heatmap_matrix.values, precision),
+    }
+
+
+def countries_in_favor_binary(start, end):
+    # float32 matrix with a JSON country header, see src/encoding.py
+    all_countries_names, heatmap_matrix = queries.heatmap(start, end)
+    return encode_matrix(all_countries_names, heatmap_matrix.values)
+
+
+# layout is 'records' (one dict per country) or 'columnar' ({column: values}),
+# precision rounds the coordinates and explained variance
+
+def voting_clusters(start, end, number_of_clusters, layout='records', precision=None):
+    cluster_df, explained_variance = queries.voting_clusters(start, end, number_of_clusters)
+    return {
+        "clusters": frame(cluster_df, layout, precision),
+        "explained_variance": rounded(explained_variance, precision)
+    }
+
+
+def voting_clusters_fullname(start, end, number_of_clusters, layout='records', precision=None):
+    cluster_df, explained_variance, region_info = queries.voting_clusters_fullname(start, end, number_of_clusters)
+    return {
+        "clusters": frame(cluster_df, layout, precision),
+        "explained_variance": rounded(explained_variance, precision),
+        "region_info": region_info
+    }
+
+
+def voting_similarity(start, end, metric='pearson', number_of_blocs=5, permutations=0, seed=0, precision=None):
+    # countries / codes follow countries_in_favor's order, "order" lists their indices bloc by bloc
+    codes, names, matrices = queries.voting_similarity(start, end)
+    order, labels, cohesion, p_values = queries.voting_blocs(start, end, metric, number_of_blocs, permutations, seed)
+
+    blocs = []
+    for bloc in range(len(cohesion)):
+        members = [i for i in order if labels[i] == bloc]
+        blocs.append({
+            "bloc": bloc,
+            "countries": [names[i] for i in members],
+            "codes": [codes[i] for i in members],
+            "cohesion": None if np.isnan(cohesion[bloc]) else rounded(cohesion[bloc], precision),
+            "p_value": None if p_values is None or np.isnan(cohesion[bloc]) else float(p_values[bloc]),
+        })
+    return {
+        "countries": names,
+        "codes": codes,
+        "metric": metric,
+        "similarity": {name: rounded(matrix, precision) for name, matrix in matrices.items()},
+        "order": order.tolist(),
+        "blocs": blocs,
+    }
+
+
+def tele_jury_split(start, end, precision=None):
+    # per-country lists follow "countries"; favour > 0 = public-favoured, < 0 = jury-favoured
+    split = queries.tele_jury_split(start, end)
+    if split is None:
+        return {"years": [], "countries": [], "codes": [], "received": {}, "given": {},
+                "yearly_correlation": [], "divergence": []}
+
+    def values(array):
+        return [None if np.isnan(v) else v for v in np.ravel(rounded(array, precision))]
+
+    return {
+        "years": split["years"].tolist(),
+        "countries": split["names"],
+        "codes": split["countries"].tolist(),
+        # summed share of the maximum received per contest, from the televotes / the juries
+        "received": {"tele": values(split["tele"]), "jury": values(split["jury"]), "favour": values(split["favour"])},
+        # how far a country's televote and jury disagree when giving points
+        "given": {"disagreement": values(split["disagreement"]), "correlation": values(split["sender_correlation"])},
+        # Spearman correlation of the televote and jury rankings of each year's entries
+        "yearly_correlation": values(split["yearly_correlation"]),
+        # divergence[i][j]: summed tele - jury share country i gave country j
+        "divergence": rounded(split["divergence"], precision),
+    }
+
+
+def simulate(start, end, rule='actual', exclude=(), simulations=0, mode='resample', noise=0.2, seed=0, precision=None):
+    # years x countries matrices follow "years" and "countries", null where a country had no entry;
+    # exclude = voter country codes left out
+    result = queries.simulate(start, end, rule, exclude)
+    official = queries.official_winners(start, end)
+
+    def values(matrix):
+        return [[None if np.isnan(v) else v for v in row] for row in rounded(matrix, precision)]
+
+    winners = []
+    for year, places in zip(result["years"].tolist(), result["places"]):
+        codes = result["countries"][places == 1].tolist()
+        winners.append({
+            "year": year,
+            "winners": queries.country_names(codes),
+            "official": queries.country_names(official.get(year, [])),
+            "changed": codes != official.get(year, []),
+        })
+    payload = {
+        "rule": rule,
+        "excluded": queries.country_names(exclude),
+        "years": result["years"].tolist(),
+        "countries": result["names"],
+        "codes": result["countries"].tolist(),
+        "points": values(result["points"]),
+        "places": [[None if np.isnan(v) else int(v) for v in row] for row in result["places"]],
+        "winners": winners,
+    }
+    if simulations:
+        # same years and countries as the matrices above
+        estimate = queries.monte_carlo(start, end, rule, exclude, simulations, mode, noise, seed)
+        payload["monte_carlo"] = {
+            "simulations": simulations,
+            "mode": mode,
+            "noise": noise if mode == 'perturb' else None,
+            "seed": seed,
+            "win_probability": values(estimate["win_probability"]),
+            "mean_place": values(estimate["mean_place"]),
+        }
+    return payload
+
+
+def top5barchart(start, end):
+    return queries.top5_by_region(start, end)[0]
+
+
+def top5barchartnormalized(start, end):
+    return queries.top5_by_region(start, end)[1]
+
+
+def top5barchart_combined(start, end):
+    raw, normalized = queries.top5_by_region(start, end)
+    return {"raw": raw, "normalized": normalized}
+
+
+# Dashboard panels by endpoint name, each called with the parsed dashboard parameters
+PANELS = {
+    'most_dominating_countries': lambda p: most_dominating_countries(p['start'], p['end']),
+    'yearly_rankings': lambda p: yearly_rankings(p['start'], p['end']),
+    'word_cloud': lambda p: word_cloud(p['start'], p['end']),
+    'word_cloud_filter': lambda p: word_cloud(p['start'], p['end'], p['countries']),
+    'countries_in_favor': lambda p: countries_in_favor(p['start'], p['end']),
+    'voting_clusters': lambda p: voting_clusters(p['start'], p['end'], p['number_of_clusters']),
+    'voting_clusters_fullname': lambda p: voting_clusters_fullname(p['start'], p['end'], p['number_of_clusters']),
+    'top5barchart': lambda p: top5barchart(p['start'], p['end']),
+    'top5barchartnormalized': lambda p: top5barchartnormalized(p['start'], p['end']),
+    'top5barchart_combined': lambda p: top5barchart_combined(p['start'], p['end']),
+}
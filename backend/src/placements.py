@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+
+class PlacementMatrix:
+    """Dense year x country matrix of contest placements, NaN where a country did not take part.
+
+    Countries are the sorted to_country names, each mapped to an integer region id
+    once, so per-region aggregates are a bincount instead of a table scan per country.
+    """
+
+    def __init__(self, contestants_df, countries_regions_df):
+        years = contestants_df['year'].to_numpy()
+        self.first_year = int(years.min())
+        self.years = np.arange(self.first_year, years.max() + 1)
+        self.countries = np.array(sorted(contestants_df['to_country'].astype(str).unique()), dtype=object)
+
+        # best placement per (year, country), NaN = did not participate
+        year_idx = years - self.first_year
+        country_idx = np.searchsorted(self.countries, contestants_df['to_country'].astype(str).to_numpy())
+        self.places = np.full((len(self.years), len(self.countries)), np.nan)
+        np.fmin.at(self.places, (year_idx, country_idx), contestants_df['place_contest'].to_numpy(dtype=float))
+
+        # a contest took place that year (the yearly_rankings rows)
+        self.held = np.zeros(len(self.years), dtype=bool)
+        self.held[year_idx] = True
+
+        # country -> region id, countries missing from countries.csv are "Unknown"
+        region_of = dict(zip(countries_regions_df['country_name'][::-1], countries_regions_df['region'][::-1]))
+        self.regions = np.array(sorted(set(countries_regions_df['region'])) + ["Unknown"], dtype=object)
+        region_ids = {region: i for i, region in enumerate(self.regions)}
+        self.region_idx = np.array([region_ids[region_of.get(c, "Unknown")] for c in self.countries], dtype=int)
+        # countries per region in countries.csv for the normalized chart, 1 for "Unknown"
+        sizes = countries_regions_df.groupby('region')['country_name'].count()
+        self.region_sizes = np.array([sizes.get(region, 1) for region in self.regions], dtype=float)
+
+    def _bounds(self, start, end):
+        lo = min(max(start - self.first_year, 0), len(self.years))
+        hi = min(max(end - self.first_year + 1, lo), len(self.years))
+        return lo, hi
+
+    def contests(self, start, end):
+        """(years, places) of the contests held in the range, places NaN where a country did not take part."""
+        lo, hi = self._bounds(start, end)
+        held = self.held[lo:hi]
+        return self.years[lo:hi][held], self.places[lo:hi][held]
+
+    def country_indices(self, countries):
+        # column of each to_country name, -1 for names that never took part
+        positions = np.searchsorted(self.countries, countries)
+        positions = np.minimum(positions, len(self.countries) - 1)
+        return np.where(self.countries[positions] == np.asarray(countries, dtype=object), positions, -1)
+
+    def rankings(self, start, end):
+        """yearly_rankings frame: contest years x countries that took part in the range, 0 = not participated."""
+        years, places = self.contests(start, end)
+        present = ~np.isnan(places).all(axis=0)
+        return pd.DataFrame(
+            np.nan_to_num(places[:, present]).astype(int),
+            index=pd.Index(years, name='year'),
+            columns=pd.Index(self.countries[present], name='to_country'),
+        )
+
+    def rolling(self, start, end, window):
+        """Trailing statistics over the last window contests of the range, for every country at once.
+
+        Returns (years, mean place, top 5 rate, wins): mean place and top 5 rate (share of the
+        country's entries placed 1-5) are contests x countries, NaN without an entry in the window;
+        wins[t, i, j] counts the contests of the window in which i placed ahead of j.
+        """
+        years, places = self.contests(start, end)
+        window = max(window, 1)
+        present = ~np.isnan(places)
+        entries = _window_sums(present, window)
+        with np.errstate(invalid='ignore'):
+            mean_place = _window_sums(np.nan_to_num(places), window) / np.where(entries > 0, entries, np.nan)
+            top5_rate = _window_sums(present & (places <= 5), window) / np.where(entries > 0, entries, np.nan)
+            # comparisons with NaN are False, so only contests both countries took part in count
+            ahead = places[:, :, None] < places[:, None, :]
+        return years, mean_place, top5_rate, _window_sums(ahead, window)
+
+    def head_to_head(self, start, end):
+        """countries x countries matrix: contests of the range in which i placed ahead of j."""
+        _, places = self.contests(start, end)
+        return (places[:, :, None] < places[:, None, :]).sum(axis=0)
+
+    def top5_by_region(self, start, end):
+        """Summed per-country share of top 5 placements by region, raw and per country in the region.
+
+        A country's share is its top 5 placements over the number of contests held in
+        the range, counted for every country that took part at least once.
+        """
+        lo, hi = self._bounds(start, end)
+        places = self.places[lo:hi]
+        contests = self.held[lo:hi].sum()
+
+        present = ~np.isnan(places).all(axis=0)
+        top5 = ((places >= 1) & (places <= 5)).sum(axis=0)
+        if contests == 0 or not present.any():
+            return {}, {}
+
+        region_idx = self.region_idx[present]
+        raw = np.bincount(region_idx, weights=top5[present] / contests, minlength=len(self.regions))
+        normalized = raw / self.region_sizes
+        seen = np.bincount(region_idx, minlength=len(self.regions)) > 0
+
+        regions = self.regions[seen].tolist()
+        return dict(zip(regions, raw[seen].tolist())), dict(zip(regions, normalized[seen].tolist()))
+
+
+def _window_sums(values, window):
+    # Sums over the trailing window rows (fewer at the start), from one cumulative sum along axis 0
+    cumulative = np.zeros((len(values) + 1,) + values.shape[1:], dtype=np.result_type(values.dtype, np.int64))
+    np.cumsum(values, axis=0, out=cumulative[1:])
+    lo = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return cumulative[1:] - cumulative[lo]
@@ -0,0 +1,108 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import parse_qsl, urlencode
+
+from werkzeug.datastructures import MultiDict
+
+from . import data
+
+
+# Offline build of the precomputed response store (see src/response_store.py):
+#
+#   python -m src.precompute --output dataset/precomputed.sqlite --workers 8
+#   EUROTRASH_PRECOMPUTED=dataset/precomputed.sqlite gunicorn -c gunicorn.conf.py
+#
+# Every range endpoint is a pure function of the year range plus a few enumerated parameters,
+# so all start <= end ranges between the first and last contest year (about 2,200) are rendered
+# through the app itself, in a process pool, and stored byte for byte as the live app would
+# send them. Each task is one start year with its ranges in ascending end order, so the
+# clustering reference of every range, (first year, end), is one step from a solved one.
+
+DEFAULT_OUTPUT = os.path.join(data.DATASET_DIR, 'precomputed.sqlite')
+
+RANGE_ENDPOINTS = [
+    'most_dominating_countries', 'yearly_rankings', 'word_cloud', 'countries_in_favor',
+    'top5barchart', 'top5barchartnormalized', 'top5barchart_combined',
+]
+FILTERS = ['All', 'Top 5', 'Worst 5']
+CLUSTER_COUNTS = range(2, 8)
+CLUSTER_ENDPOINTS = ['voting_clusters', 'voting_clusters_fullname']
+
+
+def range_urls(start, end, endpoints=None):
+    """Every precomputed URL of one year range, optionally limited to some endpoints."""
+    years = {'yearRangeStart': start, 'yearRangeEnd': end}
+    urls = [(endpoint, years) for endpoint in RANGE_ENDPOINTS]
+    urls += [('word_cloud_filter', dict(years, filter=selected)) for selected in FILTERS]
+    urls += [(endpoint, dict(years, numberOfClusters=k)) for endpoint in CLUSTER_ENDPOINTS for k in CLUSTER_COUNTS]
+    urls = [f'/api/{endpoint}?{urlencode(params)}' for endpoint, params in urls]
+    if endpoints:
+        urls = [url for url in urls if url[len('/api/'):url.index('?')] in endpoints]
+    return urls
+
+
+def _init_worker():
+    # render live, never from an older store, with one BLAS / OpenMP thread per process
+    from threadpoolctl import threadpool_limits
+
+    from . import cache
+
+    cache.precomputed = None
+    threadpool_limits(1)
+
+
+def render_ranges(ranges, endpoints=None):
+    """(cache key, mimetype, body) of every successful response for the year ranges, in order."""
+    from . import app
+    from .cache import cache_key
+
+    client = app.test_client()
+    rows = []
+    for start, end in ranges:
+        for url in range_urls(start, end, endpoints):
+            response = client.get(url)
+            if response.status_code != 200:
+                continue
+            path, _, query = url.partition('?')
+            rows.append((cache_key(path, MultiDict(parse_qsl(query))), response.mimetype, response.get_data()))
+    return rows
+
+
+def build_store(output=DEFAULT_OUTPUT, workers=None, first=None, last=None, endpoints=None, quiet=False):
+    from .response_store import StoreWriter
+
+    # loaded before the pool forks, so the workers share the memory-mapped snapshot
+    dataset = data.get_dataset()
+    years = dataset.contestants_df['year']
+    first = int(years.min()) if first is None else first
+    last = int(years.max()) if last is None else last
+
+    # one task per start year, the longest first
+    tasks = [[(start, end) for end in range(start, last + 1)] for start in range(first, last + 1)]
+    started = time.perf_counter()
+    writer = StoreWriter(output, dataset.version)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(render_ranges, ranges, endpoints) for ranges in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            writer.write(future.result())
+            if not quiet:
+                print(f"\r{done}/{len(tasks)} start years, {writer.rows} responses", end='', flush=True)
+    writer.commit()
+    if not quiet:
+        print(f"\n{writer.rows} responses for {first}-{last} in {time.perf_counter() - started:.1f}s -> {output}")
+    return writer.rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute every year range response into a lookup store")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--workers', type=int, help="processes (default: one per CPU)")
+    parser.add_argument('--first', type=int, help="first year of the ranges (default: first contest)")
+    parser.add_argument('--last', type=int, help="last year of the ranges (default: last contest)")
+    parser.add_argument('--endpoints', nargs='+', help="only these endpoints, e.g. voting_clusters word_cloud")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    build_store(args.output, args.workers, args.first, args.last, args.endpoints, args.quiet)
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# Process pool shared by the CPU-heavy engines (similarity permutation tests, scoring simulations).
+# Created on first use and kept for the life of the process. Workers are spawned rather than
+# forked, because the serving process may be running other threads. A pool broken by a dead
+# worker (killed, out of memory) is replaced by a new one on the next use.
+#
+#   EUROTRASH_PROCESS_WORKERS=N   worker processes (default: one per CPU)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.environ.get('EUROTRASH_PROCESS_WORKERS', os.cpu_count() or 1))
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard(pool):
+    # drop a broken pool, unless another thread already replaced it
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def map_tasks(function, tasks, parallel=True):
+    """[function(*task) for task in tasks], in the process pool when parallel, in order.
+
+    If a worker dies the tasks run again once in a new pool, and in this process if that breaks too.
+    """
+    if not parallel:
+        return [function(*task) for task in tasks]
+    for _ in range(2):
+        pool = process_pool()
+        try:
+            futures = [pool.submit(function, *task) for task in tasks]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            _discard(pool)
+    return [function(*task) for task in tasks]
@@ -0,0 +1,334 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from . import clustering, data, similarity
+from .cache import memoized
+from .instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+
+# Internal query layer: plain functions over the loaded dataset, shared by every endpoint.
+# Range queries are memoized per year range, so callers must treat the returned
+# DataFrames / arrays as read-only.
+
+color_palette = ['blue', 'orange', 'green', 'red', 'purple', 'brown', 'pink']  # Extend if needed
+
+
+def available_countries():
+    countries = data.dataset.countries_regions_df['country_name'].unique().tolist()
+    countries.sort(reverse=True)
+    return countries
+
+
+def available_years():
+    years = data.dataset.contestants_df['year'].unique().tolist()
+    years.sort(reverse=True)
+    return years
+
+
+@memoized(maxsize=256)
+def _range_contestants(start, end):
+    # Year range slice of contestants_df, shared by every query over the same range
+    contestants_df = data.dataset.contestants_df
+    with stage('filter'):
+        return contestants_df[(contestants_df['year'] >= start) & (contestants_df['year'] <= end)]
+
+
+@memoized(maxsize=256)
+def dominating_countries(start, end):
+    # Summed per_of_pot_max per country, best first
+    filtered = _range_contestants(start, end)
+    with stage('aggregate'):
+        return (
+            filtered['per_of_pot_max'].astype('float64').groupby(filtered['to_country'], observed=True)
+            .sum()
+            .round(1)  # per_of_pot_max is stored as float32 with one decimal
+            .reset_index()
+            .rename(columns={'per_of_pot_max': 'total_points'})
+            .sort_values('total_points', ascending=False)
+        )
+
+
+@memoized(maxsize=256)
+def yearly_rankings(start, end):
+    # year x country placements (0 = not participated), best entry per country and year
+    with stage('aggregate'):
+        return data.dataset.placements.rankings(start, end)
+
+
+@memoized(maxsize=256)
+def trajectories(start, end, window):
+    # (years, places, rolling mean place, rolling top 5 rate, rolling and whole-range head-to-head wins),
+    # contests x countries (x countries) arrays over every country at once, NaN = no entry
+    placements = data.dataset.placements
+    with stage('aggregate'):
+        years, places = placements.contests(start, end)
+        _, mean_place, top5_rate, rolling_wins = placements.rolling(start, end, window)
+        return years, places, mean_place, top5_rate, rolling_wins, placements.head_to_head(start, end)
+
+
+def placement_columns(countries):
+    # trajectories() column of each to_country name, -1 for countries that never took part
+    return data.dataset.placements.country_indices(list(countries))
+
+
+def filter_countries(start, end, selected_filter, selected_countries=None):
+    # Countries behind the word cloud filters as a tuple, None means every country
+    if selected_countries:
+        return tuple(selected_countries)
+    if selected_filter == "Top 5":
+        return tuple(dominating_countries(start, end)['to_country'][:5])
+    if selected_filter == "Worst 5":
+        return tuple(dominating_countries(start, end)['to_country'][-5:])
+    return None
+
+
+@memoized(maxsize=256)
+def top_words(start, end, countries=None, k=30):
+    # (word, count) pairs of the k most common lyric tokens, countries is a tuple or None
+    with stage('aggregate'):
+        return data.dataset.lyrics_index.top_words(start, end, countries, k=k)
+
+
+def lyrics_search(query, start=None, end=None, countries=None, limit=20):
+    # BM25-ranked songs whose English lyrics contain every word / "quoted phrase" of the query
+    ds = data.dataset
+    years = ds.song_index.records['year']
+    with stage('filter'):
+        rows = ds.lyrics_index.rows(start or min(years), end or max(years), countries)
+    index = ds.search_index()
+    with stage('aggregate'):
+        matches = index.search(query, rows, limit)
+    if not matches:
+        return []
+
+    lyrics = ds.cold_contestants()['lyrics_english']
+    results = []
+    for row, score, position in matches:
+        song = ds.song_index.record(row)
+        results.append({
+            "song": song['song'],
+            "year": song['year'],
+            "country": song['to_country'],
+            "score": round(score, 4),
+            "snippet": index.snippet(row, lyrics.iloc[row], position),
+        })
+    return results
+
+
+@memoized(maxsize=256)
+def heatmap(start, end):
+    # Voting matrix of everyone who sent or received points in the range, labelled with full names
+    ds = data.dataset
+    code_to_name = dict(zip(ds.country_df["Code"], ds.country_df["Name"]))
+
+    with stage('aggregate'):
+        all_countries = ds.vote_cube.participants(start, end)
+        heatmap_matrix = ds.vote_cube.pivot(start, end, index=all_countries, columns=all_countries)
+
+    # Replace codes with names for rows and columns
+    heatmap_matrix.index = heatmap_matrix.index.map(code_to_name)
+    heatmap_matrix.columns = heatmap_matrix.columns.map(code_to_name)
+    all_countries_names = [code_to_name.get(code, f"Unknown ({code})") for code in all_countries]
+    return all_countries_names, heatmap_matrix
+
+
+@memoized(maxsize=256)
+def voting_similarity(start, end):
+    # (codes, full names, {metric: similarity matrix}) over the heatmap's countries, in the same order
+    ds = data.dataset
+    with stage('aggregate'):
+        codes = ds.vote_cube.participants(start, end)
+        matrix = ds.vote_cube.pivot(start, end, index=codes, columns=codes).to_numpy()
+        matrices = similarity.similarity_matrices(matrix)
+    return codes, country_names(codes), matrices
+
+
+@memoized(maxsize=256)
+def voting_blocs(start, end, metric, number_of_blocs, permutations=0, seed=0):
+    # (leaf order, bloc labels, cohesion per bloc, p-value per bloc or None) on one similarity metric
+    similarities = voting_similarity(start, end)[2][metric]
+    with stage('model fit'):
+        order, labels = similarity.detect_blocs(similarities, number_of_blocs)
+        cohesion = similarity.cohesion(similarities, labels)
+        # a range without votes has no blocs to test
+        p_values = similarity.permutation_test(similarities, labels, permutations, seed) if permutations and len(cohesion) else None
+    return order, labels, cohesion, p_values
+
+
+@memoized(maxsize=256)
+def tele_jury_split(start, end):
+    # TeleJurySplit.decompose() arrays with full country names, None without split voting in the range
+    ds = data.dataset
+    with stage('aggregate'):
+        split = ds.tele_jury.decompose(start, end)
+    if split is not None:
+        split["names"] = country_names(split["countries"])
+    return split
+
+
+@memoized(maxsize=256)
+def simulate(start, end, rule, exclude=()):
+    # Simulator.simulate() arrays with full country names, exclude = voter country codes
+    ds = data.dataset
+    with stage('model fit'):
+        result = ds.simulator.simulate(start, end, rule, exclude)
+    result["names"] = country_names(result["countries"])
+    return result
+
+
+@memoized(maxsize=64)
+def monte_carlo(start, end, rule, exclude, simulations, mode, noise, seed):
+    # Simulator.monte_carlo() arrays with full country names
+    ds = data.dataset
+    with stage('model fit'):
+        result = ds.simulator.monte_carlo(start, end, rule, exclude, simulations, mode, noise, seed)
+    result["names"] = country_names(result["countries"])
+    return result
+
+
+def country_codes(names):
+    # country codes of full country names, unknown names are dropped
+    name_to_code = dict(zip(data.dataset.country_df["Name"], data.dataset.country_df["Code"]))
+    return [name_to_code[name] for name in names if name in name_to_code]
+
+
+def country_names(codes):
+    code_to_name = dict(zip(data.dataset.country_df["Code"], data.dataset.country_df["Name"]))
+    return [code_to_name.get(code, f"Unknown ({code})") for code in codes]
+
+
+def official_winners(start, end):
+    # {year: sorted winner codes} of the contests in the range, several after a tie
+    df = _range_contestants(start, end)
+    winners = df[df['place_contest'] == 1]
+    return {int(year): sorted(group.astype(str)) for year, group in winners.groupby('year')['to_country_id']}
+
+
+def songs(year=None, country=None, cursor=None, limit=None):
+    # Song list rows newest first, after the cursor and at most limit of them, and the next cursor
+    index = data.dataset.song_index
+    with stage('filter'):
+        rows, next_cursor = index.page(index.rows(year, country), cursor, limit)
+    return (index.record(row) for row in rows), next_cursor
+
+
+def song_details(song_name):
+    # First entry with this title as a dict with every column, or None
+    ds = data.dataset
+    row = ds.song_index.find_title(song_name)
+    return ds.contestant_record(row) if row is not None else None
+
+
+def cluster_countries(start, end):
+    # number of countries the cluster views project (the voters of the range's finals)
+    senders, _ = data.dataset.vote_cube.participation(start, end)
+    return int(senders.sum())
+
+
+def cluster_labels(projection, solutions, number_of_clusters):
+    # (projection, labels) of one cluster count, both empty when the range has too few countries for it
+    if number_of_clusters not in solutions:
+        return clustering.empty_projection(), np.empty(0, dtype=int)
+    return projection, solutions[number_of_clusters][0]
+
+
+@memoized(maxsize=256)
+def voting_clusters(start, end, number_of_clusters):
+    ds = data.dataset
+
+    # Projection onto the global PCA and the K-means labels, all cluster counts solved at once
+    with stage('model fit'):
+        projection, solutions = ds.global_clusters.solve(start, end, number_of_clusters)
+    projection, clusters = cluster_labels(projection, solutions, number_of_clusters)
+
+    country_dict = dict(zip(ds.country_df['Code'], ds.country_df['Name']))
+    region_dict = dict(zip(ds.contestants_df['to_country_id'].str.lower(), ds.contestants_df['region']))
+
+    countries = projection.countries
+    cluster_df = pd.DataFrame({
+        "country": countries,
+        "x": projection.points[:, 0],  # PCA Component 1
+        "y": projection.points[:, 1],  # PCA Component 2
+        "cluster": clusters,  # Cluster ID
+        "region": [region_dict.get(c.lower(), "Non-European") for c in countries],  # Region for coloring
+        "country_name": [country_dict.get(c.lower(), c) for c in countries],
+    })
+    return cluster_df, projection.explained_variance
+
+
+@memoized(maxsize=256)
+def voting_clusters_fullname(start, end, number_of_clusters):
+    ds = data.dataset
+
+    # Projection onto the PCA of this range and the K-means labels, all cluster counts solved at once
+    with stage('model fit'):
+        projection, solutions = ds.range_clusters.solve(start, end, number_of_clusters)
+    projection, clusters = cluster_labels(projection, solutions, number_of_clusters)
+
+    # Use the existing `country_df` and its dictionary mapping
+    country_dict = dict(zip(ds.country_df['Code'], ds.country_df['Name']))
+
+    # Assign colors to clusters
+    cluster_colors = {cluster: color_palette[cluster % len(color_palette)] for cluster in range(number_of_clusters)}
+
+    cluster_df = pd.DataFrame({
+        "country": [country_dict.get(c.lower(), c) for c in projection.countries],  # Convert abbreviation to full name
+        "x": projection.points[:, 0],  # PCA Component 1
+        "y": projection.points[:, 1],  # PCA Component 2
+        "cluster": clusters,  # Cluster ID
+        "color": [cluster_colors[c] for c in clusters],  # Cluster color
+    })
+
+    # Compute regional composition
+    with stage('aggregate'):
+        region_info = compute_cluster_regions(cluster_df, ds.countries_regions_df)
+    return cluster_df, projection.explained_variance, region_info
+
+
+def compute_cluster_regions(cluster_df, region_df):
+    cluster_df = cluster_df.copy()
+
+    # Map full country names to country codes
+    country_df = data.dataset.country_df
+    country_name_to_code = dict(zip(country_df['Name'], country_df['Code']))
+    cluster_df['country_code'] = cluster_df['country'].map(country_name_to_code)
+
+    # Debug: Check for unmapped countries
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Unmapped countries:\n%s", cluster_df[cluster_df['country_code'].isnull()])
+
+    # Merge cluster data with region information
+    cluster_df = cluster_df.merge(
+        region_df[['country', 'region']],
+        left_on='country_code',
+        right_on='country',
+        how='left'
+    )
+
+    # Debug: Check for missing regions after merge
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Merged data missing regions:\n%s", cluster_df[cluster_df['region'].isnull()])
+
+    # Group by cluster and calculate the percentage of each region
+    region_summary = cluster_df.groupby('cluster')['region'].value_counts(normalize=True) * 100
+    region_summary = region_summary.rename("percentage").reset_index()
+
+    # Format as dictionary for easier frontend use
+    region_info = {}
+    for cluster in region_summary['cluster'].unique():
+        cluster_regions = region_summary[region_summary['cluster'] == cluster]
+        # Convert cluster ID to int explicitly
+        region_info[int(cluster)] = cluster_regions[['region', 'percentage']].to_dict('records')
+
+    return region_info
+
+
+@memoized(maxsize=256)
+def top5_by_region(start, end):
+    # (raw, normalized) {region: summed average of top 5 placements per competition}
+    with stage('aggregate'):
+        return data.dataset.placements.top5_by_region(start, end)
@@ -0,0 +1,89 @@
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# On-disk key-value store of pre-serialized responses, built offline by src/precompute.py.
+# One SQLite file: responses(key, mimetype, body) keyed by repr(cache.cache_key()), plus the
+# dataset version the bodies were computed from. A store built for another dataset version
+# (e.g. before an ingest) answers nothing, so requests fall back to live computation.
+
+SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE responses (key TEXT PRIMARY KEY, mimetype TEXT NOT NULL, body BLOB NOT NULL) WITHOUT ROWID;
+"""
+
+
+class ResponseStore:
+    """Read-only view of a precomputed response store, safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.version = self._connection().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path):
+        # ResponseStore for path, None when no path is configured or the file is missing / unreadable
+        if not path:
+            return None
+        if not os.path.exists(path):
+            logger.warning("Precomputed response store %s does not exist, computing every response live", path)
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error as error:
+            logger.warning("Cannot open precomputed response store %s: %s", path, error)
+            return None
+
+    def _connection(self):
+        # one read-only connection per thread
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        return connection
+
+    def get(self, key, version):
+        """(body, mimetype) stored for the cache key, None when missing or built for another dataset version."""
+        if version != self.version:
+            return None
+        row = self._connection().execute('SELECT body, mimetype FROM responses WHERE key = ?', (repr(key),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bytes(row[0]), row[1]
+
+    def stats(self):
+        return {"path": self.path, "version": self.version, "hits": self.hits, "misses": self.misses}
+
+
+class StoreWriter:
+    """Builds a store in a temporary file next to path, moved into place by commit()."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self._tmp_path = f'{path}.tmp'
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._connection = sqlite3.connect(self._tmp_path)
+        self._connection.executescript('PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;' + SCHEMA)
+        self._connection.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+        self.rows = 0
+
+    def write(self, rows):
+        # rows of (cache key, mimetype, body)
+        rows = [(repr(key), mimetype, body) for key, mimetype, body in rows]
+        self._connection.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', rows)
+        self.rows += len(rows)
+
+    def commit(self):
+        self._connection.commit()
+        self._connection.close()
+        # readers opening the store see either the old file or the complete new one
+        os.replace(self._tmp_path, self.path)
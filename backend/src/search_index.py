@@ -0,0 +1,191 @@
+import math
+import re
+
+import numpy as np
+
+
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*", re.IGNORECASE)
+QUOTED = re.compile(r'"([^"]*)"')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# tokens of context on each side of the match in a snippet
+SNIPPET_CONTEXT = 8
+
+
+def tokenize(text):
+    # lowercase words with their character spans in the original text
+    return [(m.group().lower(), m.start(), m.end()) for m in WORD.finditer(text)]
+
+
+def parse_query(query):
+    """Query string -> list of phrases (token lists). "quoted words" form one phrase, other words one each."""
+    phrases = [[token for token, _, _ in tokenize(phrase)] for phrase in QUOTED.findall(query)]
+    phrases += [[token] for token, _, _ in tokenize(QUOTED.sub(' ', query))]
+    return [phrase for phrase in phrases if phrase]
+
+
+class SearchIndex:
+    """Positional inverted index over contestants_df['lyrics_english'], rows in contestants_df order.
+
+    Postings are flat arrays: term t owns postings term_ptr[t]:term_ptr[t+1], each a
+    (document, token positions pos_ptr[p]:pos_ptr[p+1]) pair. The character span of
+    every token is kept so snippets come straight out of the lyric text.
+    """
+
+    def __init__(self, vocabulary, term_ptr, post_doc, pos_ptr, positions, doc_ptr, token_start, token_end):
+        self.vocabulary = vocabulary  # sorted terms
+        self.term_ptr = term_ptr
+        self.post_doc = post_doc
+        self.pos_ptr = pos_ptr
+        self.positions = positions
+        self.doc_ptr = doc_ptr  # tokens of document d are doc_ptr[d]:doc_ptr[d+1]
+        self.token_start = token_start
+        self.token_end = token_end
+
+        self.term_ids = {term: i for i, term in enumerate(vocabulary.tolist())}
+        self.doc_lengths = np.diff(doc_ptr)
+        self.average_length = max(self.doc_lengths.mean(), 1) if len(self.doc_lengths) else 1
+
+    @classmethod
+    def from_texts(cls, texts):
+        term_lists, doc_ptr, starts, ends = [], [0], [], []
+        for text in texts:
+            tokens = tokenize(text) if isinstance(text, str) else []
+            term_lists.extend(token for token, _, _ in tokens)
+            starts.extend(start for _, start, _ in tokens)
+            ends.extend(end for _, _, end in tokens)
+            doc_ptr.append(len(term_lists))
+        doc_ptr = np.array(doc_ptr, dtype=np.int64)
+
+        vocabulary, term_of = np.unique(np.array(term_lists, dtype=str), return_inverse=True)
+        doc_of = np.repeat(np.arange(len(doc_ptr) - 1), np.diff(doc_ptr))
+        position_of = np.arange(len(term_lists)) - doc_ptr[doc_of]
+
+        # group every token occurrence by (term, document), positions ascending
+        order = np.lexsort((position_of, doc_of, term_of))
+        term_of, doc_of, positions = term_of[order], doc_of[order], position_of[order]
+        new_posting = np.ones(len(order), dtype=bool)
+        new_posting[1:] = (term_of[1:] != term_of[:-1]) | (doc_of[1:] != doc_of[:-1])
+        posting_starts = np.flatnonzero(new_posting)
+
+        pos_ptr = np.append(posting_starts, len(order)).astype(np.int64)
+        post_term = term_of[posting_starts]
+        term_ptr = np.searchsorted(post_term, np.arange(len(vocabulary) + 1)).astype(np.int64)
+
+        return cls(
+            vocabulary, term_ptr, doc_of[posting_starts].astype(np.int32), pos_ptr, positions.astype(np.int32),
+            doc_ptr, np.array(starts, dtype=np.int32), np.array(ends, dtype=np.int32),
+        )
+
+    def append(self, texts):
+        """New index with the texts added as documents after the existing ones."""
+        added = SearchIndex.from_texts(texts)
+        vocabulary = np.union1d(np.asarray(self.vocabulary, dtype=str), added.vocabulary)
+
+        # every posting as (term, document) in the merged vocabulary, old documents come first
+        def posting_terms(index):
+            ids = np.searchsorted(vocabulary, np.asarray(index.vocabulary, dtype=str))
+            return np.repeat(ids, np.diff(index.term_ptr))
+
+        post_term = np.concatenate([posting_terms(self), posting_terms(added)])
+        post_doc = np.concatenate([self.post_doc, added.post_doc + (len(self.doc_ptr) - 1)]).astype(np.int32)
+        old_positions = len(self.positions)
+        starts = np.concatenate([self.pos_ptr[:-1], added.pos_ptr[:-1] + old_positions])
+        lengths = np.concatenate([np.diff(self.pos_ptr), np.diff(added.pos_ptr)])
+        positions = np.concatenate([self.positions, added.positions])
+
+        # stable sort by term keeps documents ascending within a term
+        order = np.argsort(post_term, kind='stable')
+        post_term, post_doc, starts, lengths = post_term[order], post_doc[order], starts[order], lengths[order]
+        pos_ptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=pos_ptr[1:])
+        gather = np.repeat(starts - pos_ptr[:-1], lengths) + np.arange(pos_ptr[-1])
+
+        return SearchIndex(
+            vocabulary,
+            np.searchsorted(post_term, np.arange(len(vocabulary) + 1)).astype(np.int64),
+            post_doc,
+            pos_ptr,
+            positions[gather].astype(np.int32),
+            np.concatenate([self.doc_ptr, added.doc_ptr[1:] + self.doc_ptr[-1]]),
+            np.concatenate([self.token_start, added.token_start]),
+            np.concatenate([self.token_end, added.token_end]),
+        )
+
+    def _occurrences(self, term):
+        # (document, position) of every occurrence of the term
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        lo, hi = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+        counts = np.diff(self.pos_ptr[lo:hi + 1])
+        docs = np.repeat(self.post_doc[lo:hi], counts).astype(np.int64)
+        return docs, np.asarray(self.positions[self.pos_ptr[lo]:self.pos_ptr[hi]], dtype=np.int64)
+
+    def phrase_matches(self, phrase):
+        """(documents, occurrences per document, first match position) for a phrase, by document."""
+        # an occurrence is a start position p where token i of the phrase sits at p + i
+        keys = None
+        for i, term in enumerate(phrase):
+            docs, positions = self._occurrences(term)
+            starts = positions - i
+            keep = starts >= 0
+            term_keys = (docs[keep] << 32) | starts[keep]
+            keys = term_keys if keys is None else np.intersect1d(keys, term_keys, assume_unique=True)
+            if len(keys) == 0:
+                break
+        docs = keys >> 32
+        documents, first, counts = np.unique(docs, return_index=True, return_counts=True)
+        return documents, counts, keys[first] & 0xFFFFFFFF
+
+    def search(self, query, rows=None, limit=20):
+        """Best BM25 matches as (row, score, first match position), documents must contain every phrase.
+
+        rows limits the search to some documents (e.g. a year range), None searches all of them.
+        """
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+
+        total_docs = len(self.doc_lengths)
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(total_docs, dtype=bool)
+            allowed[rows] = True
+
+        scores = np.zeros(total_docs)
+        matched = np.ones(total_docs, dtype=bool)
+        first_match = None
+        for phrase in phrases:
+            documents, tf, first = self.phrase_matches(phrase)
+            hit = np.zeros(total_docs, dtype=bool)
+            hit[documents] = True
+            matched &= hit
+            if not matched.any():
+                return []
+
+            idf = math.log(1 + (total_docs - len(documents) + 0.5) / (len(documents) + 0.5))
+            norm = K1 * (1 - B + B * self.doc_lengths[documents] / self.average_length)
+            scores[documents] += idf * tf * (K1 + 1) / (tf + norm)
+            if first_match is None:
+                first_match = np.zeros(total_docs, dtype=np.int64)
+                first_match[documents] = first
+
+        if allowed is not None:
+            matched &= allowed
+        candidates = np.flatnonzero(matched)
+        # highest score first, ties in row order
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')][:limit]
+        return [(int(row), float(scores[row]), int(first_match[row])) for row in candidates]
+
+    def snippet(self, row, text, position, context=SNIPPET_CONTEXT):
+        # The lyric text around a token position, on one line
+        tokens = self.doc_ptr[row + 1] - self.doc_ptr[row]
+        lo = max(position - context, 0)
+        hi = min(position + context, tokens - 1)
+        base = self.doc_ptr[row]
+        fragment = ' '.join(text[self.token_start[base + lo]:self.token_end[base + hi]].split())
+        return ('…' if lo > 0 else '') + fragment + ('…' if hi < tokens - 1 else '')
@@ -0,0 +1,114 @@
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, leaves_list, linkage, optimal_leaf_ordering
+from scipy.spatial.distance import squareform
+
+from .process_pool import map_tasks
+
+
+# Pairwise voting similarity between countries and hierarchical bloc detection.
+#
+# Input is a countries x countries voting matrix (row = points given, column = points received,
+# summed perc_of_max over a year range). Every score is one batched matrix operation:
+#   cosine       angle between two countries' voting rows
+#   pearson      cosine of the mean-centred rows
+#   reciprocity  sqrt(share of i's points going to j * share of j's points going to i), symmetric,
+#                1 when two countries give each other everything
+# Blocs come from average-linkage clustering on 1 - similarity, ordered by the optimal leaf
+# order so similar countries sit next to each other in the heatmap. The permutation test
+# compares each bloc's cohesion (mean pairwise similarity inside it) against random blocs of
+# the same size, in chunks seeded from one SeedSequence so the p-values do not depend on the
+# number of worker processes (src/process_pool.py).
+
+METRICS = ('cosine', 'pearson', 'reciprocity')
+
+PERMUTATION_CHUNK = 500  # permutations per task, and per SeedSequence child
+PARALLEL_PERMUTATIONS = 2000  # fewer permutations run in the calling process
+
+
+def cosine_similarity(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    unit = np.divide(matrix, norms, out=np.zeros_like(matrix, dtype=float), where=norms > 0)
+    similarity = unit @ unit.T
+    np.fill_diagonal(similarity, 1.0)
+    return similarity
+
+
+def pearson_similarity(matrix):
+    if matrix.size == 0:
+        return cosine_similarity(matrix)
+    return cosine_similarity(matrix - matrix.mean(axis=1, keepdims=True))
+
+
+def reciprocity(matrix):
+    totals = matrix.sum(axis=1, keepdims=True)
+    shares = np.divide(matrix, totals, out=np.zeros_like(matrix, dtype=float), where=totals > 0)
+    similarity = np.sqrt(shares * shares.T)
+    np.fill_diagonal(similarity, 1.0)
+    return similarity
+
+
+SIMILARITIES = {'cosine': cosine_similarity, 'pearson': pearson_similarity, 'reciprocity': reciprocity}
+
+
+def similarity_matrices(matrix):
+    """{metric: countries x countries similarity} for every metric in METRICS."""
+    matrix = np.asarray(matrix, dtype=float)
+    return {metric: SIMILARITIES[metric](matrix) for metric in METRICS}
+
+
+def detect_blocs(similarity, number_of_blocs):
+    """(leaf order, bloc label per country) of average-linkage clustering on 1 - similarity.
+
+    Labels are 0..n-1 numbered in leaf order, so bloc 0 holds the first countries of the order.
+    """
+    count = len(similarity)
+    if count < 2:
+        return np.arange(count), np.zeros(count, dtype=int)
+    # similarities lie in [-1, 1], distances in [0, 2]
+    distances = squareform(np.clip(1.0 - similarity, 0.0, 2.0), checks=False)
+    tree = optimal_leaf_ordering(linkage(distances, method='average'), distances)
+    order = leaves_list(tree)
+    clusters = fcluster(tree, t=min(number_of_blocs, count), criterion='maxclust')
+
+    # renumber by first appearance along the leaf order
+    _, first = np.unique(clusters[order], return_index=True)
+    renumbered = np.empty(clusters.max() + 1, dtype=int)
+    renumbered[clusters[order][np.sort(first)]] = np.arange(len(first))
+    return order, renumbered[clusters]
+
+
+def cohesion(similarity, labels, number_of_blocs=None):
+    """Mean similarity between distinct members of each bloc, for one or a batch of label vectors.
+
+    labels has shape (countries,) or (batch, countries); NaN for single-country blocs.
+    """
+    labels = np.atleast_2d(labels)
+    if number_of_blocs is None:
+        number_of_blocs = int(labels.max()) + 1 if labels.size else 0
+    members = np.eye(number_of_blocs)[labels]  # (batch, countries, blocs) one-hot
+    off_diagonal = similarity - np.diag(np.diag(similarity))
+    within = (members * np.matmul(off_diagonal, members)).sum(axis=1)
+    sizes = members.sum(axis=1)
+    pairs = sizes * (sizes - 1)
+    result = np.divide(within, pairs, out=np.full_like(within, np.nan), where=pairs > 0)
+    return result[0] if result.shape[0] == 1 else result
+
+
+def _permutation_chunk(similarity, labels, permutations, seed_sequence):
+    # How often a random relabelling (same bloc sizes) is at least as cohesive, per bloc
+    rng = np.random.default_rng(seed_sequence)
+    shuffled = rng.permuted(np.broadcast_to(labels, (permutations, len(labels))), axis=1)
+    observed = cohesion(similarity, labels)
+    return (cohesion(similarity, shuffled, len(observed)) >= observed).sum(axis=0)
+
+
+def permutation_test(similarity, labels, permutations=1000, seed=0):
+    """Per-bloc p-values of the observed cohesion against random blocs of the same sizes.
+
+    Deterministic for a given seed. Large tests are spread over a process pool.
+    """
+    chunks = [min(PERMUTATION_CHUNK, permutations - done) for done in range(0, permutations, PERMUTATION_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(similarity, labels, size, child) for size, child in zip(chunks, seeds)]
+    exceedances = sum(map_tasks(_permutation_chunk, tasks, parallel=permutations >= PARALLEL_PERMUTATIONS))
+    return (1 + exceedances) / (1 + permutations)
@@ -0,0 +1,194 @@
+import numpy as np
+from scipy.stats import rankdata
+
+from .process_pool import map_tasks
+
+
+# Counterfactual scoring: the placements of every final under another scoring rule, with some
+# voting countries left out, and Monte Carlo estimates of each entry's chance of winning.
+#
+# Every country-to-country vote of a final is one entry of a (points type, voter, receiver)
+# array per year, so a rule is a transformation of those arrays for all years at once:
+#   actual      the points as awarded
+#   eurovision  every voter's ranking rescored 12-10-8-7-...-1; televote and jury separately
+#               (and summed) in the split years, as since 2016
+#   linear      the same with 10-9-8-...-1
+#   jury_only   the jury points alone, split years only
+#   tele_only   the televote points alone, split years only
+# Rankings come from the awarded points, so an entry only gets rescored points if it got
+# points; tied entries all get the higher value.
+#
+# Monte Carlo runs either resample the voters with replacement ('resample') or multiply every
+# awarded point by log-normal noise before the rule is applied ('perturb'). Simulations run in
+# (year, chunk) tasks, each seeded from SeedSequence([seed, year]) and its chunk index, so the
+# estimates of a year do not depend on the requested range nor on the number of worker processes
+# (src/process_pool.py).
+
+RULES = ('actual', 'eurovision', 'linear', 'jury_only', 'tele_only')
+SPLIT_RULES = ('jury_only', 'tele_only')  # rules that need separate televote and jury points
+SCALES = {
+    'eurovision': np.array([12, 10, 8, 7, 6, 5, 4, 3, 2, 1], dtype=float),
+    'linear': np.arange(10, 0, -1, dtype=float),
+}
+MODES = ('resample', 'perturb')
+
+# (points type) axis of Simulator.points and the votes_df column each one is read from
+POINT_COLUMNS = ('total_points', 'tele_points', 'jury_points')
+
+MONTE_CARLO_CHUNK = 500  # simulations per task, and per SeedSequence child
+PARALLEL_SIMULATIONS = 20000  # fewer simulations (summed over the years) run in the calling process
+
+
+def rescore(points, scale):
+    """Points of the same shape: scale[k] for the entry ranked k + 1 on the last axis, 0 without points."""
+    count = points.shape[-1]
+    order = np.argsort(-points, axis=-1, kind='stable')
+    ordered = np.take_along_axis(points, order, axis=-1)
+    # rank of each sorted position = position of the first entry with the same points
+    tie_start = np.ones(ordered.shape, dtype=bool)
+    tie_start[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    first = np.maximum.accumulate(np.where(tie_start, np.arange(count), 0), axis=-1)
+    padded = np.zeros(count)
+    padded[:min(len(scale), count)] = scale[:count]
+    rescored = np.empty_like(points, dtype=float)
+    np.put_along_axis(rescored, order, padded[first], axis=-1)
+    return np.where(points > 0, rescored, 0.0)
+
+
+def rule_layers(rule, split):
+    """Indices of the points types the rule reads in a year with (split) or without separate televote and jury."""
+    if rule == 'actual':
+        return [0]
+    if rule in SPLIT_RULES:
+        return [1] if rule == 'tele_only' else [2]
+    return [1, 2] if split else [0]
+
+
+def rule_ballots(points, split, rule):
+    """(..., voter, receiver) points under the rule, from (..., points type, voter, receiver) points.
+
+    split tells for each leading index (or for all, as a single bool) whether it is a year with
+    separate televote and jury points.
+    """
+    if rule not in SCALES:
+        return points[..., rule_layers(rule, True)[0], :, :]
+    scale = SCALES[rule]
+    if np.ndim(split) == 0:
+        return sum(rescore(points[..., layer, :, :], scale) for layer in rule_layers(rule, split))
+    total, tele, jury = points[..., 0, :, :], points[..., 1, :, :], points[..., 2, :, :]
+    return np.where(np.asarray(split)[..., None, None], rescore(tele, scale) + rescore(jury, scale), rescore(total, scale))
+
+
+def placements(scores, received):
+    """Places (1 = winner, ties share the best place, no countback) of the receivers on the last axis, NaN elsewhere."""
+    places = rankdata(np.where(received, -scores, np.inf), axis=-1, method='min')
+    return np.where(received, places, np.nan)
+
+
+def _monte_carlo_chunk(points, split, voters, received, rule, mode, noise, simulations, seed_sequence):
+    # (fractional wins, summed places) of the receivers over one chunk of simulations of one year
+    rng = np.random.default_rng(seed_sequence)
+    if mode == 'perturb':
+        # only the points types the rule reads get noise
+        layers = rule_layers(rule, split)
+        points = np.repeat(points[None], simulations, axis=0)
+        points[:, layers] *= rng.lognormal(0.0, noise, (simulations, len(layers)) + points.shape[-2:])
+        scores = (rule_ballots(points, split, rule) * voters[:, None]).sum(axis=-2)
+    else:
+        ballots = rule_ballots(points, split, rule) * voters[:, None]
+        count = int(voters.sum())
+        weights = rng.multinomial(count, voters / max(count, 1), size=simulations) if count else \
+            np.zeros((simulations, len(voters)))
+        scores = weights @ ballots
+
+    # a tie for first shares the win
+    best = received & (scores == np.where(received, scores, -np.inf).max(axis=1, keepdims=True))
+    wins = (best / best.sum(axis=1, keepdims=True)).sum(axis=0)
+    return wins, np.nansum(placements(scores, received), axis=0)
+
+
+class Simulator:
+    """Per-year (points type, voter, receiver) points of one round, taken from votes_df once."""
+
+    def __init__(self, votes_df, round='final'):
+        votes = votes_df[votes_df['round'] == round]
+        self.round = round
+        years = votes['year'].to_numpy(dtype=int)
+        self.years = np.arange(years.min(), years.max() + 1) if len(votes) else np.array([], dtype=int)
+        self.countries = np.array(sorted(set(votes['from_country_id']) | set(votes['to_country_id'])), dtype=object)
+
+        year_idx = years - (self.years[0] if len(votes) else 0)
+        from_idx = np.searchsorted(self.countries, votes['from_country_id'].astype(str).to_numpy())
+        to_idx = np.searchsorted(self.countries, votes['to_country_id'].astype(str).to_numpy())
+        shape = (len(self.years), len(self.countries))
+
+        self.points = np.zeros((len(self.years), len(POINT_COLUMNS), len(self.countries), len(self.countries)))
+        for p, column in enumerate(POINT_COLUMNS):
+            np.add.at(self.points[:, p], (year_idx, from_idx, to_idx), votes[column].fillna(0).to_numpy(dtype=float))
+        # a vote row, even with 0 points, marks a voter / an entry of that year's round
+        self.gave = np.zeros(shape, dtype=bool)
+        self.gave[year_idx, from_idx] = True
+        self.received = np.zeros(shape, dtype=bool)
+        self.received[year_idx, to_idx] = True
+        # years with both a televote and a jury vote
+        self.split = (self.points[:, 1].sum(axis=(1, 2)) > 0) & (self.points[:, 2].sum(axis=(1, 2)) > 0)
+
+    def _rows(self, start, end, rule):
+        # year indices of the range the rule applies to
+        lo, hi = np.searchsorted(self.years, [start, end + 1])
+        rows = np.arange(lo, hi)
+        held = self.received[lo:hi].any(axis=1)
+        return rows[held & self.split[lo:hi]] if rule in SPLIT_RULES else rows[held]
+
+    def _voters(self, rows, exclude):
+        # voters of each year, without the excluded country codes
+        return self.gave[rows] & ~np.isin(self.countries, list(exclude))
+
+    def simulate(self, start, end, rule='actual', exclude=()):
+        """Points and places of every final in the range under the rule, voters in exclude left out.
+
+        Returns a dict: years, countries (codes of the entries of any of those finals) and
+        years x countries points and places, NaN where a country had no entry.
+        """
+        rows = self._rows(start, end, rule)
+        voters = self._voters(rows, exclude)
+        scores = (rule_ballots(self.points[rows], self.split[rows], rule) * voters[:, :, None]).sum(axis=1)
+        received = self.received[rows]
+        countries = received.any(axis=0)
+        return {
+            "years": self.years[rows],
+            "countries": self.countries[countries],
+            "points": np.where(received, scores, np.nan)[:, countries],
+            "places": placements(scores, received)[:, countries],
+        }
+
+    def monte_carlo(self, start, end, rule='actual', exclude=(), simulations=1000, mode='resample', noise=0.2, seed=0):
+        """Win probability and mean place of every entry over the simulations, per final in the range.
+
+        Same keys as simulate() with win_probability and mean_place instead of points and places.
+        Deterministic for a given seed; large runs are spread over a process pool.
+        """
+        rows = self._rows(start, end, rule)
+        voters = self._voters(rows, exclude)
+        chunks = [min(MONTE_CARLO_CHUNK, simulations - done) for done in range(0, simulations, MONTE_CARLO_CHUNK)]
+        tasks = []
+        for row, year_voters in zip(rows, voters):
+            seeds = np.random.SeedSequence([seed, int(self.years[row])]).spawn(len(chunks))
+            tasks += [(self.points[row], self.split[row], year_voters, self.received[row], rule, mode, noise, size, child)
+                      for size, child in zip(chunks, seeds)]
+        results = map_tasks(_monte_carlo_chunk, tasks, parallel=simulations * len(rows) >= PARALLEL_SIMULATIONS)
+
+        # chunk results are in (year, chunk) order
+        wins = np.zeros((len(rows), len(self.countries)))
+        place_sums = np.zeros((len(rows), len(self.countries)))
+        for i, (chunk_wins, chunk_places) in enumerate(results):
+            wins[i // len(chunks)] += chunk_wins
+            place_sums[i // len(chunks)] += chunk_places
+        received = self.received[rows]
+        countries = received.any(axis=0)
+        return {
+            "years": self.years[rows],
+            "countries": self.countries[countries],
+            "win_probability": np.where(received, wins / simulations, np.nan)[:, countries],
+            "mean_place": np.where(received, place_sums / simulations, np.nan)[:, countries],
+        }
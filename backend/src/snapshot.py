@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import data
+from .lyrics_index import LyricsIndex
+from .search_index import SearchIndex
+from .voting_cube import VotingCube
+
+
+# Columnar binary snapshot of the cleaned datasets and their derived arrays.
+#
+# Every array is a .npy file loaded with mmap_mode='r', tables keep the compact dtypes
+# of data.compact_contestants / data.compact_votes. Strings are stored either as
+# integer codes into a category list (country codes, rounds, regions, ...) or, for
+# free text like lyrics, as one UTF-8 blob plus offsets. Only the hot contestants
+# columns are materialized on load, the rest is read when song_details needs it.
+# The lyrics_english search index is stored as its flat postings arrays.
+# manifest.json records the layout, the size / mtime of the source CSVs and the lyric token
+# store in use (src/lyrics_pipeline.py) so stale snapshots are ignored.
+#
+# Build with:  python -m src.snapshot  [--dataset-dir DIR] [--snapshot-dir DIR]
+
+SNAPSHOT_FORMAT = 3
+
+TABLES = ['contestants_df', 'votes_df', 'countries_regions_df', 'country_df']
+
+# SearchIndex arrays after the vocabulary, in constructor order
+SEARCH_ARRAYS = ['term_ptr', 'post_doc', 'pos_ptr', 'positions', 'doc_ptr', 'token_start', 'token_end']
+
+# string columns with more distinct values than this share of rows are stored as text
+CATEGORY_RATIO = 0.5
+
+
+def _source_stats(dataset_dir):
+    stats = {}
+    for name in data.DATASET_FILES:
+        stat = os.stat(os.path.join(dataset_dir, name))
+        stats[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stats
+
+
+def _lyrics_tokens_digest():
+    from .lyrics_pipeline import store_digest
+
+    return store_digest(data.LYRICS_TOKENS_DIR)
+
+
+def _save_strings(directory, name, values):
+    # UTF-8 blob + int64 offsets (+ null mask), missing values become None again on load
+    values = list(values)
+    nulls = np.array([not isinstance(v, str) for v in values])
+    encoded = [b'' if null else v.encode('utf-8') for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f'{name}.bin'), 'wb') as file:
+        file.write(b''.join(encoded))
+    np.save(os.path.join(directory, f'{name}.offsets.npy'), offsets)
+    np.save(os.path.join(directory, f'{name}.null.npy'), nulls)
+
+
+def _load_strings(directory, name):
+    offsets = np.load(os.path.join(directory, f'{name}.offsets.npy')).tolist()
+    nulls = np.load(os.path.join(directory, f'{name}.null.npy')).tolist()
+    with open(os.path.join(directory, f'{name}.bin'), 'rb') as file:
+        blob = file.read()
+    strings = np.empty(len(nulls), dtype=object)
+    strings[:] = [
+        None if null else blob[lo:hi].decode('utf-8')
+        for null, lo, hi in zip(nulls, offsets, offsets[1:])
+    ]
+    return strings
+
+
+def _save_array(directory, name, array):
+    np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+
+def _load_array(directory, name):
+    return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+
+def _save_table(directory, name, df):
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        key = f'{name}.{i}'
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            _save_array(directory, key, values.cat.codes.to_numpy())
+            _save_strings(directory, f'{key}.categories', values.cat.categories)
+            columns.append({"name": column, "kind": "category", "file": key})
+        elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            _save_array(directory, key, values.to_numpy())
+            columns.append({"name": column, "kind": "numeric", "file": key})
+        elif values.nunique() <= CATEGORY_RATIO * len(values):
+            codes, categories = pd.factorize(values, sort=True)
+            _save_array(directory, key, codes.astype(np.int32))
+            _save_strings(directory, f'{key}.categories', categories)
+            columns.append({"name": column, "kind": "codes", "file": key})
+        else:
+            _save_strings(directory, key, values)
+            columns.append({"name": column, "kind": "text", "file": key})
+    return {"rows": len(df), "columns": columns}
+
+
+def _load_table(directory, layout, names=None):
+    columns = {}
+    for column in layout['columns']:
+        if names is not None and column['name'] not in names:
+            continue
+        if column['kind'] == 'numeric':
+            columns[column['name']] = _load_array(directory, column['file'])
+        elif column['kind'] == 'category':
+            categories = _load_strings(directory, f"{column['file']}.categories")
+            columns[column['name']] = pd.Categorical.from_codes(_load_array(directory, column['file']), categories)
+        elif column['kind'] == 'codes':
+            codes = _load_array(directory, column['file'])
+            categories = _load_strings(directory, f"{column['file']}.categories")
+            # code -1 marks a missing value
+            columns[column['name']] = np.where(codes >= 0, categories[np.maximum(codes, 0)], None)
+        else:
+            columns[column['name']] = _load_strings(directory, column['file'])
+    # copy=False keeps numeric columns as views of the memory-mapped files, shared between processes
+    return pd.DataFrame(columns, copy=False)
+
+
+def save_lyrics_index(directory, index):
+    # LyricsIndex CSR arrays, shared by the snapshot and the lyric tokenization store (src/lyrics_pipeline.py)
+    _save_strings(directory, 'lyrics_index.vocabulary', index.vocabulary)
+    _save_array(directory, 'lyrics_index.indptr', index.counts.indptr)
+    _save_array(directory, 'lyrics_index.indices', index.counts.indices)
+    _save_array(directory, 'lyrics_index.counts', index.counts.data)
+    _save_array(directory, 'lyrics_index.first_seen', index.first_seen.data)
+
+
+def load_lyrics_index(directory, years, countries):
+    # memory-mapped LyricsIndex over entries with these years / to_country names, in row order
+    vocabulary = _load_strings(directory, 'lyrics_index.vocabulary')
+    shape = (len(years), len(vocabulary))
+    indptr = _load_array(directory, 'lyrics_index.indptr')
+    indices = _load_array(directory, 'lyrics_index.indices')
+    return LyricsIndex(
+        vocabulary,
+        sparse.csr_matrix((_load_array(directory, 'lyrics_index.counts'), indices, indptr), shape=shape, copy=False),
+        sparse.csr_matrix((_load_array(directory, 'lyrics_index.first_seen'), indices, indptr), shape=shape, copy=False),
+        years,
+        countries,
+    )
+
+
+def build_snapshot(dataset_dir=data.DATASET_DIR, snapshot_dir=data.SNAPSHOT_DIR):
+    """Read the CSVs once and write the snapshot, replacing any previous one."""
+    sources = _source_stats(dataset_dir)
+    dataset = data.read_csvs(dataset_dir)
+    # hot compact columns plus the cold ones, in the source column order
+    contestants_df = pd.concat([dataset.contestants_df, dataset.cold_contestants()], axis=1)
+    tables = {name: getattr(dataset, name) for name in TABLES}
+    tables['contestants_df'] = contestants_df[dataset.contestant_columns]
+
+    tmp_dir = snapshot_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": dataset.version,
+        "sources": sources,
+        # the word cloud index comes from the lyric token store when one is configured
+        "lyrics_tokens": _lyrics_tokens_digest(),
+        "tables": {name: _save_table(tmp_dir, name, table) for name, table in tables.items()},
+    }
+
+    cube = dataset.vote_cube
+    _save_array(tmp_dir, 'vote_cube.years', cube.years)
+    _save_array(tmp_dir, 'vote_cube.cumulative', cube.cumulative)
+    _save_array(tmp_dir, 'vote_cube.presence', cube.presence)
+    _save_strings(tmp_dir, 'vote_cube.countries', cube.countries)
+    _save_strings(tmp_dir, 'vote_cube.rounds', cube.rounds)
+
+    save_lyrics_index(tmp_dir, dataset.lyrics_index)
+
+    search = dataset.search_index()
+    _save_strings(tmp_dir, 'search_index.vocabulary', search.vocabulary)
+    for name in SEARCH_ARRAYS:
+        _save_array(tmp_dir, f'search_index.{name}', getattr(search, name))
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+    return manifest
+
+
+def read_manifest(snapshot_dir=data.SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, 'manifest.json')) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(snapshot_dir=data.SNAPSHOT_DIR, dataset_dir=data.DATASET_DIR):
+    # Usable when it exists, has the current layout and was built from the CSVs on disk
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None or manifest.get('format') != SNAPSHOT_FORMAT:
+        return False
+    if manifest.get('lyrics_tokens') != _lyrics_tokens_digest():
+        return False
+    try:
+        return manifest['sources'] == _source_stats(dataset_dir)
+    except OSError:
+        return False
+
+
+def load_snapshot(snapshot_dir=data.SNAPSHOT_DIR):
+    manifest = read_manifest(snapshot_dir)
+    layouts = manifest['tables']
+    tables = {name: _load_table(snapshot_dir, layout) for name, layout in layouts.items() if name != 'contestants_df'}
+    contestant_columns = [column['name'] for column in layouts['contestants_df']['columns']]
+    cold_columns = [column for column in contestant_columns if column not in data.HOT_CONTESTANT_COLUMNS]
+    tables['contestants_df'] = _load_table(snapshot_dir, layouts['contestants_df'], data.HOT_CONTESTANT_COLUMNS)
+
+    vote_cube = VotingCube(
+        _load_array(snapshot_dir, 'vote_cube.years'),
+        _load_strings(snapshot_dir, 'vote_cube.countries'),
+        _load_strings(snapshot_dir, 'vote_cube.rounds').tolist(),
+        _load_array(snapshot_dir, 'vote_cube.cumulative'),
+        _load_array(snapshot_dir, 'vote_cube.presence'),
+    )
+
+    contestants_df = tables['contestants_df']
+    lyrics_index = load_lyrics_index(
+        snapshot_dir, contestants_df['year'].to_numpy(), contestants_df['to_country'].to_numpy(dtype=object)
+    )
+
+    search_index = SearchIndex(
+        _load_strings(snapshot_dir, 'search_index.vocabulary'),
+        *(_load_array(snapshot_dir, f'search_index.{name}') for name in SEARCH_ARRAYS),
+    )
+
+    return data.Dataset(
+        contestants_df, tables['votes_df'], tables['countries_regions_df'], tables['country_df'],
+        manifest['version'], vote_cube=vote_cube, lyrics_index=lyrics_index, search_index=search_index,
+        load_cold=lambda: _load_table(snapshot_dir, layouts['contestants_df'], cold_columns),
+        contestant_columns=contestant_columns,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the binary dataset snapshot from the cleaned CSVs")
+    parser.add_argument('--dataset-dir', default=data.DATASET_DIR)
+    parser.add_argument('--snapshot-dir', default=data.SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build_snapshot(args.dataset_dir, args.snapshot_dir)
+    print(f"Snapshot written to {args.snapshot_dir} in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    load_snapshot(args.snapshot_dir)
+    print(f"Snapshot loads in {(time.perf_counter() - started) * 1000:.0f}ms")
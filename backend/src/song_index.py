@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def normalize_title(title):
+    # case- and whitespace-insensitive form of a song title
+    return ' '.join(str(title).split()).casefold()
+
+
+class SongIndex:
+    """Hash indexes over contestants_df for the songs_list / song_details lookups.
+
+    Rows are listed newest year first (dataset order within a year). A cursor is the
+    listing position of the last row returned, so pages stay consistent for any filter.
+    """
+
+    def __init__(self, contestants_df):
+        years = contestants_df['year'].to_numpy()
+        countries = contestants_df['to_country'].astype(str).tolist()
+        titles = contestants_df['song'].tolist()
+
+        # listing order and each row's position in it
+        self.order = np.argsort(-years.astype(np.int64), kind='stable')
+        self.position = np.empty(len(years), dtype=np.int64)
+        self.position[self.order] = np.arange(len(years))
+
+        self.by_year = _group(years.tolist())
+        self.by_country = _group(countries)
+        self.by_year_country = _group(list(zip(years.tolist(), countries)))
+        self.by_title = _group(titles)
+        self.by_normalized_title = _group([normalize_title(title) for title in titles])
+
+        # listing columns as plain Python values, ready for JSON
+        self.records = {
+            'year': years.tolist(),
+            'song': titles,
+            'to_country': countries,
+            'place_contest': contestants_df['place_contest'].astype(float).tolist(),
+        }
+
+    def rows(self, year=None, country=None):
+        """Matching rows in listing order."""
+        if year and country:
+            rows = self.by_year_country.get((year, country))
+        elif year:
+            rows = self.by_year.get(year)
+        elif country:
+            rows = self.by_country.get(country)
+        else:
+            return self.order
+        if rows is None:
+            return np.array([], dtype=np.int64)
+        return rows[np.argsort(self.position[rows])]
+
+    def page(self, rows, cursor=None, limit=None):
+        """(rows after the cursor, at most limit of them, next cursor or None)."""
+        if cursor is not None:
+            rows = rows[np.searchsorted(self.position[rows], cursor, side='right'):]
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, int(self.position[rows[-1]])
+
+    def record(self, row):
+        return {column: values[row] for column, values in self.records.items()}
+
+    def find_title(self, title):
+        # exact title first, then case / whitespace-insensitive
+        rows = self.by_title.get(title)
+        if rows is None:
+            rows = self.by_normalized_title.get(normalize_title(title))
+        return None if rows is None else int(rows[0])
+
+
+def _group(keys):
+    # key -> array of the rows holding it, in row order
+    groups = {}
+    for row, key in enumerate(keys):
+        groups.setdefault(key, []).append(row)
+    return {key: np.array(rows, dtype=np.int64) for key, rows in groups.items()}
@@ -0,0 +1,105 @@
+import numpy as np
+from scipy.stats import rankdata
+
+from .voting_cube import POINT_TYPES
+
+
+# Televote vs jury decomposition of the split-voting years (2016 on). Scores are percentages of
+# the maximum one country can give (tele_percentage / jury_percentage), so tele - jury > 0 means
+# the public liked an entry more than the juries did.
+
+TELE = list(POINT_TYPES).index('tele')
+JURY = list(POINT_TYPES).index('jury')
+
+# the percentages carry one decimal in votes.csv; summed float32 values are rounded back to it
+# before ranking, so equal totals tie instead of being ordered by rounding noise
+PRECISION = 1
+
+
+class TeleJurySplit:
+    """Per-year televote and jury totals of one round, taken from the voting cube once.
+
+    Pair matrices for a range come from the cube's prefix sums, per-country series from
+    these (years, countries) arrays, so a range is a handful of slices and reductions.
+    """
+
+    def __init__(self, vote_cube, round='final'):
+        self.vote_cube = vote_cube
+        self.round = round
+        self.years = vote_cube.years
+        self.countries = vote_cube.countries
+
+        r = vote_cube.rounds.index(round) if round in vote_cube.rounds else None
+        if r is None:
+            shape = (len(self.years), len(self.countries))
+            self.tele_received = self.jury_received = np.zeros(shape)
+            self.received = self.gave = np.zeros(shape, dtype=bool)
+        else:
+            # points received per year: sum over senders, then undo the prefix sum over years
+            received = np.diff(vote_cube.cumulative[r, [TELE, JURY]].sum(axis=2), axis=1)
+            self.tele_received, self.jury_received = received
+            presence = np.diff(vote_cube.presence[r], axis=0)
+            self.gave, self.received = presence[:, 0] > 0, presence[:, 1] > 0
+        # years with both a televote and a jury vote
+        self.split = (self.tele_received.sum(axis=1) > 0) & (self.jury_received.sum(axis=1) > 0)
+
+    def _years(self, start, end):
+        # split-year indices within the inclusive range
+        lo, hi = np.searchsorted(self.years, [start, end + 1])
+        return np.arange(lo, hi)[self.split[lo:hi]]
+
+    def decompose(self, start, end):
+        """Tele vs jury arrays for the split years of the range, over the countries that voted or were voted for.
+
+        Returns a dict: years, countries, per-country mean tele / jury share received per contest and
+        their difference (public- minus jury-favoured), per-sender mean absolute disagreement and
+        Spearman correlation between its televote and jury, the per-year Spearman correlation of the
+        two rankings, and the summed sender x receiver tele - jury matrix.
+        """
+        rows = self._years(start, end)
+        if len(rows) == 0:
+            return None
+        received, gave = self.received[rows], self.gave[rows]
+        countries = received.any(axis=0) | gave.any(axis=0)
+        first, last = int(self.years[rows[0]]), int(self.years[rows[-1]])
+
+        contests = received.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tele = self.tele_received[rows].sum(axis=0) / contests
+            jury = self.jury_received[rows].sum(axis=0) / contests
+
+        tele_pairs = self.vote_cube.matrix(first, last, self.round, 'tele')
+        jury_pairs = self.vote_cube.matrix(first, last, self.round, 'jury')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            disagreement = np.abs(tele_pairs - jury_pairs).sum(axis=1) / gave.sum(axis=0)
+
+        # a sender ranks everyone it could vote for in the range, i.e. not itself
+        candidates = np.broadcast_to(received.any(axis=0), tele_pairs.shape) & ~np.eye(len(self.countries), dtype=bool)
+        keep = np.ix_(countries, countries)
+        return {
+            "years": self.years[rows],
+            "countries": self.countries[countries],
+            "tele": tele[countries],
+            "jury": jury[countries],
+            "favour": (tele - jury)[countries],
+            "disagreement": disagreement[countries],
+            "sender_correlation": spearman(
+                tele_pairs.round(PRECISION), jury_pairs.round(PRECISION), candidates
+            )[countries],
+            "yearly_correlation": spearman(
+                self.tele_received[rows].round(PRECISION), self.jury_received[rows].round(PRECISION), received
+            ),
+            "divergence": (tele_pairs - jury_pairs)[keep],
+        }
+
+
+def spearman(a, b, mask):
+    """Row-wise Spearman correlation of a and b over the entries where mask holds, NaN below 2 entries."""
+    a = rankdata(np.where(mask, a, np.nan), axis=1, nan_policy='omit')
+    b = rankdata(np.where(mask, b, np.nan), axis=1, nan_policy='omit')
+    counts = mask.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a = a - np.nansum(a, axis=1, keepdims=True) / counts
+        b = b - np.nansum(b, axis=1, keepdims=True) / counts
+        correlation = np.nansum(a * b, axis=1) / np.sqrt(np.nansum(a * a, axis=1) * np.nansum(b * b, axis=1))
+    return np.where(counts[:, 0] >= 2, correlation, np.nan)
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+
+# Points types stored in the cube and the votes_df column each one is built from
+POINT_TYPES = {
+    'total': 'perc_of_max',
+    'tele': 'tele_percentage',
+    'jury': 'jury_percentage',
+}
+
+
+class VotingCube:
+    """Dense [round, points type, year, from_country, to_country] voting cube.
+
+    The year axis holds cumulative sums (with a leading layer of zeros), so the
+    matrix for any year range is the difference of two slices instead of a
+    filter + groupby over votes_df.
+    """
+
+    def __init__(self, years, countries, rounds, cumulative, presence):
+        self.years = years
+        self.countries = countries
+        self.rounds = rounds
+        self.cumulative = cumulative  # shape (rounds, points types, years + 1, countries, countries)
+        self.presence = presence  # shape (rounds, years + 1, 2, countries): vote rows as sender / receiver
+        self.first_year = int(years[0]) if len(years) else 0
+        self.last_year = int(years[-1]) if len(years) else -1
+        self._country_index = pd.Index(countries)
+
+    @classmethod
+    def from_votes(cls, votes_df):
+        # one slot per calendar year between first and last contest, so year -> index is a subtraction
+        years = np.arange(votes_df['year'].min(), votes_df['year'].max() + 1)
+        countries = np.array(sorted(set(votes_df['from_country_id']) | set(votes_df['to_country_id'])))
+        rounds = sorted(votes_df['round'].unique().tolist())
+
+        round_idx = pd.Categorical(votes_df['round'], categories=rounds).codes
+        year_idx = votes_df['year'].to_numpy() - years[0] + 1
+        from_idx = np.searchsorted(countries, votes_df['from_country_id'].to_numpy())
+        to_idx = np.searchsorted(countries, votes_df['to_country_id'].to_numpy())
+
+        cumulative = np.zeros((len(rounds), len(POINT_TYPES), len(years) + 1, len(countries), len(countries)))
+        for p, column in enumerate(POINT_TYPES.values()):
+            np.add.at(cumulative[:, p], (round_idx, year_idx, from_idx, to_idx), votes_df[column].fillna(0).to_numpy())
+        np.cumsum(cumulative, axis=2, out=cumulative)
+
+        presence = np.zeros((len(rounds), len(years) + 1, 2, len(countries)), dtype=np.int64)
+        np.add.at(presence, (round_idx, year_idx, 0, from_idx), 1)
+        np.add.at(presence, (round_idx, year_idx, 1, to_idx), 1)
+        np.cumsum(presence, axis=1, out=presence)
+
+        return cls(years, countries, rounds, cumulative, presence)
+
+    def append(self, votes_df):
+        """New cube with the votes of later years added on top of this one's prefix sums.
+
+        Only the new years are summed, existing layers are copied over (re-indexed when
+        the new votes bring new countries or rounds).
+        """
+        if len(votes_df) == 0:
+            return self
+        if votes_df['year'].min() <= self.last_year:
+            raise ValueError(f"Can only append years after {self.last_year}")
+
+        years = np.arange(self.first_year if len(self.years) else votes_df['year'].min(), votes_df['year'].max() + 1)
+        countries = np.array(sorted(set(self.countries) | set(votes_df['from_country_id']) | set(votes_df['to_country_id'])))
+        rounds = sorted(set(self.rounds) | set(votes_df['round'].unique().tolist()))
+        old_years = len(self.years)
+
+        # existing layers at their new country / round positions
+        country_map = np.searchsorted(countries, self.countries)
+        round_map = [rounds.index(r) for r in self.rounds]
+        cumulative = np.zeros((len(rounds), len(POINT_TYPES), len(years) + 1, len(countries), len(countries)))
+        presence = np.zeros((len(rounds), len(years) + 1, 2, len(countries)), dtype=np.int64)
+        for r, new_r in enumerate(round_map):
+            cumulative[new_r, :, :old_years + 1][..., country_map[:, None], country_map] = self.cumulative[r]
+            presence[new_r, :old_years + 1][..., country_map] = self.presence[r]
+
+        # sums of the new years only, stacked on the last existing layer
+        round_idx = pd.Categorical(votes_df['round'], categories=rounds).codes
+        year_idx = votes_df['year'].to_numpy() - years[0] - old_years
+        from_idx = np.searchsorted(countries, votes_df['from_country_id'].to_numpy())
+        to_idx = np.searchsorted(countries, votes_df['to_country_id'].to_numpy())
+
+        added = np.zeros((len(rounds), len(POINT_TYPES), len(years) - old_years, len(countries), len(countries)))
+        for p, column in enumerate(POINT_TYPES.values()):
+            np.add.at(added[:, p], (round_idx, year_idx, from_idx, to_idx), votes_df[column].fillna(0).to_numpy())
+        # continue the running sum from the last existing layer, same order of additions as from_votes
+        added[:, :, 0] += cumulative[:, :, old_years]
+        np.cumsum(added, axis=2, out=cumulative[:, :, old_years + 1:])
+
+        added_presence = np.zeros((len(rounds), len(years) - old_years, 2, len(countries)), dtype=np.int64)
+        np.add.at(added_presence, (round_idx, year_idx, 0, from_idx), 1)
+        np.add.at(added_presence, (round_idx, year_idx, 1, to_idx), 1)
+        added_presence[:, 0] += presence[:, old_years]
+        np.cumsum(added_presence, axis=1, out=presence[:, old_years + 1:])
+
+        return VotingCube(years, countries, rounds, cumulative, presence)
+
+    def _bounds(self, start, end):
+        # Map an inclusive year range onto [lo, hi) offsets of the cumulative year axis
+        start = self.first_year if start is None else max(start, self.first_year)
+        end = self.last_year if end is None else min(end, self.last_year)
+        if start > end:
+            return 0, 0
+        return start - self.first_year, end - self.first_year + 1
+
+    def _round_indices(self, round):
+        rounds = [round] if isinstance(round, str) else list(round)
+        return [self.rounds.index(r) for r in rounds if r in self.rounds]
+
+    def matrix(self, start=None, end=None, round='final', points='total'):
+        """Summed countries x countries matrix for the inclusive year range."""
+        lo, hi = self._bounds(start, end)
+        p = list(POINT_TYPES).index(points)
+        rounds = self._round_indices(round)
+        layers = self.cumulative[rounds, p]
+        return (layers[:, hi] - layers[:, lo]).sum(axis=0)
+
+    def participation(self, start=None, end=None, round='final'):
+        """Boolean (senders, receivers) masks over self.countries for the year range."""
+        lo, hi = self._bounds(start, end)
+        rounds = self._round_indices(round)
+        counts = (self.presence[rounds, hi] - self.presence[rounds, lo]).sum(axis=0)
+        return counts[0] > 0, counts[1] > 0
+
+    def participants(self, start=None, end=None, round='final'):
+        # Sorted codes of every country that sent or received a vote in the range
+        senders, receivers = self.participation(start, end, round)
+        return self.countries[senders | receivers].tolist()
+
+    def pivot(self, start=None, end=None, round='final', points='total', index=None, columns=None):
+        """DataFrame equivalent of votes_df.pivot_table(from_country_id x to_country_id, sum).
+
+        Rows and columns default to the senders and receivers present in the range,
+        explicit labels that never voted are filled with 0.
+        """
+        matrix = self.matrix(start, end, round, points)
+        senders, receivers = self.participation(start, end, round)
+        if index is None:
+            index = self.countries[senders]
+        if columns is None:
+            columns = self.countries[receivers]
+
+        row_pos = self._country_index.get_indexer(index)
+        col_pos = self._country_index.get_indexer(columns)
+        values = matrix[np.ix_(np.where(row_pos < 0, 0, row_pos), np.where(col_pos < 0, 0, col_pos))]
+        values[row_pos < 0, :] = 0
+        values[:, col_pos < 0] = 0
+        return pd.DataFrame(values, index=pd.Index(index, name='from_country_id'),
+                            columns=pd.Index(columns, name='to_country_id'))
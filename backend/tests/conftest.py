@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# the tests import the backend as the app does (from src import ...), from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def dataset():
+    from src import data
+
+    return data.get_dataset()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from src import app as flask_app
+from src.asgi import AsyncApp, async_requests
+
+
+async def get(asgi_app, path, query=b''):
+    # (status, body) of one GET request through the ASGI interface
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query, 'headers': []}
+    await asgi_app(scope, receive, send)
+    return messages[0]['status'], messages[1]['body']
+
+
+def outcomes():
+    return dict(async_requests._values)
+
+
+def delta(before, outcome):
+    return outcomes().get((outcome,), 0) - before.get((outcome,), 0)
+
+
+def slow_app(seconds, calls):
+    # WSGI app that takes a while and counts its calls
+    def application(environ, start_response):
+        calls.append(environ['PATH_INFO'])
+        time.sleep(seconds)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'done']
+
+    return application
+
+
+def test_song_details_runs_in_the_pool(dataset):
+    asgi_app = AsyncApp(flask_app, pool_size=2)
+    before = outcomes()
+    status, _ = asyncio.run(get(asgi_app, '/api/song_details', b'song=Net%20Als%20Toen'))
+    assert status == 200
+    assert delta(before, 'pooled') == 1 and delta(before, 'inline') == 0
+
+    before = outcomes()
+    assert asyncio.run(get(asgi_app, '/api/available_years'))[0] == 200
+    assert delta(before, 'inline') == 1
+
+
+def test_identical_requests_share_one_computation():
+    calls = []
+    asgi_app = AsyncApp(slow_app(0.2, calls), pool_size=2)
+
+    async def both():
+        return await asyncio.gather(get(asgi_app, '/api/x', b'a=1&b=2'), get(asgi_app, '/api/x', b'b=2&a=1'))
+
+    assert asyncio.run(both()) == [(200, b'done'), (200, b'done')]
+    assert calls == ['/api/x']
+
+
+def test_timeouts_and_rejections():
+    calls = []
+    asgi_app = AsyncApp(slow_app(0.3, calls), pool_size=1, max_pending=1, timeout=0.1)
+
+    async def two():
+        return await asyncio.gather(get(asgi_app, '/api/slow'), get(asgi_app, '/api/other'))
+
+    (first, _), (second, _) = asyncio.run(two())
+    assert (first, second) == (504, 503)
+    # the timed-out computation still runs to the end, the rejected one never starts
+    asgi_app.pool.shutdown(wait=True)
+    assert calls == ['/api/slow']
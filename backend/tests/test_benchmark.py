@@ -0,0 +1,16 @@
+from src import app
+from src.benchmark import build_workload
+
+
+def test_workload_covers_every_get_endpoint():
+    routes = {rule.rule[len('/api/'):] for rule in app.url_map.iter_rules()
+              if rule.rule.startswith('/api/') and 'GET' in rule.methods}
+    workload = build_workload(1956, 2022, songs=['Net Als Toen'])
+    assert {endpoint for endpoint, _ in workload} == routes
+
+
+def test_workload_reaches_the_last_years():
+    # ranges starting in 2020, which had no contest
+    urls = [url for _, url in build_workload(1956, 2022)]
+    assert '/api/voting_clusters?yearRangeStart=2020&yearRangeEnd=2022&numberOfClusters=4' in urls
+    assert '/api/yearly_rankings?yearRangeStart=2021&yearRangeEnd=2022' in urls
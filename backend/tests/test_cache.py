@@ -0,0 +1,82 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from src import app
+from src.cache import cache_key, make_etag, memoized
+from src.encoding import JSON_MIMETYPE, MATRIX_MIMETYPE
+
+URL = '/api/word_cloud?yearRangeStart=1990&yearRangeEnd=2000'
+LARGE_URL = '/api/yearly_rankings?yearRangeStart=1957&yearRangeEnd=2022'  # compressed when accepted
+
+
+def key(query, accept=JSON_MIMETYPE):
+    return cache_key('/api/test', MultiDict(query), accept)
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+def test_key_ignores_parameter_order_and_integer_format():
+    assert key([('yearRangeStart', '1990'), ('yearRangeEnd', '2000')]) == \
+        key([('yearRangeEnd', ' 2000'), ('yearRangeStart', '01990')])
+
+
+def test_key_treats_lists_as_sets():
+    assert key([('countries', 'se,fr'), ('countries', 'se')]) == key([('countries', 'fr,se')])
+    assert key([('exclude', '')]) == key([])
+
+
+def test_key_keeps_string_values_as_sent():
+    assert key([('q', 'Love')]) != key([('q', 'love')])
+    assert key([('filter', '')]) != key([])
+    # only the first value of a repeated parameter is read
+    assert key([('year', '2000'), ('year', '2001')]) == key([('year', '2000')])
+
+
+def test_key_includes_non_json_representations():
+    assert key([], MATRIX_MIMETYPE) != key([])
+    assert key([], JSON_MIMETYPE) == key([], None)
+
+
+def test_etag_and_not_modified(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    etag = response.headers['ETag'].strip('"')
+    assert etag == make_etag(('/api/word_cloud', (('yearRangeEnd', '2000'), ('yearRangeStart', '1990'))))
+
+    # the same request in another spelling revalidates against the same ETag
+    revalidated = client.get('/api/word_cloud?yearRangeEnd=2000&yearRangeStart=1990',
+                             headers={'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert client.get(URL, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_compressed_body_has_its_own_etag(client):
+    plain = client.get(LARGE_URL)
+    gzipped = client.get(LARGE_URL, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert client.get(LARGE_URL, headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': gzipped.headers['ETag'],
+    }).status_code == 304
+
+
+def test_errors_are_not_cached(client):
+    assert client.get('/api/word_cloud').status_code == 400
+    assert 'ETag' not in client.get('/api/word_cloud').headers
+
+
+def test_memoized_keeps_none_results():
+    calls = []
+
+    @memoized()
+    def lookup(value):
+        calls.append(value)
+        return None
+
+    assert lookup(1) is None
+    assert lookup(1) is None
+    assert calls == [1]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from src import app, clustering
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+@pytest.mark.parametrize('endpoint', ['voting_clusters', 'voting_clusters_fullname'])
+def test_ranges_starting_without_votes(client, endpoint):
+    # 2020 was cancelled: the range is clustered on the countries of 2021-2022
+    response = client.get(f'/api/{endpoint}?yearRangeStart=2020&yearRangeEnd=2022&numberOfClusters=4')
+    assert response.status_code == 200
+    clusters = response.get_json()['clusters']
+    assert clusters and {row['cluster'] for row in clusters} == {0, 1, 2, 3}
+
+    empty = client.get(f'/api/{endpoint}?yearRangeStart=2020&yearRangeEnd=2020&numberOfClusters=4')
+    assert empty.status_code == 200
+    assert empty.get_json()['clusters'] == []
+
+
+def test_dashboard_of_a_range_starting_without_votes(client):
+    assert client.get('/api/dashboard?yearRangeStart=2020&yearRangeEnd=2022').status_code == 200
+
+
+@pytest.mark.parametrize('query', ['', '&numberOfClusters=0', '&numberOfClusters=100'])
+def test_invalid_cluster_counts(client, query):
+    response = client.get(f'/api/voting_clusters_fullname?yearRangeStart=2000&yearRangeEnd=2002{query}')
+    assert response.status_code == 400
+    assert 'numberOfClusters' in response.get_json()['error']
+
+
+def labels(engine, start, end, k=4):
+    projection, solutions = engine.solve(start, end, k)
+    return dict(zip(projection.countries, solutions[k][0]))
+
+
+def test_solutions_do_not_depend_on_earlier_requests(dataset):
+    cold = clustering.range_pca_engine(dataset)
+    warm = clustering.range_pca_engine(dataset)
+    for start, end in [(1990, 2010), (1991, 2010), (1990, 2011), (2000, 2005)]:
+        labels(warm, start, end)
+    assert labels(cold, 1991, 2011) == labels(warm, 1991, 2011)
+
+
+def test_labels_stay_when_the_start_moves(dataset):
+    engine = clustering.range_pca_engine(dataset)
+    for start in range(1980, 1990):
+        before, after = labels(engine, start, 2010), labels(engine, start + 1, 2010)
+        shared = set(before) & set(after)
+        assert np.mean([before[c] == after[c] for c in shared]) >= 0.6, start
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+import requests
+
+from src.llm.groq_llm import GroqClient
+from src.llm.stub_server import StubGroqServer
+
+POEM_PROMPT = os.path.join(os.path.dirname(__file__), '..', 'src', 'llm', 'prompts', 'groq_api_poem.json')
+
+
+@pytest.fixture
+def stub():
+    with StubGroqServer() as server:
+        yield server
+
+
+def client_for(server, **kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return GroqClient(api_key='test', base_url=server.url, **kwargs)
+
+
+def test_generate_echoes_the_rendered_prompt(stub):
+    client = client_for(stub)
+    assert client.generate(POEM_PROMPT, 'UBS') == "stub: Please provide a short poem about the company UBS."
+    assert stub.requests[0]['model'] == client.model
+
+
+def test_retries_after_failures():
+    with StubGroqServer(fail_first=2) as stub:
+        answer = client_for(stub, max_retries=3).generate(POEM_PROMPT, 'UBS')
+    assert answer.startswith('stub: ')
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_max_retries():
+    with StubGroqServer(fail_first=5) as stub:
+        answer = client_for(stub, max_retries=2).generate(POEM_PROMPT, 'UBS')
+    assert answer == "Error: 503"
+    assert len(stub.requests) == 3
+
+
+def test_failed_answers_are_not_cached():
+    with StubGroqServer(fail_first=1) as stub:
+        client = client_for(stub, max_retries=0)
+        assert client.generate(POEM_PROMPT, 'UBS') == "Error: 503"
+        assert client.generate(POEM_PROMPT, 'UBS').startswith('stub: ')
+    assert len(stub.requests) == 2
+
+
+def test_repeated_names_hit_the_api_once(stub):
+    client = client_for(stub)
+    first = client.generate(POEM_PROMPT, 'UBS')
+    assert client.generate(POEM_PROMPT, 'UBS') == first
+    assert client.generate_batch(['UBS', 'UBS', 'ABB'], POEM_PROMPT) == {
+        'UBS': first, 'ABB': "stub: Please provide a short poem about the company ABB.",
+    }
+    assert len(stub.requests) == 2
+
+
+def test_batch_keeps_to_max_concurrency():
+    names = [f'company {i}' for i in range(12)]
+    with StubGroqServer(delay=0.1) as stub:
+        started = time.perf_counter()
+        answers = client_for(stub).generate_batch(names, POEM_PROMPT, max_concurrency=3)
+        elapsed = time.perf_counter() - started
+    assert list(answers) == names
+    assert stub.max_in_flight == 3
+    # 12 requests, 3 at a time, 0.1s each
+    assert elapsed >= 0.4
+
+
+def test_timeout_is_a_connection_failure():
+    with StubGroqServer(delay=0.5) as stub:
+        client = client_for(stub, timeout=(1, 0.1), max_retries=1)
+        assert client.generate(POEM_PROMPT, 'UBS') == "Error: connection failed"
+    assert len(stub.requests) == 2
+
+
+@pytest.mark.parametrize('body', [b'not json', b'{}', b'{"choices": []}', b'[1]', b'{"choices": [{"message": {"content": null}}]}'])
+def test_malformed_answers_are_errors(stub, monkeypatch, body):
+    client = client_for(stub)
+
+    def post(url, **kwargs):
+        response = requests.Response()
+        response.status_code, response._content = 200, body
+        return response
+
+    monkeypatch.setattr(client.session, 'post', post)
+    assert client.generate(POEM_PROMPT, 'UBS') == "Error: malformed response"
+    # and are not cached
+    monkeypatch.undo()
+    assert client.generate(POEM_PROMPT, 'UBS').startswith('stub: ')
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import data, ingest
+from src.lyrics_index import LyricsIndex
+from src.voting_cube import VotingCube
+
+
+@pytest.fixture
+def restore(dataset):
+    # every test starts from the dataset as loaded (up to 2022) and puts it back afterwards
+    yield
+    data.swap_dataset(dataset, ingest._invalidate_all)
+
+
+@pytest.fixture(scope='module')
+def raw_2023():
+    return ingest.read_raw(2023)
+
+
+def test_ingest_appends_one_entry_per_country(restore, dataset, raw_2023):
+    raw_votes, raw_contestants = raw_2023
+    summary = ingest.ingest_year(2023, raw_votes, raw_contestants)
+
+    # contestants.csv has a second, semi-final only row for some 2023 entries
+    assert raw_contestants['to_country_id'].duplicated().any()
+    entries = data.dataset.contestants_df.query('year == 2023')
+    assert summary['contestants'] == len(entries) == raw_contestants['to_country_id'].nunique()
+    assert not entries['to_country_id'].duplicated().any()
+    assert entries.loc[entries['to_country_id'] == 'se', 'place_contest'].item() == 1
+    assert len(data.dataset.contestants_df) == len(dataset.contestants_df) + len(entries)
+    assert data.dataset.version != dataset.version
+
+
+def test_cube_append_matches_rebuild(restore, raw_2023):
+    ingest.ingest_year(2023, *raw_2023)
+    appended = data.dataset.vote_cube
+    rebuilt = VotingCube.from_votes(data.dataset.votes_df)
+    assert list(appended.years) == list(rebuilt.years)
+    assert list(appended.countries) == list(rebuilt.countries)
+    assert appended.rounds == rebuilt.rounds
+    np.testing.assert_allclose(appended.cumulative, rebuilt.cumulative, atol=1e-6)
+    np.testing.assert_array_equal(appended.presence, rebuilt.presence)
+
+
+def test_lyrics_index_append_matches_rebuild(restore, raw_2023):
+    ingest.ingest_year(2023, *raw_2023)
+    contestants = data.dataset.contestants_df.assign(lyrics_token=data.dataset.cold_contestants()['lyrics_token'])
+    rebuilt = LyricsIndex.from_contestants(contestants)
+    for start, end in [(2023, 2023), (2000, 2023)]:
+        assert data.dataset.lyrics_index.top_words(start, end) == rebuilt.top_words(start, end)
+
+
+def test_two_entries_of_one_country_are_rejected(restore, dataset, raw_2023):
+    raw_votes, raw_contestants = raw_2023
+    second = raw_contestants[raw_contestants['to_country_id'] == 'fi'].assign(song='Another Song')
+    with pytest.raises(ValueError, match='fi'):
+        ingest.ingest_year(2023, raw_votes, pd.concat([raw_contestants, second]))
+    assert data.dataset is dataset
+
+
+def test_only_later_years_are_ingested(restore, dataset):
+    with pytest.raises(ValueError):
+        ingest.ingest_year(2022)
+    assert data.dataset is dataset
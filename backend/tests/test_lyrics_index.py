@@ -0,0 +1,44 @@
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from src import data
+from src.lyrics_index import LyricsIndex
+
+
+@pytest.fixture(scope='module')
+def contestants():
+    return pd.read_csv(os.path.join(data.DATASET_DIR, 'contestants_cleaned.csv'))
+
+
+def counter_top_words(contestants, start, end, countries=None, k=30):
+    # the word cloud before the index: join the selected token strings and count
+    rows = contestants[contestants['year'].between(start, end)]
+    if countries is not None:
+        rows = rows[rows['to_country'].isin(countries)]
+    words = re.sub(r'[^a-zA-Z\s]', '', ' '.join(rows['lyrics_token'].dropna())).lower().split()
+    return Counter(words).most_common(k)
+
+
+@pytest.mark.parametrize('start,end,countries', [
+    (1957, 2022, None),
+    (1990, 2000, None),
+    (2022, 2022, None),
+    (1970, 2010, ['Sweden', 'Ireland']),
+    (2000, 2022, ['Nowhere']),
+])
+def test_top_words_match_counter(contestants, start, end, countries):
+    index = LyricsIndex.from_contestants(contestants)
+    assert index.top_words(start, end, countries) == counter_top_words(contestants, start, end, countries)
+
+
+def test_append_matches_rebuild(contestants):
+    earlier = contestants[contestants['year'] < 2000]
+    later = contestants[contestants['year'] >= 2000]
+    appended = LyricsIndex.from_contestants(earlier).append(later)
+    rebuilt = LyricsIndex.from_contestants(pd.concat([earlier, later], ignore_index=True))
+    for start, end, countries in [(1957, 2022, None), (1995, 2005, None), (1957, 2022, ['Sweden'])]:
+        assert appended.top_words(start, end, countries) == rebuilt.top_words(start, end, countries)
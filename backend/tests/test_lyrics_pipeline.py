@@ -0,0 +1,120 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src import ingest, lyrics_pipeline
+from src.llm import groq_llm
+from src.llm.stub_server import StubGroqServer
+from src.lyrics_index import LyricsIndex
+
+LYRICS = [
+    "Fire in the night, my heart is a drum",
+    "Dance with me under the summer sun",
+    None,
+    "The river runs to the sea, the sea runs to the sky",
+    "Love is a train and the train is late",
+]
+
+
+def write_dataset(directory, lyrics):
+    os.makedirs(directory, exist_ok=True)
+    pd.DataFrame({
+        'year': [2000 + i for i in range(len(lyrics))],
+        'to_country': ['Sweden', 'Italy', 'Norway', 'Ireland', 'Spain'][:len(lyrics)],
+        'lyrics_english': lyrics,
+    }).to_csv(os.path.join(directory, 'contestants_cleaned.csv'), index=False)
+    return pd.read_csv(os.path.join(directory, 'contestants_cleaned.csv'))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with StubGroqServer() as server:
+        monkeypatch.setattr(groq_llm, 'GROQ_BASE_URL', server.url)
+        yield server
+
+
+def run_llm(tmp_path, **kwargs):
+    return lyrics_pipeline.run(
+        str(tmp_path / 'tokens'), str(tmp_path / 'dataset'), workers=2, batch_size=2, llm=True, quiet=True, **kwargs
+    )
+
+
+def test_llm_run_writes_the_stub_answers(tmp_path, stub):
+    contestants = write_dataset(tmp_path / 'dataset', LYRICS)
+    assert run_llm(tmp_path) == 4
+    assert len(stub.requests) == 4
+
+    tokens = list(lyrics_pipeline.load_tokens(str(tmp_path / 'tokens')))
+    expected = [lyrics_pipeline.llm_tokens(f"stub: {text}") if isinstance(text, str) else [] for text in LYRICS]
+    assert tokens == [str(row) for row in expected]
+    assert 'fire' in tokens[0] and 'the' not in tokens[0]
+
+    # the store round-trips into the word cloud index of the same lyrics
+    index = lyrics_pipeline.load_store(str(tmp_path / 'tokens'), contestants)
+    rebuilt = LyricsIndex.from_contestants(contestants.assign(lyrics_token=tokens))
+    assert index.top_words(2000, 2010) == rebuilt.top_words(2000, 2010)
+    assert index.top_words(2003, 2003, ['Ireland'])[:3] == [('runs', 2), ('sea', 2), ('stub', 1)]
+
+    # nothing is read back for lyrics the store was not built from
+    changed = contestants.assign(lyrics_english=contestants['lyrics_english'].str.upper())
+    assert lyrics_pipeline.load_store(str(tmp_path / 'tokens'), changed) is None
+
+
+def test_llm_run_resumes_from_the_cache(tmp_path, stub):
+    write_dataset(tmp_path / 'dataset', LYRICS[:2])
+    assert run_llm(tmp_path) == 2
+
+    # a rerun over more lyrics only asks for the new ones
+    write_dataset(tmp_path / 'dataset', LYRICS)
+    assert run_llm(tmp_path) == 2
+    assert len(stub.requests) == 4
+    assert run_llm(tmp_path) == 0
+    assert len(stub.requests) == 4
+
+
+def test_failed_requests_leave_no_store(tmp_path, stub, monkeypatch):
+    write_dataset(tmp_path / 'dataset', LYRICS)
+    # not a retryable status, every request fails at once
+    monkeypatch.setattr(groq_llm, 'GROQ_BASE_URL', f"{stub.url}/missing")
+    with pytest.raises(SystemExit, match='4 lyrics could not be tokenized'):
+        run_llm(tmp_path)
+    assert lyrics_pipeline.read_manifest(str(tmp_path / 'tokens')) is None
+
+    # the next run against a working API retries them
+    monkeypatch.setattr(groq_llm, 'GROQ_BASE_URL', stub.url)
+    assert run_llm(tmp_path) == 4
+
+
+def test_endpoints_do_not_share_tokens(tmp_path, stub, monkeypatch):
+    write_dataset(tmp_path / 'dataset', LYRICS)
+    run_llm(tmp_path)
+    with StubGroqServer() as other:
+        monkeypatch.setattr(groq_llm, 'GROQ_BASE_URL', other.url)
+        assert run_llm(tmp_path) == 4
+    assert len(other.requests) == 4
+
+
+@pytest.mark.skipif(ingest.tokenizer_name() != 'stopwords', reason="spaCy is installed")
+def test_stopword_fallback_needs_to_be_allowed(tmp_path):
+    write_dataset(tmp_path / 'dataset', LYRICS)
+    directory, dataset_dir = str(tmp_path / 'tokens'), str(tmp_path / 'dataset')
+    with pytest.raises(SystemExit, match='--allow-fallback'):
+        lyrics_pipeline.run(directory, dataset_dir, workers=1, quiet=True)
+    assert lyrics_pipeline.run(directory, dataset_dir, workers=1, quiet=True, allow_fallback=True) == 4
+    assert lyrics_pipeline.load_tokens(directory)[1] == str(ingest.lyric_tokens(LYRICS[1]))
+
+
+def test_errors_close_the_cache_and_client(tmp_path, stub, monkeypatch):
+    write_dataset(tmp_path / 'dataset', LYRICS)
+    closed = []
+    monkeypatch.setattr(lyrics_pipeline.TokenCache, 'close', lambda self: closed.append('cache'))
+    monkeypatch.setattr(groq_llm.GroqClient, 'close', lambda self: closed.append('client'))
+
+    def broken(*args):
+        raise RuntimeError("bad batch")
+
+    monkeypatch.setattr(lyrics_pipeline, '_llm_batch', broken)
+    with pytest.raises(RuntimeError):
+        run_llm(tmp_path)
+    assert sorted(closed) == ['cache', 'client']
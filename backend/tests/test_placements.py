@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src import app
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+def trajectories(client, query):
+    response = client.get(f'/api/country_trajectories?{query}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_places_match_the_contestants(client, dataset):
+    result = trajectories(client, 'yearRangeStart=1990&yearRangeEnd=2022&countries=Sweden,Italy,Atlantis')
+    assert result['countries'] == ['Italy', 'Sweden']
+    assert result['unknown_countries'] == ['Atlantis']
+
+    df = dataset.contestants_df
+    for country in result['countries']:
+        rows = df[(df['to_country'] == country) & df['year'].between(1990, 2022)]
+        expected = rows.groupby('year')['place_contest'].min().to_dict()
+        got = {year: place for year, place in zip(result['years'], result['places'][country]) if place is not None}
+        assert got == {year: int(place) for year, place in expected.items()}
+    # 2020 was cancelled, no contest row
+    assert 2020 not in result['years']
+
+
+def test_rolling_statistics(client):
+    window = 3
+    result = trajectories(client, f'yearRangeStart=1980&yearRangeEnd=2022&countries=Sweden,Norway&window={window}')
+    for country in result['countries']:
+        places = result['places'][country]
+        for t in range(len(places)):
+            recent = [p for p in places[max(t - window + 1, 0):t + 1] if p is not None]
+            if not recent:
+                assert result['mean_place'][country][t] is None
+                continue
+            assert result['mean_place'][country][t] == pytest.approx(np.mean(recent))
+            assert result['top5_rate'][country][t] == pytest.approx(np.mean([p <= 5 for p in recent]))
+
+    sweden, norway = result['places']['Sweden'], result['places']['Norway']
+    ahead = sum(s is not None and n is not None and s < n for s, n in zip(sweden, norway))
+    assert result['head_to_head'][1][0] == ahead
+    assert result['rolling_head_to_head'][-1][1][0] == sum(
+        s is not None and n is not None and s < n for s, n in zip(sweden[-window:], norway[-window:])
+    )
+
+
+def test_invalid_parameters(client):
+    assert client.get('/api/country_trajectories?yearRangeStart=1990&yearRangeEnd=2022').status_code == 400
+    assert client.get(
+        '/api/country_trajectories?yearRangeStart=1990&yearRangeEnd=2022&countries=Sweden&window=0'
+    ).status_code == 400
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from src import app, cache
+from src.precompute import build_store, range_urls
+from src.response_store import ResponseStore
+
+ENDPOINTS = ['yearly_rankings', 'word_cloud_filter', 'voting_clusters']
+
+
+@pytest.fixture(scope='module')
+def store(dataset, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('store') / 'precomputed.sqlite')
+    rows = build_store(path, workers=1, first=2015, last=2016, endpoints=ENDPOINTS, quiet=True)
+    assert rows == 3 * (1 + 3 + 6)
+    return path
+
+
+@pytest.fixture
+def live_cache(monkeypatch):
+    monkeypatch.setattr(cache, 'precomputed', None)
+    cache.response_cache.invalidate()
+    yield
+    cache.response_cache.invalidate()
+
+
+def test_range_urls():
+    urls = range_urls(2000, 2001)
+    assert '/api/yearly_rankings?yearRangeStart=2000&yearRangeEnd=2001' in urls
+    assert '/api/voting_clusters?yearRangeStart=2000&yearRangeEnd=2001&numberOfClusters=7' in urls
+    assert len(set(urls)) == len(urls)
+    assert {url.split('?')[0] for url in range_urls(2000, 2001, ['word_cloud'])} == {'/api/word_cloud'}
+
+
+def test_store_holds_the_live_responses(store, dataset, live_cache):
+    reader = ResponseStore(store)
+    assert reader.version == dataset.version
+    client = app.test_client()
+    for start, end in [(2015, 2015), (2015, 2016), (2016, 2016)]:
+        for url in range_urls(start, end, ENDPOINTS):
+            with app.test_request_context(url):
+                stored = reader.get(cache.cache_key(), dataset.version)
+            assert stored == (client.get(url).get_data(), 'application/json')
+    assert reader.get(('/api/yearly_rankings', ()), 'another version') is None
+
+
+def test_app_answers_from_the_store(store, dataset, live_cache, monkeypatch):
+    url = '/api/yearly_rankings?yearRangeStart=2015&yearRangeEnd=2016'
+    with sqlite3.connect(store) as connection:
+        connection.execute("UPDATE responses SET body = ? WHERE key LIKE '%yearly_rankings%'", (b'"stored"',))
+    reader = ResponseStore(store)
+    monkeypatch.setattr(cache, 'precomputed', reader)
+
+    client = app.test_client()
+    assert client.get(url).get_json() == 'stored'
+    assert reader.stats()['hits'] == 1
+    # ranges outside the store are computed live
+    assert client.get('/api/yearly_rankings?yearRangeStart=2000&yearRangeEnd=2001').get_json() != 'stored'
+    assert reader.stats()['misses'] == 1
+
+
+def test_store_of_another_version_is_ignored(store, live_cache, monkeypatch):
+    with sqlite3.connect(store) as connection:
+        connection.execute("UPDATE meta SET value = 'stale' WHERE name = 'version'")
+    monkeypatch.setattr(cache, 'precomputed', ResponseStore(store))
+    body = app.test_client().get('/api/yearly_rankings?yearRangeStart=2015&yearRangeEnd=2016').get_json()
+    assert body != 'stored'
+
+
+def test_open_missing_store(tmp_path):
+    assert ResponseStore.open(None) is None
+    assert ResponseStore.open(str(tmp_path / 'missing.sqlite')) is None
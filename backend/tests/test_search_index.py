@@ -0,0 +1,68 @@
+import pytest
+
+from src import app
+from src.search_index import SearchIndex, parse_query, tokenize
+
+TEXTS = [
+    "Love is all around, love is in the air",
+    "Sail away over the sea",
+    None,
+    "All you need is love. Love, love, love",
+    "Away we go, love will sail away",
+]
+
+
+def brute_force(texts, phrases):
+    # documents containing every phrase as consecutive words
+    matches = []
+    for doc, text in enumerate(texts):
+        words = ' ' + ' '.join(token for token, _, _ in tokenize(text or '')) + ' '
+        if all(' ' + ' '.join(phrase) + ' ' in words for phrase in phrases):
+            matches.append(doc)
+    return matches
+
+
+def test_parse_query():
+    assert parse_query('Love "sail away" ') == [['sail', 'away'], ['love']]
+    assert parse_query('"" ,') == []
+
+
+@pytest.mark.parametrize('query', ['love', 'sail away', '"sail away"', '"love is"', 'love "sail away"', 'moon'])
+def test_search_matches_every_phrase(query):
+    index = SearchIndex.from_texts(TEXTS)
+    found = sorted(row for row, _, _ in index.search(query))
+    assert found == brute_force(TEXTS, parse_query(query))
+
+
+def test_ranking_and_rows():
+    index = SearchIndex.from_texts(TEXTS)
+    results = index.search('love')
+    # four occurrences in a short lyric beat two in a longer one
+    assert results[0][0] == 3
+    assert sorted(row for row, _, _ in index.search('love', rows=[0, 4])) == [0, 4]
+    assert index.search('love', limit=1) == results[:1]
+
+
+def test_append_matches_a_full_build():
+    full = SearchIndex.from_texts(TEXTS)
+    appended = SearchIndex.from_texts(TEXTS[:2]).append(TEXTS[2:])
+    for query in ['love', 'sail away', '"love is"', 'the sea']:
+        assert appended.search(query) == full.search(query)
+
+
+def test_snippet():
+    index = SearchIndex.from_texts(TEXTS)
+    row, _, position = index.search('"sail away"')[0]
+    assert row == 1
+    assert index.snippet(row, TEXTS[row], position, context=1) == 'Sail away…'
+
+
+def test_endpoint(dataset):
+    client = app.test_client()
+    results = client.get('/api/lyrics_search?q=love&yearRangeStart=2000&yearRangeEnd=2005').get_json()
+    assert results
+    assert all(2000 <= song['year'] <= 2005 for song in results)
+    assert all('love' in song['snippet'].lower() for song in results)
+    scores = [song['score'] for song in results]
+    assert scores == sorted(scores, reverse=True)
+    assert client.get('/api/lyrics_search?q=').status_code == 400
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity as sklearn_cosine
+
+from src import app, similarity
+
+
+@pytest.fixture(scope='module')
+def matrix(dataset):
+    codes = dataset.vote_cube.participants(2000, 2010)
+    return dataset.vote_cube.pivot(2000, 2010, index=codes, columns=codes).to_numpy()
+
+
+def test_metrics_match_their_definitions(matrix):
+    matrices = similarity.similarity_matrices(matrix)
+    voters = np.linalg.norm(matrix, axis=1) > 0
+    expected = sklearn_cosine(matrix[voters])
+    np.testing.assert_allclose(matrices['cosine'][np.ix_(voters, voters)], expected, atol=1e-9)
+    varying = matrix.std(axis=1) > 0
+    np.testing.assert_allclose(matrices['pearson'][np.ix_(varying, varying)], np.corrcoef(matrix[varying]), atol=1e-9)
+    for values in matrices.values():
+        np.testing.assert_allclose(values, values.T)
+        np.testing.assert_array_equal(np.diag(values), 1.0)
+
+
+def test_blocs_follow_the_leaf_order(matrix):
+    order, labels = similarity.detect_blocs(similarity.pearson_similarity(matrix), 5)
+    assert sorted(order) == list(range(len(matrix)))
+    assert set(labels) == set(range(5))
+    # bloc ids are numbered by first appearance along the order
+    assert list(dict.fromkeys(labels[order])) == list(range(5))
+
+
+def test_cohesion_of_no_countries():
+    assert similarity.cohesion(np.empty((0, 0)), np.empty(0, dtype=int)).shape == (0,)
+
+
+def test_permutation_test_does_not_depend_on_the_pool(matrix, monkeypatch):
+    pearson = similarity.pearson_similarity(matrix)
+    _, labels = similarity.detect_blocs(pearson, 4)
+    in_process = similarity.permutation_test(pearson, labels, 1200, seed=7)
+    monkeypatch.setattr(similarity, 'PARALLEL_PERMUTATIONS', 1)
+    assert np.array_equal(similarity.permutation_test(pearson, labels, 1200, seed=7), in_process)
+    assert ((0 < in_process) & (in_process <= 1)).all()
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+def test_range_without_votes_has_no_blocs(client):
+    response = client.get('/api/voting_similarity?yearRangeStart=2020&yearRangeEnd=2020&permutations=100')
+    assert response.status_code == 200
+    assert response.get_json()['blocs'] == [] and response.get_json()['countries'] == []
+
+
+def test_inverted_range_is_rejected(client):
+    assert client.get('/api/voting_similarity?yearRangeStart=2010&yearRangeEnd=2000').status_code == 400
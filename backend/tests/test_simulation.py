@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.simulation import Simulator
+
+
+@pytest.fixture(scope='module')
+def simulator(dataset):
+    return Simulator(dataset.votes_df)
+
+
+def test_actual_rule_finds_the_official_winners(dataset, simulator):
+    result = simulator.simulate(1957, 2022, 'actual')
+    contestants = dataset.contestants_df
+    for year, places in zip(result['years'], result['places']):
+        winners = set(result['countries'][places == 1])
+        official = set(contestants.loc[(contestants['year'] == year) & (contestants['place_contest'] == 1), 'to_country_id'])
+        if year == 1991:
+            # France and Sweden tied on points, Sweden won on countback which placements() leaves out
+            assert winners == {'fr', 'se'} and official == {'se'}
+        else:
+            assert winners == official, year
+
+
+def test_actual_rule_sums_the_final_points(dataset, simulator):
+    result = simulator.simulate(2010, 2012, 'actual')
+    votes = dataset.votes_df
+    finals = votes[(votes['round'] == 'final') & votes['year'].between(2010, 2012)]
+    totals = finals.groupby(['year', finals['to_country_id'].astype(str)])['total_points'].sum()
+    countries = list(result['countries'])
+    for (year, country), points in totals.items():
+        assert result['points'][year - 2010, countries.index(country)] == points
+
+
+def test_excluding_every_voter_leaves_no_points(simulator):
+    result = simulator.simulate(2000, 2000, 'eurovision', exclude=tuple(simulator.countries))
+    assert np.nansum(result['points']) == 0
+
+
+def test_monte_carlo_is_deterministic(simulator):
+    first = simulator.monte_carlo(2015, 2016, simulations=200, seed=3)
+    second = simulator.monte_carlo(2015, 2016, simulations=200, seed=3)
+    np.testing.assert_array_equal(first['win_probability'], second['win_probability'])
+    np.testing.assert_allclose(np.nansum(first['win_probability'], axis=1), 1.0)
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from src import app
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+def pages(client, query, limit):
+    # every song of the listing, fetched limit at a time by following next_cursor
+    songs, cursor = [], None
+    while True:
+        url = f'/api/songs_list?{query}&limit={limit}' + (f'&cursor={cursor}' if cursor is not None else '')
+        page = client.get(url).get_json()
+        assert len(page['songs']) <= limit
+        songs += page['songs']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return songs
+
+
+@pytest.mark.parametrize('query', ['', 'year=2000', 'country=Sweden', 'year=2000&country=Sweden'])
+def test_pages_add_up_to_the_full_list(client, query):
+    full = client.get(f'/api/songs_list?{query}').get_json()
+    assert full
+    assert pages(client, query, 7) == full
+    assert pages(client, query, len(full)) == full
+
+
+def test_list_is_newest_first(client, dataset):
+    songs = client.get('/api/songs_list?country=Sweden').get_json()
+    years = [song['year'] for song in songs]
+    assert years == sorted(years, reverse=True)
+    assert len(songs) == (dataset.contestants_df['to_country'] == 'Sweden').sum()
+
+
+def test_ndjson_stream_carries_the_cursor(client):
+    first = client.get('/api/songs_list?year=2000&limit=5')
+    streamed = client.get('/api/songs_list?year=2000&limit=5&format=ndjson')
+    assert [json.loads(line) for line in streamed.get_data(as_text=True).splitlines()] == first.get_json()['songs']
+    assert int(streamed.headers['X-Next-Cursor']) == first.get_json()['next_cursor']
+
+
+def test_unknown_filters_and_bad_limits(client):
+    assert client.get('/api/songs_list?year=1800').get_json() == []
+    assert client.get('/api/songs_list?limit=0').status_code == 400
+
+
+def test_song_details_ignore_case_and_spacing(client):
+    exact = client.get('/api/song_details?song=Net Als Toen').get_json()
+    assert exact['song'] == 'Net Als Toen'
+    assert client.get('/api/song_details?song=net  als toen').get_json() == exact
+    assert client.get('/api/song_details?song=No Such Song').get_json() == {'error': 'Song not found'}
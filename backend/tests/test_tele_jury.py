@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from scipy.stats import spearmanr
+
+from src import app
+
+
+@pytest.fixture
+def client(dataset):
+    return app.test_client()
+
+
+def split(client, start, end):
+    response = client.get(f'/api/tele_jury_split?yearRangeStart={start}&yearRangeEnd={end}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def finals(dataset, start, end):
+    votes = dataset.votes_df
+    return votes[(votes['round'] == 'final') & votes['year'].between(start, end)]
+
+
+def test_received_shares_match_the_votes(client, dataset):
+    result = split(client, 2016, 2019)
+    assert result['years'] == [2016, 2017, 2018, 2019]
+
+    votes = finals(dataset, 2016, 2019)
+    received = votes.groupby('to_country_id')
+    contests = received['year'].nunique()
+    codes = result['codes']
+    tele = dict(zip(codes, result['received']['tele']))
+    jury = dict(zip(codes, result['received']['jury']))
+    favour = dict(zip(codes, result['received']['favour']))
+    for code, count in contests.items():
+        expected_tele = received.get_group(code)['tele_percentage'].sum() / count
+        expected_jury = received.get_group(code)['jury_percentage'].sum() / count
+        assert tele[code] == pytest.approx(expected_tele, rel=1e-4)
+        assert jury[code] == pytest.approx(expected_jury, rel=1e-4)
+        assert favour[code] == pytest.approx(expected_tele - expected_jury, rel=1e-4, abs=1e-3)
+
+
+def test_yearly_correlation(client, dataset):
+    result = split(client, 2016, 2022)
+    # 2020 was cancelled
+    assert 2020 not in result['years']
+    votes = finals(dataset, 2016, 2022)
+    for year, correlation in zip(result['years'], result['yearly_correlation']):
+        totals = votes[votes['year'] == year].groupby('to_country_id')[['tele_percentage', 'jury_percentage']].sum()
+        # one decimal, like the CSV, so equal totals tie
+        totals = totals.round(1)
+        expected = spearmanr(totals['tele_percentage'], totals['jury_percentage']).statistic
+        assert correlation == pytest.approx(expected, rel=1e-6)
+
+
+def test_divergence_sums_the_pair_differences(client, dataset):
+    result = split(client, 2018, 2018)
+    index = {code: i for i, code in enumerate(result['codes'])}
+    divergence = np.array(result['divergence'])
+    votes = finals(dataset, 2018, 2018)
+    for row in votes.sample(20, random_state=0).itertuples():
+        expected = row.tele_percentage - row.jury_percentage
+        assert divergence[index[row.from_country_id], index[row.to_country_id]] == pytest.approx(expected, abs=1e-3)
+
+
+def test_years_without_split_voting(client):
+    assert split(client, 1990, 2015)['years'] == []
+    assert split(client, 2020, 2020)['countries'] == []
+    assert client.get('/api/tele_jury_split?yearRangeStart=2016').status_code == 400
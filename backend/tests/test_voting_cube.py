@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.voting_cube import POINT_TYPES, VotingCube
+
+RANGES = [(1957, 2022), (1975, 1975), (1990, 2000), (2016, 2022)]
+
+
+def groupby_matrix(votes_df, start, end, round, column):
+    # what the endpoints computed before the cube: filter + groupby over votes_df
+    rows = votes_df[votes_df['year'].between(start, end) & (votes_df['round'] == round)]
+    sums = rows.groupby([rows['from_country_id'].astype(str), rows['to_country_id'].astype(str)])[column].sum()
+    return sums.unstack(fill_value=0.0).sort_index().sort_index(axis=1)
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+@pytest.mark.parametrize('points', list(POINT_TYPES))
+def test_pivot_matches_groupby(dataset, start, end, points):
+    for round in ['final', 'semi-final-1']:
+        expected = groupby_matrix(dataset.votes_df, start, end, round, POINT_TYPES[points])
+        pivot = dataset.vote_cube.pivot(start, end, round, points)
+        assert list(pivot.index) == list(expected.index)
+        assert list(pivot.columns) == list(expected.columns)
+        np.testing.assert_allclose(pivot.to_numpy(), expected.to_numpy(), atol=1e-6)
+
+
+def test_append_matches_rebuild(dataset):
+    # plain string rounds, as ingest appends them
+    votes = dataset.votes_df.astype({'round': str})
+    split = 2000
+    appended = VotingCube.from_votes(votes[votes['year'] < split]).append(votes[votes['year'] >= split])
+    rebuilt = VotingCube.from_votes(votes)
+    assert list(appended.years) == list(rebuilt.years)
+    assert list(appended.countries) == list(rebuilt.countries)
+    assert appended.rounds == rebuilt.rounds
+    np.testing.assert_array_equal(appended.cumulative, rebuilt.cumulative)
+    np.testing.assert_array_equal(appended.presence, rebuilt.presence)
+
+
+def test_append_rejects_earlier_years(dataset):
+    votes = dataset.votes_df
+    with pytest.raises(ValueError):
+        dataset.vote_cube.append(votes[votes['year'] == 2000])